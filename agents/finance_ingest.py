@@ -0,0 +1,288 @@
+"""
+Finance Ingest: Parse many finance sheets in parallel and merge them into one analysis.
+
+Each uploaded file (one per month or business unit, say) is parsed in its own worker
+process, since openpyxl parsing is CPU-bound and single-threaded. Workers are spawned,
+not forked: forking the multi-threaded Streamlit server can deadlock a child on a lock
+some other thread held at fork time. Workers normalize every sheet to the same columns
+using the analyzer's inflow/outflow/category detection and return partial aggregates,
+which the parent merges into the totals that ``FinanceSheetAnalyzer.analyze_consolidated``
+turns into a single result.
+"""
+import calendar
+import io
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from agents.finance_sheet_analyzer import detect_columns
+
+NORMALIZED_COLUMNS = ["Source", "Category", "Month", "Year", "Inflow", "Outflow"]
+# Aggregate name -> normalized column it groups by. Months are keyed by (year, month)
+# (see ``month_key``), so the same month of different years stays separate.
+GROUPS = {"source": "Source", "category": "Category", "month": "Month", "year": "Year"}
+_MONTH_NUMBERS = {name.lower(): n for n in range(1, 13) for name in (calendar.month_name[n], calendar.month_abbr[n])}
+_YEAR_MONTH = re.compile(r"(\d{4})[-/](\d{1,2})\b")
+
+
+def _year_value(year):
+    # 2024, 2024.0 and '2024' are the same year; missing years are None.
+    if year is None or (isinstance(year, float) and year != year) or year is pd.NaT:
+        return None
+    try:
+        return int(float(year))
+    except (TypeError, ValueError):
+        return str(year).strip() or None
+
+
+def month_key(year, month):
+    """
+    Return the (year, month) key a transaction is grouped under for monthly trends.
+    Month may be a name ('Jan', 'January'), a number (1-12), a 'YYYY-MM' string or a date
+    (the last two also supply the year); unrecognized months keep their text.
+    Args:
+        year: Value of the Year column (None if the sheet has none).
+        month: Value of the Month column.
+    Returns:
+        tuple or None: (year or None, month number or text); None if the month is missing.
+    """
+    if month is None or month is pd.NaT or (isinstance(month, float) and month != month):
+        return None
+    if hasattr(month, "year") and hasattr(month, "month"):
+        return month.year, month.month
+    year = _year_value(year)
+    text = str(month).strip()
+    match = _YEAR_MONTH.match(text)
+    if match and 1 <= int(match.group(2)) <= 12:
+        return int(match.group(1)), int(match.group(2))
+    number = _MONTH_NUMBERS.get(text.lower()) or _MONTH_NUMBERS.get(text.lower()[:3])
+    if number is None:
+        try:
+            number = int(float(text))
+        except ValueError:
+            return year, text
+        if not 1 <= number <= 12:
+            return year, text
+    return year, number
+
+
+def _calendar_order(key):
+    # Known years/months first in numeric order, then text values, then missing ones.
+    return tuple((0, part, "") if isinstance(part, int) else (1, 0, str(part)) if part is not None else (2, 0, "")
+                 for part in key)
+
+
+def _month_label(key):
+    year, month = key
+    if isinstance(month, int):
+        return f"{year}-{month:02d}" if year is not None else calendar.month_abbr[month]
+    return f"{month} {year}" if year is not None else month
+
+
+def normalize_transactions(df, source):
+    """
+    Map a transaction sheet onto NORMALIZED_COLUMNS.
+    A single signed amount column is split into Inflow (positive) and Outflow (negative).
+    Args:
+        df (pd.DataFrame): Sheet as read from Excel/CSV.
+        source (str): Label recorded in the 'Source' column (file name and sheet).
+    Returns:
+        pd.DataFrame: Normalized transactions.
+    Raises:
+        ValueError: If no inflow/outflow column can be found.
+    """
+    columns = detect_columns(df)
+    inflow_col, outflow_col = columns['inflow'], columns['outflow']
+    frame = pd.DataFrame(index=df.index)
+    frame['Source'] = source
+    for name in ("category", "month", "year"):
+        frame[name.capitalize()] = df[columns[name]] if columns[name] is not None else None
+    if inflow_col is not None and outflow_col is not None and inflow_col != outflow_col:
+        frame['Inflow'] = pd.to_numeric(df[inflow_col], errors='coerce').fillna(0)
+        frame['Outflow'] = pd.to_numeric(df[outflow_col], errors='coerce').fillna(0)
+    elif inflow_col is not None or outflow_col is not None:
+        amount = pd.to_numeric(df[inflow_col if inflow_col is not None else outflow_col], errors='coerce').fillna(0)
+        frame['Inflow'] = amount.clip(lower=0)
+        frame['Outflow'] = (-amount).clip(lower=0)
+    else:
+        raise ValueError(f"No inflow/outflow columns found in {list(df.columns)}")
+    return frame.reset_index(drop=True)
+
+
+class FinanceAggregate:
+    """
+    Mergeable totals of normalized transactions: overall and per source, category, month and year.
+    Groups are only filled from sheets that have the corresponding column.
+    """
+    def __init__(self):
+        self.rows = 0
+        self.inflows = 0.0
+        self.outflows = 0.0
+        self.groups = {name: {} for name in GROUPS}
+
+    @property
+    def sources(self):
+        return list(self.groups["source"])
+
+    @classmethod
+    def from_frame(cls, frame):
+        """
+        Aggregate a normalized DataFrame (see ``normalize_transactions``).
+        """
+        aggregate = cls()
+        aggregate.rows = len(frame)
+        aggregate.inflows = float(frame['Inflow'].sum())
+        aggregate.outflows = float(frame['Outflow'].sum())
+        for name, column in GROUPS.items():
+            if not frame[column].notna().any():
+                continue
+            if name == "month":
+                sums = frame.groupby(['Year', 'Month'], dropna=False, sort=False)[['Inflow', 'Outflow']].sum()
+                keys = [month_key(year, month) for year, month in sums.index]
+            else:
+                sums = frame.groupby(column)[['Inflow', 'Outflow']].sum()
+                keys = [_year_value(key) for key in sums.index] if name == "year" else list(sums.index)
+            totals = aggregate.groups[name]
+            for key, (inflow, outflow) in zip(keys, sums.values):
+                if key is None:
+                    continue
+                current = totals.setdefault(key, [0.0, 0.0])
+                current[0] += float(inflow)
+                current[1] += float(outflow)
+        return aggregate
+
+    def merge(self, other):
+        """
+        Add another aggregate's totals into this one and return self.
+        """
+        self.rows += other.rows
+        self.inflows += other.inflows
+        self.outflows += other.outflows
+        for name, totals in other.groups.items():
+            merged = self.groups[name]
+            for key, (inflow, outflow) in totals.items():
+                current = merged.setdefault(key, [0.0, 0.0])
+                current[0] += inflow
+                current[1] += outflow
+        return self
+
+    def trends(self, name):
+        """
+        Return one group as a DataFrame indexed by its key with Inflow, Outflow and Net columns.
+        Months are in calendar order and labelled 'YYYY-MM' (or by name when the year is unknown).
+        """
+        totals = self.groups[name]
+        if not totals:
+            return pd.DataFrame()
+        if name == "month":
+            keys = sorted(totals, key=_calendar_order)
+            labels = [_month_label(key) for key in keys]
+        else:
+            try:
+                keys = sorted(totals)
+            except TypeError:
+                keys = sorted(totals, key=str)
+            labels = keys
+        frame = pd.DataFrame([totals[key] for key in keys], columns=['Inflow', 'Outflow'],
+                             index=pd.Index(labels, name=GROUPS[name]))
+        frame['Net'] = frame['Inflow'] - frame['Outflow']
+        return frame
+
+
+def parse_finance_file(name, data, keep_rows=True):
+    """
+    Parse every sheet of one uploaded file into normalized rows and a partial aggregate.
+    Runs in a worker process, so it takes and returns only picklable values.
+    Args:
+        name (str): File name ('.csv' is read as CSV, anything else as Excel).
+        data (bytes): File content.
+        keep_rows (bool): Return all normalized rows; otherwise only a 50-row sample.
+    Returns:
+        tuple: (list of (source, FinanceAggregate, pd.DataFrame), list of error strings)
+    """
+    if name.lower().endswith(".csv"):
+        sheets = {"": pd.read_csv(io.BytesIO(data))}
+    else:
+        sheets = pd.read_excel(io.BytesIO(data), sheet_name=None)
+    parts, errors = [], []
+    for sheet, df in sheets.items():
+        source = name if len(sheets) == 1 else f"{name} [{sheet}]"
+        if df.empty:
+            continue
+        try:
+            frame = normalize_transactions(df, source)
+        except ValueError as e:
+            errors.append(f"{source}: {e}")
+            continue
+        parts.append((source, FinanceAggregate.from_frame(frame), frame if keep_rows else frame.head(50)))
+    return parts, errors
+
+
+class FinanceIngestResult:
+    """
+    Merged outcome of ``ingest_finance_files``.
+    """
+    def __init__(self, aggregate, frames, errors, seconds, workers):
+        self.aggregate = aggregate
+        self.frames = frames
+        self.errors = errors
+        self.seconds = seconds
+        self.workers = workers
+
+    def transactions(self):
+        """
+        Return all normalized rows in upload order (empty DataFrame if none).
+        """
+        if not self.frames:
+            return pd.DataFrame(columns=NORMALIZED_COLUMNS)
+        return pd.concat(self.frames, ignore_index=True)
+
+
+def ingest_finance_files(files, max_workers=None, keep_rows=True):
+    """
+    Parse finance files in parallel and merge their aggregates.
+    Args:
+        files (list[tuple[str, bytes]]): (file name, content) pairs.
+        max_workers (int): Worker processes (defaults to one per file, up to the CPU count).
+        keep_rows (bool): Keep all normalized rows (for display and export) or just samples.
+    Returns:
+        FinanceIngestResult: Merged aggregate, per-sheet rows in upload order and errors.
+    """
+    started = time.monotonic()
+    workers = min(len(files), max_workers or os.cpu_count() or 1)
+    outcomes = [None] * len(files)
+    if workers <= 1:
+        for i, (name, data) in enumerate(files):
+            outcomes[i] = _parse_safely(name, data, keep_rows)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(parse_finance_file, name, data, keep_rows) for name, data in files]
+            for i, ((name, _), future) in enumerate(zip(files, futures)):
+                try:
+                    outcomes[i] = future.result()
+                except Exception as e:
+                    logging.error(f"Failed to parse {name}: {e}")
+                    outcomes[i] = ([], [f"{name}: {e}"])
+    aggregate = FinanceAggregate()
+    frames, errors = [], []
+    for parts, file_errors in outcomes:
+        errors.extend(file_errors)
+        for _, partial, frame in parts:
+            aggregate.merge(partial)
+            frames.append(frame)
+    seconds = time.monotonic() - started
+    logging.info(f"Ingested {len(files)} finance files ({aggregate.rows} rows) with {workers} workers in {seconds:.1f}s")
+    return FinanceIngestResult(aggregate, frames, errors, seconds, max(workers, 1))
+
+
+def _parse_safely(name, data, keep_rows):
+    try:
+        return parse_finance_file(name, data, keep_rows)
+    except Exception as e:
+        logging.error(f"Failed to parse {name}: {e}")
+        return [], [f"{name}: {e}"]
@@ -1,11 +1,50 @@
 import pandas as pd
 from llm.llama_client_Test_and_Finance import LlamaClient
 
+def detect_columns(df):
+    """
+    Find the inflow, outflow, category, month and year columns of a transaction sheet.
+    Inflow/outflow match on partial names first (e.g. 'Credit (Inflow)', 'Debit (Outflow)');
+    a single 'amount' column may be returned as both inflow and outflow (signed amounts).
+    Args:
+        df (pd.DataFrame): Transaction sheet.
+    Returns:
+        dict: {'inflow', 'outflow', 'category', 'month', 'year'} -> column name or None.
+    """
+    col_map = {str(c).lower(): c for c in df.columns}
+    # Robust partial matching for inflow/outflow columns
+    inflow_col = None
+    outflow_col = None
+    for col in df.columns:
+        col_lower = str(col).lower()
+        if inflow_col is None and ("credit" in col_lower or "inflow" in col_lower or "income" in col_lower):
+            inflow_col = col
+        if outflow_col is None and ("debit" in col_lower or "outflow" in col_lower or "expense" in col_lower):
+            outflow_col = col
+        if inflow_col and outflow_col:
+            break
+    # Fallback to exact/legacy logic if not found
+    if not inflow_col:
+        inflow_col = next((col_map[k] for k in ['credit', 'inflow', 'income', 'amount'] if k in col_map), None)
+    if not outflow_col:
+        outflow_col = next((col_map[k] for k in ['debit', 'outflow', 'expense', 'amount'] if k in col_map), None)
+    return {
+        'inflow': inflow_col,
+        'outflow': outflow_col,
+        'category': next((col_map[k] for k in ['category', 'type', 'group'] if k in col_map), None),
+        'month': next((col_map[k] for k in ['month', 'period'] if k in col_map), None),
+        'year': next((col_map[k] for k in ['year', 'fiscal_year'] if k in col_map), None),
+    }
+
+
 class FinanceSheetAnalyzer:
     """
     Goal: Provide actionable, visually rich financial analysis for uploaded transaction sheets (Excel/CSV).
     Backstory: You are a professional financial analyst with expertise in dashboard design and business reporting. Your mission is to help users understand their financial health, spot trends, and optimize spending/income using clear KPIs, breakdowns, and modern visualizations.
     """
+    # Hard per-call generation limits: token cap and wall-clock deadline (seconds).
+    NUM_PREDICT = 2048
+    DEADLINE_S = 120
     def __init__(self):
         self.llm = LlamaClient()
         self.goal = (
@@ -19,34 +58,17 @@ class FinanceSheetAnalyzer:
             "You believe every financial report should tell a story, highlight what matters, and inspire confident action."
         )
 
-    def analyze(self, df):
+    def analyze(self, df, cancel_token=None, on_chunk=None):
         result = {}
         # Validate input
         if df is None or df.empty:
             result['error'] = "No data found in uploaded sheet. Please check your file."
             return result
         try:
-            col_map = {c.lower(): c for c in df.columns}
             result['debug_columns'] = str(list(df.columns))
-            # Robust partial matching for inflow/outflow columns
-            inflow_col = None
-            outflow_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                if inflow_col is None and ("credit" in col_lower or "inflow" in col_lower or "income" in col_lower):
-                    inflow_col = col
-                if outflow_col is None and ("debit" in col_lower or "outflow" in col_lower or "expense" in col_lower):
-                    outflow_col = col
-                if inflow_col and outflow_col:
-                    break
-            # Fallback to exact/legacy logic if not found
-            if not inflow_col:
-                inflow_col = next((col_map[k] for k in ['credit', 'inflow', 'income', 'amount'] if k in col_map), None)
-            if not outflow_col:
-                outflow_col = next((col_map[k] for k in ['debit', 'outflow', 'expense', 'amount'] if k in col_map), None)
-            category_col = next((col_map[k] for k in ['category', 'type', 'group'] if k in col_map), None)
-            month_col = next((col_map[k] for k in ['month', 'period'] if k in col_map), None)
-            year_col = next((col_map[k] for k in ['year', 'fiscal_year'] if k in col_map), None)
+            columns = detect_columns(df)
+            inflow_col, outflow_col = columns['inflow'], columns['outflow']
+            category_col, month_col, year_col = columns['category'], columns['month'], columns['year']
             # KPIs
             if inflow_col and outflow_col and inflow_col != outflow_col:
                 inflow = pd.to_numeric(df[inflow_col], errors='coerce').sum()
@@ -62,12 +84,14 @@ class FinanceSheetAnalyzer:
                 result['net_balance'] = inflow - outflow
             else:
                 result['total_inflows'] = result['total_outflows'] = result['net_balance'] = 0
-            # Monthly average
-            if month_col and inflow_col and outflow_col and inflow_col != outflow_col:
-                monthly_avg = (df.groupby(month_col)[inflow_col].sum() - df.groupby(month_col)[outflow_col].sum()).mean()
-                result['monthly_average'] = monthly_avg
+            # Monthly average: mean net per calendar month, as in analyze_consolidated
+            if month_col and (inflow_col or outflow_col):
+                from agents.finance_ingest import FinanceAggregate, normalize_transactions
+                monthly = FinanceAggregate.from_frame(normalize_transactions(df, "")).trends('month')
             else:
-                result['monthly_average'] = 'N/A'
+                monthly = pd.DataFrame()
+            result['monthly_average'] = monthly['Net'].mean() if not monthly.empty else 'N/A'
+            result['monthly_trends'] = monthly
             # Category breakdowns
             if category_col and inflow_col and outflow_col and inflow_col != outflow_col:
                 inflow_by_cat = df.groupby(category_col)[inflow_col].sum().sort_values(ascending=False)
@@ -86,39 +110,88 @@ class FinanceSheetAnalyzer:
                 result['yearly_trends'] = yearly
             else:
                 result['yearly_trends'] = pd.DataFrame()
-            # Insights & recommendations
-            result['insights'] = "<ul><li>Profitability status: <b>{}</b></li><li>Expense hotspots: <b>{}</b></li><li>Cash flow risks: <b>{}</b></li></ul>".format(
-                "Profitable" if result.get('net_balance', 0) > 0 else "Loss", 
-                ', '.join([str(x[0]) for x in result.get('top_outflow_categories', [])]) if result.get('top_outflow_categories', []) else "N/A", 
-                "High" if result.get('total_outflows', 0) > result.get('total_inflows', 0) else "Low")
-            result['recommendations'] = "<ul><li>Review top expense categories for optimization.</li><li>Monitor monthly averages for unusual spikes.</li><li>Consider strategies to increase inflows.</li></ul>"
-            # Improved LLM prompt for dashboard and visualization
-            dashboard_instruction = (
-                "You are a senior financial analyst and dashboard designer."
-                " Your task is to analyze the provided financial transaction data and deliver a report that includes:"
-                "\n- Key Financial KPIs (Total Inflows, Total Outflows, Net Balance, Monthly Average)"
-                "\n- Category-wise breakdowns (Top inflow/outflow categories, category contributions)"
-                "\n- Yearly and monthly trends (growth, decline, profitability timeline)"
-                "\n- Insights and observations (profitability status, expense hotspots, cash flow risks, ROI analysis)"
-                "\n- Actionable recommendations (optimization, strategy, risk mitigation)"
-                "\n- Step-by-step instructions for building a dashboard in Excel:"
-                "\n  * Use pivot tables for category, month, and year analysis"
-                "\n  * Create summary cards for KPIs"
-                "\n  * Add bar, pie, and line charts for trends and breakdowns"
-                "\n  * Highlight key findings and suggest next steps"
-                "\nBe concise but analytical, and always interpret the numbers for business impact."
-            )
-            prompt = (
-                f"Goal: {self.goal}\nBackstory: {self.backstory}\n"
-                "Instructions: " + dashboard_instruction + "\n"
-                "Data (first 50 rows):\n" + df.head(50).to_string(index=False)
-            )
-            llm_response = self.llm.query(prompt)
-            llm_output = llm_response.strip()
-            if not llm_output or llm_output == '**':
-                llm_output = "No clear financial insights detected. Please review your data for completeness, but here is a general suggestion: Consider adding more transaction details or categories for deeper analysis."
-            result['llm_analysis'] = llm_output
+            return self._finish(result, "Data (first 50 rows):\n" + df.head(50).to_string(index=False), cancel_token, on_chunk)
+        except Exception as e:
+            result['error'] = str(e)
             return result
+
+    def analyze_consolidated(self, aggregate, sample=None, cancel_token=None, on_chunk=None):
+        """
+        Build the analysis from merged partial aggregates of several sheets instead of one DataFrame.
+        Args:
+            aggregate (FinanceAggregate): Merged totals from ``agents.finance_ingest``.
+            sample (pd.DataFrame): A few normalized transactions to show the LLM.
+            cancel_token (CancelToken): Optional token to abort the LLM call.
+            on_chunk (callable): Optional callback receiving each streamed chunk.
+        Returns:
+            dict: Same keys as ``analyze``; trend tables use 'Inflow', 'Outflow' and 'Net' columns.
+                ``monthly_average`` is the mean net per calendar month (year and month), as in ``analyze``.
+        """
+        result = {}
+        if aggregate is None or not aggregate.rows:
+            result['error'] = "No data found in uploaded sheets. Please check your files."
+            return result
+        try:
+            result['debug_columns'] = str(sorted(aggregate.sources))
+            result['total_inflows'] = aggregate.inflows
+            result['total_outflows'] = aggregate.outflows
+            result['net_balance'] = aggregate.inflows - aggregate.outflows
+            monthly = aggregate.trends('month')
+            result['monthly_average'] = monthly['Net'].mean() if not monthly.empty else 'N/A'
+            result['monthly_trends'] = monthly
+            result['yearly_trends'] = aggregate.trends('year')
+            categories = aggregate.trends('category')
+            if not categories.empty:
+                inflow_by_cat = categories['Inflow'].sort_values(ascending=False)
+                outflow_by_cat = categories['Outflow'].sort_values(ascending=False)
+                result['category_inflows'] = inflow_by_cat.to_dict()
+                result['category_outflows'] = outflow_by_cat.to_dict()
+                result['top_inflow_categories'] = inflow_by_cat.head(3).reset_index().values.tolist()
+                result['top_outflow_categories'] = outflow_by_cat.head(3).reset_index().values.tolist()
+            else:
+                result['category_inflows'] = result['category_outflows'] = {}
+                result['top_inflow_categories'] = result['top_outflow_categories'] = []
+            sources = aggregate.trends('source').to_string()
+            data_text = f"Totals per source file/sheet:\n{sources}\n"
+            if sample is not None and not sample.empty:
+                data_text += "Data (first 50 rows):\n" + sample.head(50).to_string(index=False)
+            return self._finish(result, data_text, cancel_token, on_chunk)
         except Exception as e:
             result['error'] = str(e)
             return result
+
+    def _finish(self, result, data_text, cancel_token=None, on_chunk=None):
+        # Insights & recommendations
+        result['insights'] = "<ul><li>Profitability status: <b>{}</b></li><li>Expense hotspots: <b>{}</b></li><li>Cash flow risks: <b>{}</b></li></ul>".format(
+            "Profitable" if result.get('net_balance', 0) > 0 else "Loss", 
+            ', '.join([str(x[0]) for x in result.get('top_outflow_categories', [])]) if result.get('top_outflow_categories', []) else "N/A", 
+            "High" if result.get('total_outflows', 0) > result.get('total_inflows', 0) else "Low")
+        result['recommendations'] = "<ul><li>Review top expense categories for optimization.</li><li>Monitor monthly averages for unusual spikes.</li><li>Consider strategies to increase inflows.</li></ul>"
+        # Improved LLM prompt for dashboard and visualization
+        dashboard_instruction = (
+            "You are a senior financial analyst and dashboard designer."
+            " Your task is to analyze the provided financial transaction data and deliver a report that includes:"
+            "\n- Key Financial KPIs (Total Inflows, Total Outflows, Net Balance, Monthly Average)"
+            "\n- Category-wise breakdowns (Top inflow/outflow categories, category contributions)"
+            "\n- Yearly and monthly trends (growth, decline, profitability timeline)"
+            "\n- Insights and observations (profitability status, expense hotspots, cash flow risks, ROI analysis)"
+            "\n- Actionable recommendations (optimization, strategy, risk mitigation)"
+            "\n- Step-by-step instructions for building a dashboard in Excel:"
+            "\n  * Use pivot tables for category, month, and year analysis"
+            "\n  * Create summary cards for KPIs"
+            "\n  * Add bar, pie, and line charts for trends and breakdowns"
+            "\n  * Highlight key findings and suggest next steps"
+            "\nBe concise but analytical, and always interpret the numbers for business impact."
+        )
+        prompt = (
+            f"Goal: {self.goal}\nBackstory: {self.backstory}\n"
+            "Instructions: " + dashboard_instruction + "\n"
+            + data_text
+        )
+        llm_response = self.llm.query(prompt, cancel_token=cancel_token, on_chunk=on_chunk, num_predict=self.NUM_PREDICT,
+                                      deadline_s=self.DEADLINE_S, agent="finance_sheet_analyzer")
+        llm_output = llm_response.strip()
+        if not llm_output or llm_output == '**':
+            llm_output = "No clear financial insights detected. Please review your data for completeness, but here is a general suggestion: Consider adding more transaction details or categories for deeper analysis."
+        result['llm_analysis'] = llm_output
+        return result
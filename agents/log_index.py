@@ -0,0 +1,482 @@
+"""
+Log Index: On-disk, memory-mapped index of a log file for interactive drill-down.
+
+An index is built once per log (keyed by the content hash) and holds:
+    - offsets.bin: start offset of every line (uint64), so any line is one slice of the mmapped log
+    - times.bin / order.bin: line timestamps sorted ascending and the line numbers in that order,
+      so a time range is two binary searches
+    - bitmaps.bin: one bitmap per level and per component, combined with bitwise AND/OR
+
+Queries such as "ERROR lines from the auth module between 02:00 and 02:15" therefore
+never re-read or re-parse the log, and the matching subset can be sent to the LLM
+for a focused follow-up analysis.
+"""
+import bisect
+import calendar
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+
+from agents.log_tail import line_level
+
+DEFAULT_INDEX_DIR = os.environ.get(
+    "AI_AGENTS_LOG_INDEX_DIR",
+    os.path.join(os.path.expanduser("~"), ".ai_agents", "log_index"),
+)
+# Indexes kept open (mmapped) in this process, and index directories kept on disk.
+MAX_OPEN_INDEXES = int(os.environ.get("AI_AGENTS_LOG_INDEX_MAX_OPEN", "8"))
+MAX_INDEX_DIRS = int(os.environ.get("AI_AGENTS_LOG_INDEX_MAX_DIRS", "20"))
+INDEX_VERSION = 1
+LEVELS = ("CRITICAL", "FATAL", "ERROR", "WARN", "INFO", "DEBUG", "TRACE", "OTHER")
+
+_ISO_TS = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d+))?\s*(Z|[+-]\d{2}:?\d{2})?"
+)
+_SYSLOG_TS = re.compile(r"^(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+(\d{1,2}) (\d{2}):(\d{2}):(\d{2})")
+_MONTHS = {name: i for i, name in enumerate(("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                                             "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+# "[auth]" / "[auth.service]", otherwise the logger name after the level: "ERROR auth.service: ..." or "ERROR auth - ...".
+_BRACKET_COMPONENT = re.compile(r"\[([A-Za-z][\w.\-/]{0,63})\]")
+_LEVEL_COMPONENT = re.compile(
+    r"\b(?:CRITICAL|FATAL|ERROR|WARN(?:ING)?|INFO|DEBUG|TRACE)\b[:\s]+([A-Za-z][\w.\-/]{0,63})(?::|\s+-\s)", re.IGNORECASE
+)
+_NOT_COMPONENTS = {level.lower() for level in LEVELS} | {"warning", "main"}
+
+
+def parse_timestamp(line, default_year=1970):
+    """
+    Return the timestamp at the start of a log line as UTC epoch seconds, or None.
+    ISO 8601 ("2024-05-01 02:03:04,123") and syslog ("May  1 02:03:04") formats are
+    recognised; times without a zone are treated as UTC.
+    """
+    m = _ISO_TS.search(line, 0, 64)
+    if m:
+        year, month, day, hour, minute, second, fraction, zone = m.groups()
+        seconds = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+        if fraction:
+            seconds += float("0." + fraction)
+        if zone and zone != "Z":
+            sign = 1 if zone[0] == "+" else -1
+            zone = zone[1:].replace(":", "")
+            seconds -= sign * (int(zone[:2]) * 3600 + int(zone[2:]) * 60)
+        return float(seconds)
+    m = _SYSLOG_TS.match(line)
+    if m:
+        month, day, hour, minute, second = m.groups()
+        return float(calendar.timegm((default_year, _MONTHS[month], int(day), int(hour), int(minute), int(second))))
+    return None
+
+
+def line_component(line):
+    """
+    Return the component (module/logger name) of a log line, or None.
+    """
+    for m in _BRACKET_COMPONENT.finditer(line, 0, 200):
+        name = m.group(1)
+        if name.lower() not in _NOT_COMPONENTS and not name.isdigit():
+            return name
+    m = _LEVEL_COMPONENT.search(line, 0, 200)
+    if m and m.group(1).lower() not in _NOT_COMPONENTS:
+        return m.group(1)
+    return None
+
+
+def _popcount(mask):
+    return mask.bit_count() if hasattr(mask, "bit_count") else bin(mask).count("1")
+
+
+def _set_bits(line_numbers, size):
+    bits = bytearray((size + 7) // 8)
+    for n in line_numbers:
+        bits[n >> 3] |= 1 << (n & 7)
+    return bits
+
+
+class LogSelection:
+    """
+    Result of a LogIndex query: a bitmap of matching line numbers.
+    """
+    def __init__(self, index, mask):
+        self.index = index
+        self.mask = mask
+        self.count = _popcount(mask)
+
+    def line_numbers(self, limit=None):
+        """
+        Return matching line numbers (0-based) in file order, at most ``limit``.
+        """
+        numbers = []
+        data = self.mask.to_bytes((self.index.line_count + 7) // 8 or 1, "little")
+        for byte_no, byte in enumerate(data):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte >> bit & 1:
+                    numbers.append(byte_no * 8 + bit)
+                    if limit is not None and len(numbers) >= limit:
+                        return numbers
+        return numbers
+
+    def lines(self, limit=None):
+        """
+        Return the matching lines' text in file order, at most ``limit``.
+        """
+        return [self.index.line(n) for n in self.line_numbers(limit)]
+
+    def text(self, limit=None, max_chars=None):
+        """
+        Return the matching lines joined with newlines, optionally capped at ``max_chars``
+        (whole lines only) so a selection fits in an LLM prompt.
+        """
+        if max_chars is None:
+            return "\n".join(self.lines(limit))
+        parts = []
+        size = 0
+        for line in self.lines(limit):
+            size += len(line) + 1
+            if size > max_chars:
+                break
+            parts.append(line)
+        return "\n".join(parts)
+
+
+class LogIndex:
+    """
+    Read-only view of an index directory built by ``LogIndex.build``.
+
+    Indexes from ``get_log_index`` are shared between sessions and leased: use them in a
+    ``with`` block (or call ``release``) so an evicted index is only closed once no one
+    is querying it.
+    """
+    def __init__(self, directory):
+        """
+        Open an existing index.
+        Args:
+            directory (str): Index directory containing log, meta.json and the .bin files.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.line_count = self.meta["lines"]
+        self._files = []
+        self._log = self._map("log")
+        self.offsets = self._map("offsets.bin", "Q")
+        self.times = self._map("times.bin", "d")
+        self.order = self._map("order.bin", "I")
+        self._bitmaps = self._map("bitmaps.bin")
+        self._masks = {}
+        self._leases = 0
+        self._retired = False
+        self._lease_lock = threading.Lock()
+
+    def _map(self, name, typecode=None):
+        path = os.path.join(self.directory, name)
+        if os.path.getsize(path) == 0:
+            return memoryview(array(typecode) if typecode else b"")
+        f = open(path, "rb")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append((f, mapped))
+        view = memoryview(mapped)
+        return view.cast(typecode) if typecode else view
+
+    def acquire(self):
+        """
+        Take a lease; the index stays open until every lease is released.
+        """
+        with self._lease_lock:
+            if self._retired and not self._leases:
+                raise ValueError(f"Log index {self.directory} is closed")
+            self._leases += 1
+        return self
+
+    def release(self):
+        """
+        Give back a lease; closes the index if it was retired and this was the last lease.
+        """
+        with self._lease_lock:
+            self._leases -= 1
+            close = self._retired and self._leases == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """
+        Close the index once the last lease is released (at once if none is held).
+        """
+        with self._lease_lock:
+            self._retired = True
+            close = self._leases == 0
+        if close:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        for view in (self._log, self.offsets, self.times, self.order, self._bitmaps):
+            view.release()
+        for f, mapped in self._files:
+            mapped.close()
+            f.close()
+        self._files = []
+
+    @classmethod
+    def build(cls, log_path, directory, max_components=256):
+        """
+        Index a log file into ``directory`` (the log is copied there).
+        Lines without a timestamp (e.g. stack-trace continuations) inherit the previous
+        line's timestamp and level, so they stay with the entry they belong to.
+        Args:
+            log_path (str): Log file to index.
+            directory (str): Destination; written atomically via a temporary sibling directory.
+            max_components (int): Cap on distinct components given their own bitmap.
+        Returns:
+            LogIndex: The opened index.
+        """
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".building-")
+        try:
+            shutil.copyfile(log_path, os.path.join(tmp, "log"))
+            offsets = array("Q")
+            times = array("d")
+            levels = {}
+            components = {}
+            last_time = None
+            last_level = "OTHER"
+            position = 0
+            with open(os.path.join(tmp, "log"), "rb") as f:
+                for n, raw in enumerate(f):
+                    offsets.append(position)
+                    position += len(raw)
+                    line = raw.decode("utf-8", errors="replace")
+                    timestamp = parse_timestamp(line)
+                    if timestamp is not None:
+                        last_time = timestamp
+                        last_level = line_level(line)
+                        level = last_level
+                    else:
+                        level = line_level(line)
+                        if level == "OTHER":
+                            level = last_level
+                    times.append(last_time if last_time is not None else float("nan"))
+                    levels.setdefault(level, []).append(n)
+                    component = line_component(line)
+                    if component and (component in components or len(components) < max_components):
+                        components.setdefault(component, []).append(n)
+            offsets.append(position)
+            count = len(times)
+
+            # Lines before the first timestamp sort first.
+            first_time = next((t for t in times if t == t), 0.0)
+            times = array("d", (t if t == t else first_time for t in times))
+            monotonic = all(times[i] <= times[i + 1] for i in range(count - 1))
+            order = array("I", range(count)) if monotonic else array("I", sorted(range(count), key=times.__getitem__))
+            sorted_times = times if monotonic else array("d", (times[i] for i in order))
+
+            bitmap_layout = {"levels": {}, "components": {}}
+            with open(os.path.join(tmp, "bitmaps.bin"), "wb") as f:
+                for kind, groups in (("levels", levels), ("components", components)):
+                    for name, numbers in sorted(groups.items()):
+                        bits = _set_bits(numbers, count)
+                        bitmap_layout[kind][name] = [f.tell(), len(bits), len(numbers)]
+                        f.write(bits)
+            for name, values in (("offsets.bin", offsets), ("times.bin", sorted_times), ("order.bin", order)):
+                with open(os.path.join(tmp, name), "wb") as f:
+                    values.tofile(f)
+            meta = {
+                "version": INDEX_VERSION,
+                "source": os.path.basename(log_path),
+                "lines": count,
+                "bytes": position,
+                "monotonic": monotonic,
+                "time_range": [sorted_times[0], sorted_times[-1]] if count and last_time is not None else None,
+                "bitmaps": bitmap_layout,
+            }
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            try:
+                os.replace(tmp, directory)
+            except OSError:
+                # Another process finished the same index first.
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        logging.info(f"Indexed {count} log lines into {directory}")
+        return cls(directory)
+
+    def line(self, n):
+        """
+        Return line ``n`` (0-based) without its trailing newline.
+        """
+        return bytes(self._log[self.offsets[n]:self.offsets[n + 1]]).decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def levels(self):
+        """
+        Return {level: line count} for the levels present in the log.
+        """
+        return {name: entry[2] for name, entry in self.meta["bitmaps"]["levels"].items()}
+
+    def components(self):
+        """
+        Return {component: line count}, most frequent first.
+        """
+        entries = self.meta["bitmaps"]["components"].items()
+        return {name: entry[2] for name, entry in sorted(entries, key=lambda item: -item[1][2])}
+
+    def time_range(self):
+        """
+        Return (first, last) timestamp as UTC epoch seconds, or None if the log has no timestamps.
+        """
+        time_range = self.meta["time_range"]
+        return tuple(time_range) if time_range else None
+
+    def _bitmap(self, kind, name):
+        key = (kind, name)
+        if key not in self._masks:
+            entry = self.meta["bitmaps"][kind].get(name)
+            if entry is None:
+                self._masks[key] = 0
+            else:
+                offset, size, _ = entry
+                self._masks[key] = int.from_bytes(self._bitmaps[offset:offset + size], "little")
+        return self._masks[key]
+
+    def _time_mask(self, start, end):
+        lo = 0 if start is None else bisect.bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect.bisect_right(self.times, end)
+        if lo >= hi:
+            return 0
+        if self.meta["monotonic"]:
+            return ((1 << hi) - 1) ^ ((1 << lo) - 1)
+        return int.from_bytes(_set_bits(self.order[lo:hi], self.line_count), "little")
+
+    def query(self, start=None, end=None, levels=None, components=None):
+        """
+        Select lines by time range, level and component.
+        Args:
+            start (float): Inclusive lower bound, UTC epoch seconds (None = unbounded).
+            end (float): Inclusive upper bound, UTC epoch seconds (None = unbounded).
+            levels (list[str]): Keep lines with any of these levels (None = all).
+            components (list[str]): Keep lines from any of these components (None = all).
+        Returns:
+            LogSelection: Matching lines.
+        """
+        mask = (1 << self.line_count) - 1
+        if start is not None or end is not None:
+            mask &= self._time_mask(start, end)
+        for kind, names in (("levels", levels), ("components", components)):
+            if names:
+                selected = 0
+                for name in names:
+                    selected |= self._bitmap(kind, name)
+                mask &= selected
+        return LogSelection(self, mask)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+# One lock per index directory, so a build only blocks sessions waiting for the same log.
+_build_locks = {}
+
+
+def get_log_index(log_text, root=None):
+    """
+    Return a lease on the index for a log's content, building it on first use.
+    Use the result in a ``with`` block, or call ``release()`` when done. At most
+    MAX_OPEN_INDEXES indexes stay in the shared cache; an evicted index is closed when
+    its last lease is released. Building an index also removes the least recently used
+    index directories beyond MAX_INDEX_DIRS.
+    Args:
+        log_text (str or bytes): Log content (e.g. an uploaded file).
+        root (str): Directory holding one index per content hash (defaults to AI_AGENTS_LOG_INDEX_DIR).
+    Returns:
+        LogIndex: Shared, read-only index, leased to the caller.
+    """
+    data = log_text.encode("utf-8") if isinstance(log_text, str) else log_text
+    digest = hashlib.sha256(data).hexdigest()
+    root = root or DEFAULT_INDEX_DIR
+    directory = os.path.join(root, digest[:32])
+    index = _lease_cached(directory)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        build_lock = _build_locks.setdefault(directory, threading.Lock())
+    with build_lock:
+        # Another session may have opened or built it while this one waited.
+        index = _lease_cached(directory)
+        if index is not None:
+            return index
+        index = _open_or_build(directory, data)
+        with _indexes_lock:
+            index.acquire()
+            _indexes[directory] = index
+            _build_locks.pop(directory, None)
+            while len(_indexes) > MAX_OPEN_INDEXES:
+                _, evicted = _indexes.popitem(last=False)
+                evicted.retire()
+            _prune_index_dirs(root)
+        return index
+
+
+def _lease_cached(directory):
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            return None
+        _indexes.move_to_end(directory)
+        _touch(directory)
+        return index.acquire()
+
+
+def _open_or_build(directory, data):
+    # Runs without _indexes_lock, under the directory's build lock.
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            current = json.load(f).get("version") == INDEX_VERSION
+        if current:
+            _touch(directory)
+            return LogIndex(directory)
+        shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(directory), suffix=".log", delete=False) as f:
+        f.write(data)
+    try:
+        index = LogIndex.build(f.name, directory)
+    finally:
+        os.unlink(f.name)
+    _touch(directory)
+    return index
+
+
+def _touch(directory):
+    # The directory mtime records last use, for _prune_index_dirs.
+    try:
+        os.utime(directory)
+    except OSError:
+        pass
+
+
+def _prune_index_dirs(root):
+    # Called with _indexes_lock held; cached indexes are never removed.
+    directories = [os.path.join(root, name) for name in os.listdir(root) if not name.startswith(".")]
+    directories = [d for d in directories if os.path.isdir(d)]
+    directories.sort(key=os.path.getmtime, reverse=True)
+    for stale in directories[MAX_INDEX_DIRS:]:
+        if stale in _indexes:
+            continue
+        shutil.rmtree(stale, ignore_errors=True)
+        logging.info(f"Removed stale log index {stale}")
@@ -0,0 +1,314 @@
+"""
+Log Tail: Follow a growing log file and analyze it incrementally.
+
+Deterministic counters (levels, message templates, a sliding error-rate window) are
+updated for every new line; the LLM is only called when the window's error rate or
+the number of never-seen-before templates crosses a threshold, and those calls are
+debounced and batched so a burst of errors produces one report, not hundreds.
+With ``background=True`` the LLM runs on a worker thread, so polling never waits for it.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+_LEVEL = re.compile(r"\b(CRITICAL|FATAL|ERROR|WARN(?:ING)?|INFO|DEBUG|TRACE)\b", re.IGNORECASE)
+_ERROR_LEVELS = {"CRITICAL", "FATAL", "ERROR"}
+# Masks applied in order to turn a log line into its message template.
+_TEMPLATE_MASKS = [
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<TS>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<UUID>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-f]+\b|\b[0-9a-f]{12,}\b", re.IGNORECASE), "<HEX>"),
+    (re.compile(r"\d+"), "<N>"),
+]
+
+
+def line_level(line):
+    """
+    Return the upper-cased log level found in a line ('WARN' for WARNING), or 'OTHER'.
+    """
+    m = _LEVEL.search(line)
+    if not m:
+        return "OTHER"
+    level = m.group(1).upper()
+    return "WARN" if level == "WARNING" else level
+
+
+def line_template(line):
+    """
+    Return the message template of a log line with variable parts masked.
+    """
+    template = line.strip()
+    for pattern, token in _TEMPLATE_MASKS:
+        template = pattern.sub(token, template)
+    return template
+
+
+class LogFollower:
+    """
+    Poll a file for appended lines, surviving truncation and rotation.
+    """
+    def __init__(self, path, from_start=False):
+        """
+        Initialize the LogFollower.
+        Args:
+            path (str): Log file to follow.
+            from_start (bool): Read existing content first instead of starting at the end.
+        """
+        self.path = path
+        self._offset = 0
+        self._inode = None
+        self._partial = b""
+        if not from_start and os.path.exists(path):
+            st = os.stat(path)
+            self._offset, self._inode = st.st_size, st.st_ino
+
+    def read_new_lines(self, max_bytes=8 * 1024 * 1024):
+        """
+        Return complete lines appended since the last call.
+        Args:
+            max_bytes (int): Upper bound on bytes read per call, so a huge backlog is consumed in chunks.
+        Returns:
+            list[str]: New lines without trailing newlines.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if self._inode is not None and (st.st_ino != self._inode or st.st_size < self._offset):
+            # Rotated or truncated: start over on the new file.
+            self._offset, self._partial = 0, b""
+        self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(max_bytes)
+        self._offset += len(data)
+        data = self._partial + data
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines]
+
+
+class LogStats:
+    """
+    Incremental counters over a log stream with a sliding time window.
+    """
+    def __init__(self, window_seconds=60, max_templates=10000):
+        """
+        Initialize the LogStats.
+        Args:
+            window_seconds (float): Width of the sliding window used for error rates.
+            max_templates (int): Cap on distinct templates tracked (later ones count as 'other').
+        """
+        self.window_seconds = window_seconds
+        self.max_templates = max_templates
+        self.total_lines = 0
+        self.levels = Counter()
+        self.templates = Counter()
+        self._window = deque()  # (timestamp, is_error, is_new_template)
+        self._window_errors = 0
+        self._window_new = 0
+
+    def add(self, line, now):
+        """
+        Count one line observed at time ``now``.
+        Returns:
+            tuple: (level, template, is_new_template)
+        """
+        level = line_level(line)
+        template = line_template(line)
+        is_new = template not in self.templates
+        if is_new and len(self.templates) >= self.max_templates:
+            template, is_new = "<other>", False
+        self.total_lines += 1
+        self.levels[level] += 1
+        self.templates[template] += 1
+        is_error = level in _ERROR_LEVELS
+        self._window.append((now, is_error, is_new))
+        self._window_errors += is_error
+        self._window_new += is_new
+        return level, template, is_new
+
+    def expire(self, now):
+        """
+        Drop window entries older than ``window_seconds``.
+        """
+        cutoff = now - self.window_seconds
+        while self._window and self._window[0][0] < cutoff:
+            _, is_error, is_new = self._window.popleft()
+            self._window_errors -= is_error
+            self._window_new -= is_new
+
+    def window_summary(self):
+        """
+        Return line count, error rate and new-template count for the current window.
+        """
+        lines = len(self._window)
+        return {
+            "lines": lines,
+            "errors": self._window_errors,
+            "error_rate": self._window_errors / lines if lines else 0.0,
+            "new_templates": self._window_new,
+        }
+
+    def top_templates(self, n=10):
+        return self.templates.most_common(n)
+
+
+class TailAnalyzer:
+    """
+    Drive a SystemLogAnalyzer from a followed log file, calling the LLM only on triggers.
+    """
+    def __init__(self, path, analyzer=None, window_seconds=60, error_rate_threshold=0.2,
+                 new_template_threshold=5, min_window_lines=20, debounce_seconds=30,
+                 max_batch_lines=500, from_start=False, background=False):
+        """
+        Initialize the TailAnalyzer.
+        Args:
+            path (str): Log file to follow.
+            analyzer: Object with an ``analyze(text, use_cache=...)`` method, which also takes
+                ``cancel_token=`` in background mode (a SystemLogAnalyzer by default).
+            window_seconds (float): Sliding window width.
+            error_rate_threshold (float): Window error rate that triggers an analysis.
+            new_template_threshold (int): New templates within the window that trigger an analysis.
+            min_window_lines (int): Minimum window size before the error rate is trusted.
+            debounce_seconds (float): Minimum time between LLM calls.
+            max_batch_lines (int): Most recent lines sent to the LLM per call.
+            from_start (bool): Analyze the file's existing content too.
+            background (bool): Run the LLM on a worker thread; ``feed``/``poll`` then return
+                immediately and finished reports appear in ``reports`` (see ``analyzing``).
+        """
+        if analyzer is None:
+            from agents.system_log_analyzer import SystemLogAnalyzer
+            analyzer = SystemLogAnalyzer()
+        self.analyzer = analyzer
+        self.follower = LogFollower(path, from_start=from_start)
+        self.stats = LogStats(window_seconds=window_seconds)
+        self.error_rate_threshold = error_rate_threshold
+        self.new_template_threshold = new_template_threshold
+        self.min_window_lines = min_window_lines
+        self.debounce_seconds = debounce_seconds
+        self._pending = deque(maxlen=max_batch_lines)
+        self._pending_reasons = set()
+        self._last_call = None
+        self.llm_calls = 0
+        self.failed_calls = 0
+        self.reports = []
+        self.background = background
+        self._executor = None
+        self._running = None
+        self._cancel_token = None
+        self._reports_lock = threading.Lock()
+
+    @property
+    def analyzing(self):
+        """
+        True while a background analysis is running.
+        """
+        return self._running is not None and not self._running.done()
+
+    def recent_reports(self, n=3):
+        """
+        Return the last ``n`` reports, oldest first (safe while a background analysis appends).
+        """
+        with self._reports_lock:
+            return list(self.reports[-n:])
+
+    def close(self):
+        """
+        Cancel a running background analysis and stop the worker thread.
+        """
+        if self._cancel_token is not None:
+            self._cancel_token.cancel("tail closed")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _trigger_reasons(self):
+        window = self.stats.window_summary()
+        reasons = set()
+        if window["lines"] >= self.min_window_lines and window["error_rate"] >= self.error_rate_threshold:
+            reasons.add(f"error rate {window['error_rate']:.0%} over the last {self.stats.window_seconds}s")
+        if window["new_templates"] >= self.new_template_threshold:
+            reasons.add(f"{window['new_templates']} new message templates in the last {self.stats.window_seconds}s")
+        return reasons
+
+    def feed(self, lines, now=None):
+        """
+        Update counters with new lines and run the LLM if a trigger fired and the debounce allows it.
+        Args:
+            lines (list[str]): New log lines.
+            now (float): Current time (defaults to ``time.time()``).
+        Returns:
+            dict or None: The new report, if the LLM was called (always None in background mode).
+        """
+        now = time.time() if now is None else now
+        for line in lines:
+            if line.strip():
+                self.stats.add(line, now)
+                self._pending.append(line)
+        self.stats.expire(now)
+        self._pending_reasons |= self._trigger_reasons()
+        if not self._pending_reasons or not self._pending:
+            return None
+        if self._last_call is not None and now - self._last_call < self.debounce_seconds:
+            return None
+        if self.analyzing:
+            # Lines and reasons stay pending for the next call once this one finishes.
+            return None
+        return self._analyze(now)
+
+    def poll(self, now=None):
+        """
+        Read new lines from the file and feed them; see ``feed``.
+        """
+        return self.feed(self.follower.read_new_lines(), now=now)
+
+    def _analyze(self, now):
+        reasons = sorted(self._pending_reasons)
+        batch = list(self._pending)
+        self._pending.clear()
+        self._pending_reasons.clear()
+        self._last_call = now
+        window = self.stats.window_summary()
+        context = (
+            "Live tail trigger: " + "; ".join(reasons) + "\n"
+            f"Totals so far: {self.stats.total_lines} lines, levels {dict(self.stats.levels)}\n"
+            "Top message templates:\n" + "\n".join(f"{count}x {template}" for template, count in self.stats.top_templates(5)) + "\n"
+            f"Recent lines ({len(batch)}):\n"
+        )
+        logging.info(f"Tail analysis triggered ({'; '.join(reasons)}), sending {len(batch)} lines")
+        report = {"time": now, "reasons": reasons, "lines": len(batch), "window": window}
+        text = context + "\n".join(batch)
+        if not self.background:
+            return self._run(report, text)
+        if self._executor is None:
+            from llm.cancellation import CancelToken
+
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-tail")
+            self._cancel_token = CancelToken()
+        self._running = self._executor.submit(self._run, report, text, self._cancel_token)
+        return None
+
+    def _run(self, report, text, cancel_token=None):
+        # Each trigger covers new lines, so never answer it with an earlier batch's cached report.
+        kwargs = {"cancel_token": cancel_token} if cancel_token is not None else {}
+        try:
+            result = self.analyzer.analyze(text, use_cache=False, **kwargs)
+        except Exception as e:
+            logging.error(f"Tail analysis failed: {e}")
+            result = f"Error: Tail analysis failed. Details: {e}"
+        if isinstance(result, str) and result.startswith("Error:"):
+            self.failed_calls += 1
+        else:
+            self.llm_calls += 1
+        report["report"] = result
+        with self._reports_lock:
+            self.reports.append(report)
+        return report
@@ -0,0 +1,116 @@
+"""
+Requirements Pre-processor: Split a requirements document into atomic requirements
+and cluster near-duplicates before test-case generation.
+
+Near-duplicates are found with word-shingle MinHash signatures and an LSH index, so
+clustering stays close to linear in the number of requirements.
+"""
+import hashlib
+import re
+
+from agents.similarity import LSHIndex, MinHash
+
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+•]|\(?\d+(?:\.\d+)*[.)]|\(?[a-zA-Z][.)])\s+")
+_HEADER = re.compile(r"^\s*#{1,6}\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+_NORMALIZE = re.compile(r"[^a-z0-9]+")
+
+
+def split_requirements(text):
+    """
+    Split a requirements document into atomic requirement statements.
+    List items (bulleted or numbered) are one requirement each; free-text paragraphs
+    are split into sentences. Markdown headers are kept as context, not requirements.
+    Args:
+        text (str): The requirements document.
+    Returns:
+        list[str]: Requirement statements in document order.
+    """
+    requirements = []
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            joined = " ".join(paragraph)
+            requirements.extend(s.strip() for s in _SENTENCE_END.split(joined) if s.strip())
+            paragraph.clear()
+
+    for line in (text or "").splitlines():
+        stripped = line.strip()
+        if not stripped or _HEADER.match(stripped):
+            flush()
+            continue
+        if _LIST_ITEM.match(stripped):
+            flush()
+            item = _LIST_ITEM.sub("", stripped, count=1).strip()
+            if item:
+                requirements.append(item)
+        elif requirements and not paragraph and line[:1].isspace():
+            # Indented continuation of the previous list item.
+            requirements[-1] = requirements[-1] + " " + stripped
+        else:
+            paragraph.append(stripped)
+    flush()
+    return requirements
+
+
+def requirement_key(text):
+    """
+    Return a short stable key for a requirement, insensitive to case, spacing and punctuation.
+    Args:
+        text (str): Requirement statement.
+    Returns:
+        str: 8-character hex key.
+    """
+    normalized = _NORMALIZE.sub(" ", text.lower()).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:8]
+
+
+class RequirementCluster:
+    """
+    A group of near-identical requirements represented by its first member.
+    """
+    def __init__(self, representative):
+        self.representative = representative
+        self.members = [representative]
+        self.key = requirement_key(representative)
+
+    def __repr__(self):
+        return f"RequirementCluster(key={self.key!r}, members={len(self.members)})"
+
+
+def cluster_requirements(requirements, threshold=0.7, num_perm=64, bands=16, shingle_size=2):
+    """
+    Group near-duplicate requirements.
+    Each requirement joins the most similar existing cluster whose representative is at
+    least ``threshold`` similar; otherwise it starts a new cluster. Document order is kept.
+    Args:
+        requirements (list[str]): Atomic requirement statements.
+        threshold (float): Minimum estimated Jaccard similarity to merge.
+        num_perm (int): MinHash signature length.
+        bands (int): LSH bands.
+        shingle_size (int): Words per shingle (requirements are short, so 2 works well).
+    Returns:
+        list[RequirementCluster]: Clusters in order of first appearance.
+    """
+    minhash = MinHash(num_perm=num_perm)
+    index = LSHIndex(num_perm=num_perm, bands=bands)
+    clusters = []
+    exact = {}
+    for text in requirements:
+        key = requirement_key(text)
+        if key in exact:
+            exact[key].members.append(text)
+            continue
+        signature = minhash.fingerprint(text, shingle_size)
+        matches = index.query(signature, threshold=threshold)
+        if matches:
+            cluster = clusters[matches[0][0]]
+            cluster.members.append(text)
+            exact[key] = cluster
+            continue
+        cluster = RequirementCluster(text)
+        exact[key] = cluster
+        index.add(len(clusters), signature)
+        clusters.append(cluster)
+    return clusters
@@ -0,0 +1,364 @@
+"""
+Schemas: JSON schemas for structured agent output and the typed results they validate into.
+
+The schemas are passed to Ollama's ``format`` option so the model emits JSON that
+matches them; ``from_json`` then validates and normalizes that JSON into plain
+result objects the UI can render without re-parsing Markdown.
+"""
+import json
+
+
+class StructuredOutputError(ValueError):
+    """
+    Raised when the model's output is missing, not JSON, or does not match the schema.
+    """
+
+
+def _string_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [line.strip() for line in value.splitlines() if line.strip()]
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    raise StructuredOutputError(f"Expected a list of strings, got {type(value).__name__}")
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "; ".join(str(v) for v in value)
+    return str(value).strip()
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _cell(value):
+    # Markdown table cells cannot contain pipes or newlines.
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def _load(text, required):
+    if not text or not text.strip():
+        raise StructuredOutputError("The model returned an empty response.")
+    if text.startswith("Error:"):
+        raise StructuredOutputError(text)
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise StructuredOutputError(f"The model did not return valid JSON: {e}")
+    if not isinstance(data, dict):
+        raise StructuredOutputError("Expected a JSON object at the top level.")
+    missing = [key for key in required if key not in data]
+    if missing:
+        raise StructuredOutputError(f"Missing required fields: {', '.join(missing)}")
+    return data
+
+
+TEST_CASE_SUITE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "test_cases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "test_case_id": {"type": "string"},
+                    "title": {"type": "string"},
+                    "type": {"type": "string", "enum": ["positive", "negative", "boundary"]},
+                    "preconditions": {"type": "string"},
+                    "test_steps": {"type": "array", "items": {"type": "string"}},
+                    "input_data": {"type": "string"},
+                    "expected_results": {"type": "string"},
+                },
+                "required": ["test_case_id", "title", "test_steps", "expected_results"],
+            },
+        },
+    },
+    "required": ["test_cases"],
+}
+
+# Batch variant for SmartUnitTestGenerator's de-duplicated runs: each test case also
+# names the numbered requirement (R1, R2, ...) of the batch prompt it covers.
+TEST_CASE_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "test_cases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "requirement": {"type": "string"},
+                    **TEST_CASE_SUITE_SCHEMA["properties"]["test_cases"]["items"]["properties"],
+                },
+                "required": ["requirement", "title", "test_steps", "expected_results"],
+            },
+        },
+    },
+    "required": ["test_cases"],
+}
+
+
+class TestCase:
+    """
+    One QA test case.
+    """
+    # Not a pytest test class despite the name.
+    __test__ = False
+
+    def __init__(self, test_case_id, title, preconditions="", test_steps=None, input_data="",
+                 expected_results="", actual_result="", case_type=""):
+        self.test_case_id = test_case_id
+        self.title = title
+        self.preconditions = preconditions
+        self.test_steps = test_steps or []
+        self.input_data = input_data
+        self.expected_results = expected_results
+        self.actual_result = actual_result
+        self.case_type = case_type
+
+    @classmethod
+    def from_dict(cls, item, test_case_id):
+        """
+        Build a test case from one schema item, normalizing loosely typed fields.
+        """
+        return cls(
+            test_case_id=test_case_id,
+            title=_text(item.get("title")),
+            preconditions=_text(item.get("preconditions")),
+            test_steps=_string_list(item.get("test_steps")),
+            input_data=_text(item.get("input_data")),
+            expected_results=_text(item.get("expected_results")),
+            case_type=_text(item.get("type")),
+        )
+
+    def to_cells(self):
+        """
+        Return the row values after the Test Case ID, escaped for a Markdown table.
+        """
+        return [_cell(value) for column, value in self.to_row().items() if column != "Test Case ID"]
+
+    def to_row(self):
+        """
+        Return the test case as a dict keyed by the standard column names.
+        """
+        return {
+            "Test Case ID": self.test_case_id,
+            "Title": self.title,
+            "Preconditions": self.preconditions,
+            "Test Steps": " ".join(f"{i}. {step}" for i, step in enumerate(self.test_steps, 1)),
+            "Input Data": self.input_data,
+            "Expected Results": self.expected_results,
+            "Actual Result": self.actual_result,
+        }
+
+
+def load_test_case_batch(text):
+    """
+    Validate a batch response (TEST_CASE_BATCH_SCHEMA) into test cases tagged with their requirement.
+    Args:
+        text (str): JSON matching TEST_CASE_BATCH_SCHEMA.
+    Returns:
+        list[tuple[str, TestCase]]: (requirement reference as given, e.g. 'R2', test case) pairs;
+            the test cases have no ID yet.
+    Raises:
+        StructuredOutputError: If the JSON is invalid or 'test_cases' is not a list.
+    """
+    data = _load(text, ["test_cases"])
+    if not isinstance(data["test_cases"], list):
+        raise StructuredOutputError("'test_cases' must be a list.")
+    return [(_text(item.get("requirement")), TestCase.from_dict(item, ""))
+            for item in data["test_cases"] if isinstance(item, dict)]
+
+
+class TestCaseSuite:
+    """
+    Validated set of test cases produced by SmartUnitTestGenerator.
+    """
+    __test__ = False
+
+    def __init__(self, test_cases):
+        self.test_cases = test_cases
+        # SimilarityCache hit when the suite was reused instead of generated.
+        self.cache_hit = None
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Validate the model's JSON into a TestCaseSuite.
+        Args:
+            text (str): JSON matching TEST_CASE_SUITE_SCHEMA.
+        Returns:
+            TestCaseSuite: Parsed suite; IDs are filled in (TC-001, ...) where missing or duplicated.
+        Raises:
+            StructuredOutputError: If the JSON is invalid or contains no test cases.
+        """
+        data = _load(text, ["test_cases"])
+        if not isinstance(data["test_cases"], list):
+            raise StructuredOutputError("'test_cases' must be a list.")
+        cases = []
+        seen = set()
+        for n, item in enumerate(data["test_cases"], 1):
+            if not isinstance(item, dict):
+                continue
+            case_id = _text(item.get("test_case_id")) or f"TC-{n:03d}"
+            if case_id in seen:
+                case_id = f"{case_id}-{n}"
+            seen.add(case_id)
+            cases.append(TestCase.from_dict(item, case_id))
+        if not cases:
+            raise StructuredOutputError("The model returned no test cases.")
+        return cls(cases)
+
+    def rows(self):
+        return [case.to_row() for case in self.test_cases]
+
+    def to_markdown(self):
+        """
+        Render the suite as the standard Markdown test-case table.
+        """
+        rows = self.rows()
+        columns = list(rows[0].keys()) if rows else []
+        lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+        for row in rows:
+            lines.append("| " + " | ".join(_cell(row[c]) for c in columns) + " |")
+        return "\n".join(lines) + "\n"
+
+
+LOG_REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "executive_summary": {"type": "string"},
+        "key_findings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "issue": {"type": "string"},
+                    "severity": {"type": "string", "enum": ["critical", "high", "medium", "low"]},
+                    "component": {"type": "string"},
+                    "occurrences": {"type": "integer"},
+                    "time_window": {"type": "string"},
+                },
+                "required": ["issue", "severity"],
+            },
+        },
+        "error_breakdown": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "category": {"type": "string"},
+                    "errors": {"type": "integer"},
+                    "warnings": {"type": "integer"},
+                },
+                "required": ["category", "errors", "warnings"],
+            },
+        },
+        "root_causes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "issue": {"type": "string"},
+                    "hypothesis": {"type": "string"},
+                },
+                "required": ["issue", "hypothesis"],
+            },
+        },
+        "recommendations": {"type": "array", "items": {"type": "string"}},
+        "next_steps": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["executive_summary", "key_findings", "error_breakdown", "root_causes", "recommendations", "next_steps"],
+}
+
+_SEVERITY_ORDER = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+
+class LogReport:
+    """
+    Validated System Log Analyzer dashboard report.
+    """
+    def __init__(self, executive_summary, key_findings, error_breakdown, root_causes, recommendations, next_steps):
+        self.executive_summary = executive_summary
+        self.key_findings = key_findings
+        self.error_breakdown = error_breakdown
+        self.root_causes = root_causes
+        self.recommendations = recommendations
+        self.next_steps = next_steps
+        # SimilarityCache hit when the report was reused instead of generated.
+        self.cache_hit = None
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Validate the model's JSON into a LogReport.
+        Args:
+            text (str): JSON matching LOG_REPORT_SCHEMA.
+        Returns:
+            LogReport: Parsed report with findings sorted by severity.
+        Raises:
+            StructuredOutputError: If the JSON is invalid.
+        """
+        data = _load(text, ["executive_summary"])
+
+        def records(key):
+            value = data.get(key) or []
+            if not isinstance(value, list):
+                raise StructuredOutputError(f"'{key}' must be a list.")
+            return [item for item in value if isinstance(item, dict)]
+
+        findings = [
+            {
+                "Issue": _text(f.get("issue")),
+                "Severity": _text(f.get("severity")).lower() or "medium",
+                "Component": _text(f.get("component")),
+                "Occurrences": _int(f.get("occurrences")),
+                "Time Window": _text(f.get("time_window")),
+            }
+            for f in records("key_findings")
+        ]
+        findings.sort(key=lambda f: _SEVERITY_ORDER.get(f["Severity"], len(_SEVERITY_ORDER)))
+        breakdown = [
+            {"Category": _text(b.get("category")), "Errors": _int(b.get("errors")), "Warnings": _int(b.get("warnings"))}
+            for b in records("error_breakdown")
+        ]
+        causes = [{"Issue": _text(c.get("issue")), "Hypothesis": _text(c.get("hypothesis"))} for c in records("root_causes")]
+        return cls(
+            executive_summary=_text(data.get("executive_summary")),
+            key_findings=findings,
+            error_breakdown=breakdown,
+            root_causes=causes,
+            recommendations=_string_list(data.get("recommendations")),
+            next_steps=_string_list(data.get("next_steps")),
+        )
+
+    def to_markdown(self):
+        """
+        Render the report in the Markdown layout used for downloads and history.
+        """
+        def table(rows):
+            if not rows:
+                return "_None reported._\n"
+            columns = list(rows[0].keys())
+            lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+            lines += ["| " + " | ".join(_cell(row[c]) for c in columns) + " |" for row in rows]
+            return "\n".join(lines) + "\n"
+
+        def bullets(items):
+            return "\n".join(f"- {item}" for item in items) + "\n" if items else "_None._\n"
+
+        return (
+            "## Executive Summary\n" + self.executive_summary + "\n\n"
+            "## Key Findings\n" + table(self.key_findings) + "\n"
+            "### Error/Warning Breakdown\n" + table(self.error_breakdown) + "\n"
+            "## Root Cause Analysis\n" + table(self.root_causes) + "\n"
+            "## Actionable Recommendations\n" + bullets(self.recommendations) + "\n"
+            "## Next Steps\n" + bullets(self.next_steps)
+        )
@@ -0,0 +1,175 @@
+"""
+Text similarity helpers: word shingling, MinHash signatures and an LSH index.
+
+Signatures use one-permutation hashing (one 64-bit hash per shingle, split into
+``num_perm`` bins, empty bins densified from their neighbour), so fingerprinting is
+linear in the text length even for multi-megabyte logs. Two signatures agree on a
+slot with probability equal to the Jaccard similarity of their shingle sets.
+"""
+import hashlib
+import re
+import threading
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+_HASH_SPACE = 1 << 64
+
+
+def shingles(text, size=3):
+    """
+    Return the set of lower-cased word n-grams of a text.
+    Args:
+        text (str): Input text.
+        size (int): Words per shingle.
+    Returns:
+        set[str]: Shingles (the individual words if the text is shorter than ``size``).
+    """
+    words = _TOKEN.findall((text or "").lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHash:
+    """
+    One-permutation MinHash over a set of shingles.
+    """
+    def __init__(self, num_perm=64):
+        """
+        Initialize the MinHash.
+        Args:
+            num_perm (int): Signature length (number of bins).
+        """
+        self.num_perm = num_perm
+        self._bin_width = _HASH_SPACE // num_perm
+
+    def signature(self, shingle_set):
+        """
+        Compute the signature of a shingle set.
+        Args:
+            shingle_set (set[str]): Shingles from ``shingles``.
+        Returns:
+            tuple[int]: Signature of length ``num_perm`` (all zeros for an empty set).
+        """
+        if not shingle_set:
+            return (0,) * self.num_perm
+        empty = _HASH_SPACE
+        bins = [empty] * self.num_perm
+        width = self._bin_width
+        for s in shingle_set:
+            h = _hash64(s)
+            idx = min(h // width, self.num_perm - 1)
+            offset = h - idx * width
+            if offset < bins[idx]:
+                bins[idx] = offset
+        # Densification: an empty bin borrows the value of the next non-empty bin,
+        # tagged with the distance so borrowed slots from different bins never collide.
+        result = list(bins)
+        for i in range(self.num_perm):
+            if bins[i] == empty:
+                for step in range(1, self.num_perm):
+                    j = (i + step) % self.num_perm
+                    if bins[j] != empty:
+                        result[i] = bins[j] + step * width
+                        break
+        return tuple(result)
+
+    def fingerprint(self, text, shingle_size=3):
+        """
+        Shingle a text and return its signature.
+        """
+        return self.signature(shingles(text, shingle_size))
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimate the Jaccard similarity of two signatures.
+    """
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing index over MinHash signatures.
+
+    With ``bands`` bands of ``num_perm // bands`` rows, pairs above roughly
+    ``(1 / bands) ** (bands / num_perm)`` similarity become candidates; candidates are
+    then verified against the exact signature agreement.
+    """
+    def __init__(self, num_perm=64, bands=16):
+        """
+        Initialize the LSHIndex.
+        Args:
+            num_perm (int): Signature length; must be divisible by ``bands``.
+            bands (int): Number of LSH bands.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = [dict() for _ in range(bands)]
+        self._signatures = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        r = self.rows
+        return [hash(signature[b * r:(b + 1) * r]) for b in range(self.bands)]
+
+    def add(self, key, signature):
+        """
+        Insert (or replace) a signature under ``key``.
+        """
+        with self._lock:
+            if key in self._signatures:
+                self._remove(key)
+            self._signatures[key] = signature
+            for band, bucket_key in zip(self._buckets, self._band_keys(signature)):
+                band.setdefault(bucket_key, set()).add(key)
+
+    def remove(self, key):
+        """
+        Remove ``key`` from the index if present.
+        """
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, bucket_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = band.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del band[bucket_key]
+
+    def query(self, signature, threshold=0.8):
+        """
+        Return stored keys whose estimated similarity is at least ``threshold``.
+        Args:
+            signature (tuple[int]): Query signature.
+            threshold (float): Minimum estimated Jaccard similarity.
+        Returns:
+            list[tuple]: (key, similarity) pairs, most similar first.
+        """
+        with self._lock:
+            candidates = set()
+            for band, bucket_key in zip(self._buckets, self._band_keys(signature)):
+                candidates.update(band.get(bucket_key, ()))
+            matches = []
+            for key in candidates:
+                score = similarity(signature, self._signatures[key])
+                if score >= threshold:
+                    matches.append((key, score))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches
@@ -0,0 +1,189 @@
+"""
+Similarity Cache: Near-duplicate result cache for agent calls.
+
+Inputs are fingerprinted with MinHash and stored in an LSH index, so an upload that
+differs from an earlier one by a few lines (or one edited sentence) reuses the earlier
+result instead of triggering a new LLM generation. Exact repeats are answered from a
+plain hash lookup; near-duplicates from the LSH buckets. A cache can also compare a
+``match_key`` of the two inputs before a near-duplicate hit (for logs: the error and
+warning counts, within a tolerance), so inputs that look alike but differ in what
+matters are never answered from the cache.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from agents.similarity import LSHIndex, MinHash, shingles
+
+DEFAULT_THRESHOLD = float(os.environ.get("AI_AGENTS_SIMILARITY_THRESHOLD", "0.9"))
+_DIGITS = re.compile(r"\d+")
+# Levels whose line counts decide whether a near-duplicate log may reuse a report.
+SEVERE_LEVELS = ("CRITICAL", "FATAL", "ERROR", "WARN")
+
+
+def log_line_shingles(text):
+    """
+    Shingle a log by line, masking digits so timestamps, ids and counters do not
+    make otherwise identical lines look different.
+    The shingles form a multiset: a line seen ``n`` times contributes one shingle per
+    power of two up to ``n`` ("line#0", "line#1", ...), so a burst of a repeated
+    error lowers the similarity to a log where it appeared once.
+    """
+    counts = Counter(_DIGITS.sub("0", line.strip()) for line in (text or "").splitlines() if line.strip())
+    return {f"{line}#{bucket}" for line, count in counts.items() for bucket in range(count.bit_length())}
+
+
+def log_severity_counts(text):
+    """
+    Return the number of lines per log level, as a hashable match key for log caches.
+    """
+    from agents.log_tail import line_level
+
+    counts = Counter(line_level(line) for line in (text or "").splitlines() if line.strip())
+    return tuple(sorted(counts.items()))
+
+
+def severity_counts_close(cached, current, rel_tolerance=0.2, abs_tolerance=2):
+    """
+    Return True when two ``log_severity_counts`` results have similar severe-level counts.
+    Each of SEVERE_LEVELS may differ by ``abs_tolerance`` lines or by ``rel_tolerance`` of
+    the larger count, whichever is more; so a log with a few new lines still matches,
+    while an error spike (or errors in a previously clean log) does not.
+    """
+    cached, current = dict(cached), dict(current)
+    for level in SEVERE_LEVELS:
+        a, b = cached.get(level, 0), current.get(level, 0)
+        if abs(a - b) > max(abs_tolerance, rel_tolerance * max(a, b)):
+            return False
+    return True
+
+
+class CacheHit:
+    """
+    A cached result returned for an identical or near-identical input.
+    """
+    def __init__(self, result, similarity, exact):
+        self.result = result
+        self.similarity = similarity
+        self.exact = exact
+
+
+class SimilarityCache:
+    """
+    Bounded LRU cache keyed by input similarity.
+    """
+    def __init__(self, max_entries=50000, num_perm=64, bands=16, shingler=None, threshold=DEFAULT_THRESHOLD,
+                 match_key=None, key_matches=None):
+        """
+        Initialize the SimilarityCache.
+        Args:
+            max_entries (int): Maximum number of cached results.
+            num_perm (int): MinHash signature length.
+            bands (int): LSH bands.
+            shingler (callable): Function mapping text to a set of shingles (word 3-grams by default).
+            threshold (float): Default minimum similarity for a near-duplicate hit.
+            match_key (callable): Optional function of the text compared before a
+                near-duplicate hit (e.g. ``log_severity_counts``).
+            key_matches (callable): ``key_matches(cached_key, new_key)`` deciding whether the
+                match keys are close enough (equality by default, e.g. ``severity_counts_close``).
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.shingler = shingler or shingles
+        self.match_key = match_key
+        self.key_matches = key_matches or (lambda cached, current: cached == current)
+        self._minhash = MinHash(num_perm=num_perm)
+        self._index = LSHIndex(num_perm=num_perm, bands=bands)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(text):
+        return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+    def lookup(self, text, threshold=None):
+        """
+        Return a cached result for ``text`` or a near-duplicate of it.
+        Args:
+            text (str): Agent input.
+            threshold (float): Minimum similarity; defaults to the cache threshold.
+        Returns:
+            CacheHit or None: The best matching cached result, if any.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        digest = self._digest(text)
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return CacheHit(self._entries[digest][0], 1.0, True)
+        if threshold >= 1.0:
+            with self._lock:
+                self.misses += 1
+            return None
+        signature = self._minhash.signature(self.shingler(text))
+        matches = self._index.query(signature, threshold=threshold)
+        match_key = self.match_key(text) if self.match_key else None
+        with self._lock:
+            for key, score in matches:
+                if key in self._entries and (self.match_key is None or self.key_matches(self._entries[key][1], match_key)):
+                    self._entries.move_to_end(key)
+                    self.near_hits += 1
+                    return CacheHit(self._entries[key][0], score, False)
+            self.misses += 1
+        return None
+
+    def store(self, text, result):
+        """
+        Cache ``result`` for ``text``, evicting the least recently used entry when full.
+        """
+        digest = self._digest(text)
+        signature = self._minhash.signature(self.shingler(text))
+        match_key = self.match_key(text) if self.match_key else None
+        with self._lock:
+            self._entries[digest] = (result, match_key)
+            self._entries.move_to_end(digest)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+        self._index.add(digest, signature)
+        for key in evicted:
+            self._index.remove(key)
+
+    def stats(self):
+        """
+        Return hit/miss counters and the current size.
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "near_hits": self.near_hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._index.remove(key)
+            self._entries.clear()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_similarity_cache(name, **kwargs):
+    """
+    Return the process-wide SimilarityCache for an agent, creating it on first use.
+    Args:
+        name (str): Cache namespace, usually the agent name.
+        **kwargs: SimilarityCache options used only when the cache is created.
+    Returns:
+        SimilarityCache: Shared cache instance.
+    """
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = SimilarityCache(**kwargs)
+        return _caches[name]
+
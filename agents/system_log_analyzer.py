@@ -2,6 +2,10 @@
 
 
 from llm.llama_client import LlamaClient
+from agents.similarity_cache import get_similarity_cache, log_line_shingles, log_severity_counts, severity_counts_close
+from llm.cancellation import GenerationCancelled, stream_llm
+from llm.router import default_endpoints
+from agents.schemas import LOG_REPORT_SCHEMA, LogReport
 import logging
 
 # --- CrewAI System Log Analyzer Agent ---
@@ -17,22 +21,85 @@ class SystemLogAnalyzer:
     Backstory:
         You are a world-class System Health Analyst and SRE. You have spent years building, monitoring, and troubleshooting distributed systems at scale. You are trusted by engineering and leadership alike for your ability to spot patterns, root causes, and emerging risks in massive log datasets. You combine expert knowledge of log semantics, incident response, and modern observability with advanced LLM-powered reasoning. Your reports are clear, actionable, and always anticipate what the team needs to know next.
     """
-    def __init__(self):
+    # Hard per-call generation limits: token cap and wall-clock deadline (seconds).
+    NUM_PREDICT = 2048
+    DEADLINE_S = 180
+    def __init__(self, similarity_threshold=None):
         """
         Initialize the SmartUnitTestGenerator agent as a CrewAI Agent with LiteLLM Ollama provider integration.
+        Args:
+            similarity_threshold (float): Minimum similarity for reusing a cached report of a
+                near-identical log (defaults to AI_AGENTS_SIMILARITY_THRESHOLD; 1.0 = exact matches only).
         """
+        self.similarity_threshold = similarity_threshold
+        # Near-duplicate logs only share a report when their error/warning counts are close,
+        # so an error spike is never answered with the report of a healthy log.
+        self.cache = get_similarity_cache("system_log_analyzer", shingler=log_line_shingles,
+                                          match_key=log_severity_counts, key_matches=severity_counts_close)
+        self.structured_cache = get_similarity_cache("system_log_analyzer:json", shingler=log_line_shingles,
+                                                     match_key=log_severity_counts, key_matches=severity_counts_close)
+        self.last_cache_hit = None
         try:
             from langchain_ollama import OllamaLLM
-            self.ollama_llm = OllamaLLM(model="llama3.1", base_url="http://localhost:11434")
+            self.ollama_llm = OllamaLLM(model="llama3.1", base_url=default_endpoints()[0], num_predict=self.NUM_PREDICT)
         except ImportError:
             self.ollama_llm = None
             self.llm_client = LlamaClient()
 
-    def analyze(self, log_text):
+    def analyze(self, log_text, use_cache=True, cancel_token=None, on_chunk=None):
         """
         Send the raw log text directly to the LLM for analysis. No DataFrame or preprocessing.
+        A report cached for an identical log, or a near-identical one with similar error and
+        warning counts, is returned without calling the LLM (see ``last_cache_hit``).
+        The generation is streamed and stops when ``cancel_token`` is cancelled or DEADLINE_S passes.
         """
-        prompt = (
+        self.last_cache_hit = None
+        if use_cache:
+            hit = self.cache.lookup(log_text, threshold=self.similarity_threshold)
+            if hit:
+                self.last_cache_hit = hit
+                logging.info(f"Reusing cached log report (similarity={hit.similarity:.2f})")
+                return hit.result
+        prompt = self._prompt(log_text, "- Format your output as a Markdown report with these sections: Executive Summary, Key Findings (with tables/bullets), Root Cause Analysis, Actionable Recommendations, and Next Steps.\n"
+                                        "- Use tables for error/warning breakdowns, and bullet points for recommendations.\n")
+        result = self._invoke(prompt, cancel_token=cancel_token, on_chunk=on_chunk)
+        if use_cache and not result.startswith("Error:"):
+            self.cache.store(log_text, result)
+        return result
+
+    def analyze_structured(self, log_text, use_cache=True, cancel_token=None, on_chunk=None):
+        """
+        Analyze the logs and return a typed LogReport instead of free-form Markdown.
+        The model is constrained to LOG_REPORT_SCHEMA through Ollama's ``format`` option.
+        Args:
+            log_text (str): Raw log text.
+            use_cache (bool): Consult and populate the similarity cache.
+            cancel_token (CancelToken): Optional token to abort the generation.
+            on_chunk (callable): Optional callback receiving each streamed chunk.
+        Returns:
+            LogReport: Validated report; ``cache_hit`` is set when it came from the cache.
+        Raises:
+            StructuredOutputError: If the LLM failed or its output does not match the schema.
+        """
+        self.last_cache_hit = None
+        if use_cache:
+            hit = self.structured_cache.lookup(log_text, threshold=self.similarity_threshold)
+            if hit:
+                logging.info(f"Reusing cached structured log report (similarity={hit.similarity:.2f})")
+                self.last_cache_hit = hit
+                report = LogReport.from_json(hit.result)
+                report.cache_hit = hit
+                return report
+        prompt = self._prompt(log_text, "- Respond with a single JSON object with these fields: executive_summary, key_findings (issue, severity, component, occurrences, time_window), "
+                                        "error_breakdown (category, errors, warnings), root_causes (issue, hypothesis), recommendations and next_steps (lists of strings).\n")
+        output = self._invoke(prompt, cancel_token=cancel_token, on_chunk=on_chunk, format=LOG_REPORT_SCHEMA)
+        report = LogReport.from_json(output)
+        if use_cache:
+            self.structured_cache.store(log_text, output)
+        return report
+
+    def _prompt(self, log_text, format_instructions):
+        return (
             "You are a world-class System Health Analyst, SRE, and AI log analysis expert. Your job is to analyze the following system logs and provide a professional, actionable dashboard summary for engineering and leadership.\n"
             "Instructions:\n"
             "- Identify and summarize the most critical recurring issues, error spikes, and performance risks.\n"
@@ -42,20 +109,30 @@ class SystemLogAnalyzer:
             "- For each major issue, provide a root cause hypothesis and suggest concrete next steps or mitigations.\n"
             "- Recommend monitoring, escalation, or automation actions if appropriate.\n"
             "- If possible, identify modules or teams that should be notified.\n"
-            "- Format your output as a Markdown report with these sections: Executive Summary, Key Findings (with tables/bullets), Root Cause Analysis, Actionable Recommendations, and Next Steps.\n"
-            "- Use tables for error/warning breakdowns, and bullet points for recommendations.\n"
+            + format_instructions +
             "- Be concise but thorough.\n"
             "\nSystem Logs:\n"
             f"{log_text.strip()}"
             "\n---\nDashboard Report:"
         )
+
+    def _invoke(self, prompt, cancel_token=None, on_chunk=None, format=None):
+        """
+        Send a prompt to the configured LLM provider as a cancellable, deadline-bounded stream.
+        Returns:
+            str: Model output or error message.
+        """
         try:
             if self.ollama_llm:
-                return self.ollama_llm.invoke(prompt)
+                return stream_llm(self.ollama_llm, prompt, cancel_token=cancel_token, on_chunk=on_chunk,
+                                  deadline_s=self.DEADLINE_S, format=format, agent="system_log_analyzer")
             elif hasattr(self, 'llm_client') and self.llm_client:
-                return self.llm_client.query(prompt)
+                return self.llm_client.query(prompt, cancel_token=cancel_token, on_chunk=on_chunk, num_predict=self.NUM_PREDICT,
+                                             deadline_s=self.DEADLINE_S, format=format, agent="system_log_analyzer")
             else:
                 return "Error: No LLM provider available."
+        except GenerationCancelled as e:
+            return f"Error: Generation cancelled ({e.reason})."
         except Exception as e:
             logging.error(f"Failed to generate test cases: {e}")
             return f"Error: Failed to generate test cases. Details: {e}"
@@ -1,32 +1,62 @@
 from llm.llama_client import LlamaClient
+from agents.requirements_preprocessor import split_requirements, cluster_requirements
+from agents.similarity_cache import get_similarity_cache
+from llm.cancellation import GenerationCancelled, stream_llm
+from llm.router import default_endpoints
+from agents.schemas import (TEST_CASE_BATCH_SCHEMA, TEST_CASE_SUITE_SCHEMA, StructuredOutputError, TestCaseSuite,
+                             load_test_case_batch)
+from concurrent.futures import ThreadPoolExecutor
+import difflib
 import logging
+import re
+
+TEST_CASE_COLUMNS = ["Test Case ID", "Title", "Preconditions", "Test Steps", "Input Data", "Expected Results", "Actual Result"]
+_REQ_REF = re.compile(r"R?(\d+)", re.IGNORECASE)
 
 class SmartUnitTestGenerator:
     """
     CrewAI agent for generating detailed unit test cases from requirements documents using Llama 3.1.
     """
-    def __init__(self):
+    # Hard per-call generation limits: token cap and wall-clock deadline (seconds).
+    NUM_PREDICT = 4096
+    DEADLINE_S = 300
+    def __init__(self, similarity_threshold=None):
         """
         Initialize the SmartUnitTestGenerator agent as a CrewAI Agent with LiteLLM Ollama provider integration.
+        Args:
+            similarity_threshold (float): Minimum similarity for reusing cached test cases of a
+                near-identical document (defaults to AI_AGENTS_SIMILARITY_THRESHOLD; 1.0 = exact matches only).
         """
+        self.similarity_threshold = similarity_threshold
+        self.cache = get_similarity_cache("unit_test_generator")
+        self.structured_cache = get_similarity_cache("unit_test_generator:json")
         try:
             from langchain_ollama import OllamaLLM
-            self.ollama_llm = OllamaLLM(model="llama3.1", base_url="http://localhost:11434")
+            self.ollama_llm = OllamaLLM(model="llama3.1", base_url=default_endpoints()[0], num_predict=self.NUM_PREDICT)
         except ImportError:
             self.ollama_llm = None
             self.llm_client = LlamaClient()
 
-    def generate_test_cases(self, requirements_text):
+    def generate_test_cases(self, requirements_text, use_cache=True, cancel_token=None, on_chunk=None):
         """
         Generate high-level QA test cases in a standard, human-readable format from requirements text using CrewAI Agent persona and Llama 3.1.
+        Test cases cached for an identical or near-identical document are returned without calling the LLM.
         Args:
             requirements_text (str): The requirements document as text.
+            use_cache (bool): Consult and populate the similarity cache.
+            cancel_token (CancelToken): Optional token to abort the generation.
+            on_chunk (callable): Optional callback receiving each streamed text chunk.
         Returns:
             str: Generated test cases or error message.
         """
         if not requirements_text or not requirements_text.strip():
             logging.warning("No requirements text provided.")
             return "Error: No requirements text provided."
+        if use_cache:
+            hit = self.cache.lookup(requirements_text, threshold=self.similarity_threshold)
+            if hit:
+                logging.info(f"Reusing cached test cases (similarity={hit.similarity:.2f})")
+                return hit.result
         prompt = (
             "You are an expert QA Test Case Writer and Senior Automation Engineer. Your job is to create a comprehensive, actionable, and human-readable set of test cases for the provided requirements."
             "\n\nInstructions:"
@@ -44,17 +74,256 @@ class SmartUnitTestGenerator:
             "\n- Make sure the test cases are clear, actionable, and cover all relevant scenarios."
             "\n\nRequirements:\n" + requirements_text
         )
+        result = self._invoke(prompt, cancel_token=cancel_token, on_chunk=on_chunk)
+        if use_cache and not result.startswith("Error:"):
+            self.cache.store(requirements_text, result)
+        return result
+
+    def generate_structured_test_cases(self, requirements_text, use_cache=True, cancel_token=None, on_chunk=None):
+        """
+        Generate test cases as a typed TestCaseSuite instead of free-form Markdown.
+        The model is constrained to TEST_CASE_SUITE_SCHEMA through Ollama's ``format`` option.
+        Args:
+            requirements_text (str): The requirements document as text.
+            use_cache (bool): Consult and populate the similarity cache.
+            cancel_token (CancelToken): Optional token to abort the generation.
+            on_chunk (callable): Optional callback receiving each streamed chunk.
+        Returns:
+            TestCaseSuite: Validated test cases; ``cache_hit`` is set when they came from the cache.
+        Raises:
+            StructuredOutputError: If there is no input, the LLM failed, or its output does not match the schema.
+        """
+        if not requirements_text or not requirements_text.strip():
+            raise StructuredOutputError("No requirements text provided.")
+        if use_cache:
+            hit = self.structured_cache.lookup(requirements_text, threshold=self.similarity_threshold)
+            if hit:
+                logging.info(f"Reusing cached structured test cases (similarity={hit.similarity:.2f})")
+                suite = TestCaseSuite.from_json(hit.result)
+                suite.cache_hit = hit
+                return suite
+        prompt = (
+            "You are an expert QA Test Case Writer and Senior Automation Engineer. Your job is to create a comprehensive, actionable set of test cases for the provided requirements."
+            "\n\nInstructions:"
+            "\n- Analyze the requirements and identify all core functionalities, edge cases, and user stories."
+            "\n- For each functionality, generate positive, negative, and boundary test cases."
+            "\n- Respond with a JSON object {\"test_cases\": [...]} where each test case has:"
+            " test_case_id (unique and descriptive), title, type (positive/negative/boundary), preconditions,"
+            " test_steps (list of step-by-step actions), input_data, expected_results (precise, measurable outcomes)."
+            "\n\nRequirements:\n" + requirements_text
+        )
+        output = self._invoke(prompt, cancel_token=cancel_token, on_chunk=on_chunk, format=TEST_CASE_SUITE_SCHEMA)
+        suite = TestCaseSuite.from_json(output)
+        if use_cache:
+            self.structured_cache.store(requirements_text, output)
+        return suite
+
+    def _invoke(self, prompt, cancel_token=None, on_chunk=None, format=None):
+        """
+        Send a prompt to the configured LLM provider as a cancellable, deadline-bounded stream.
+        Returns:
+            str: Model output or error message.
+        """
         try:
             if self.ollama_llm:
-                return self.ollama_llm.invoke(prompt)
+                return stream_llm(self.ollama_llm, prompt, cancel_token=cancel_token, on_chunk=on_chunk,
+                                  deadline_s=self.DEADLINE_S, format=format, agent="unit_test_generator")
             elif hasattr(self, 'llm_client') and self.llm_client:
-                return self.llm_client.query(prompt)
+                return self.llm_client.query(prompt, cancel_token=cancel_token, on_chunk=on_chunk, num_predict=self.NUM_PREDICT,
+                                             deadline_s=self.DEADLINE_S, format=format, agent="unit_test_generator")
             else:
                 return "Error: No LLM provider available."
+        except GenerationCancelled as e:
+            return f"Error: Generation cancelled ({e.reason})."
         except Exception as e:
             logging.error(f"Failed to generate test cases: {e}")
             return f"Error: Failed to generate test cases. Details: {e}"
 
+    def generate_deduplicated_test_cases(self, requirements_text, batch_size=8, max_workers=4, threshold=0.7, cancel_token=None):
+        """
+        Generate test cases for large specs by de-duplicating requirements first.
+        The document is split into atomic requirements, near-duplicates are clustered,
+        and each batch of unique requirements is sent to the LLM in parallel. Rows are
+        merged in document order with stable Test Case IDs derived from the requirement text
+        (``TC-<requirement key>-<n>``), so re-running on the same spec yields the same IDs.
+        Args:
+            requirements_text (str): The requirements document as text.
+            batch_size (int): Unique requirements per LLM prompt.
+            max_workers (int): Concurrent LLM calls.
+            threshold (float): Similarity above which requirements are treated as duplicates.
+            cancel_token (CancelToken): Optional token to abort all batch generations.
+        Returns:
+            str: Markdown table of test cases or error message.
+        """
+        table, mapping = self.generate_incremental_test_cases(
+            requirements_text, previous=None, batch_size=batch_size, max_workers=max_workers, threshold=threshold,
+            cancel_token=cancel_token,
+        )
+        for requirement in (mapping or {}).get("uncovered", []):
+            logging.warning(f"No test cases generated for requirement: {requirement}")
+        return table
+
+    def generate_incremental_test_cases(self, requirements_text, previous=None, batch_size=8, max_workers=4,
+                                        threshold=0.7, change_ratio=0.6, cancel_token=None):
+        """
+        Regenerate only the test cases whose requirements were added or changed.
+        The new document is diffed against ``previous`` at the requirement level:
+        unchanged requirements reuse their stored rows and IDs, edited requirements
+        (text similarity >= ``change_ratio`` to a removed one) are regenerated but keep
+        their Test Case ID prefix, new requirements get new IDs, and removed requirements
+        are dropped.
+        Args:
+            requirements_text (str): The requirements document as text.
+            previous (dict): Mapping returned by a previous call, or None for a full run.
+            batch_size (int): Unique requirements per LLM prompt.
+            max_workers (int): Concurrent LLM calls.
+            threshold (float): Similarity above which requirements are treated as duplicates.
+            change_ratio (float): Minimum text similarity for an edit to count as a change
+                of an existing requirement rather than a removal plus an addition.
+            cancel_token (CancelToken): Optional token to abort all batch generations.
+        Returns:
+            tuple: (Markdown table or error message, mapping to pass as ``previous`` next time).
+                The mapping's ``uncovered`` list holds requirements that got no test cases
+                (failed batch or no usable rows) and ``errors`` describes failed batches and
+                rows that named no requirement; uncovered requirements are retried on the next run.
+                A requirement whose ID prefix is already in use (e.g. re-added after an edit
+                kept its prefix) gets a numeric suffix, so IDs never collide.
+                If no added or changed requirement got test cases, the first element is an
+                error message and the mapping has ``failed`` set and keeps the previous
+                requirements, so the next run retries the same changes.
+        """
+        if not requirements_text or not requirements_text.strip():
+            logging.warning("No requirements text provided.")
+            return "Error: No requirements text provided.", previous
+        requirements = split_requirements(requirements_text)
+        clusters = cluster_requirements(requirements, threshold=threshold)
+        if not clusters:
+            return self.generate_test_cases(requirements_text), previous
+        old_entries = dict((previous or {}).get("requirements", {}))
+        new_keys = {cluster.key for cluster in clusters}
+        removed = [key for key in old_entries if key not in new_keys]
+        entries = {}
+        pending = []
+        changed = 0
+        # ID prefixes taken by requirements kept from the previous run or assigned below.
+        used_ids = {old_entries[cluster.key]["id_key"] for cluster in clusters if cluster.key in old_entries}
+        for cluster in clusters:
+            if cluster.key in old_entries:
+                entries[cluster.key] = old_entries[cluster.key]
+                continue
+            id_key = cluster.key
+            best, best_ratio = None, change_ratio
+            for key in removed:
+                ratio = difflib.SequenceMatcher(None, old_entries[key]["text"], cluster.representative).ratio()
+                if ratio >= best_ratio:
+                    best, best_ratio = key, ratio
+            if best is not None:
+                removed.remove(best)
+                id_key = old_entries[best]["id_key"]
+                changed += 1
+            id_key = _unique_id_key(id_key, used_ids)
+            used_ids.add(id_key)
+            entries[cluster.key] = {"text": cluster.representative, "id_key": id_key, "rows": []}
+            pending.append(cluster)
+        logging.info(
+            f"{len(requirements)} requirements -> {len(clusters)} unique: "
+            f"{len(clusters) - len(pending)} reused, {changed} changed, {len(pending) - changed} added, {len(removed)} removed"
+        )
+        errors = []
+        if pending:
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+                outputs = list(pool.map(lambda batch: self._invoke(self._batch_prompt(batch), cancel_token=cancel_token,
+                                                                   format=TEST_CASE_BATCH_SCHEMA), batches))
+            for n, (batch, output) in enumerate(zip(batches, outputs), 1):
+                if output.startswith("Error:"):
+                    errors.append(f"Batch {n} of {len(batches)} failed: {output}")
+                    continue
+                try:
+                    rows, skipped = parse_batch_rows(output, batch)
+                except StructuredOutputError as e:
+                    errors.append(f"Batch {n} of {len(batches)} could not be read: {e}")
+                    continue
+                if skipped:
+                    errors.append(f"Batch {n} of {len(batches)}: {skipped} test case(s) could not be matched to a requirement.")
+                for cluster, row in rows:
+                    entries[cluster.key]["rows"].append(row)
+            for error in errors:
+                logging.warning(error)
+        uncovered = [cluster.representative for cluster in pending if not entries[cluster.key]["rows"]]
+        if uncovered:
+            logging.warning(f"{len(uncovered)} of {len(pending)} requirements got no test cases ({len(errors)} failed batches)")
+        if pending and len(uncovered) == len(pending):
+            # Nothing was generated: keep the previous requirements (so edits keep their IDs
+            # on the retry) but report this run's failures, not the previous run's.
+            reason = "; ".join(errors) or "the model returned no usable test cases"
+            failed = {"version": 1, "requirements": dict((previous or {}).get("requirements", {})),
+                      "uncovered": uncovered, "errors": errors, "failed": True}
+            return f"Error: No test cases were generated ({reason}).", failed
+        table = (
+            "| " + " | ".join(TEST_CASE_COLUMNS) + " |\n"
+            "|" + "---|" * len(TEST_CASE_COLUMNS) + "\n"
+        )
+        for cluster in clusters:
+            entry = entries[cluster.key]
+            for n, row in enumerate(entry["rows"], 1):
+                table += "| " + " | ".join([f"TC-{entry['id_key']}-{n:02d}"] + row) + " |\n"
+        # Requirements whose batch failed are left out so the next run retries them.
+        mapping = {
+            "version": 1,
+            "requirements": {key: entry for key, entry in entries.items() if entry["rows"]},
+            "uncovered": uncovered,
+            "errors": errors,
+        }
+        return table, mapping
+
+    def _batch_prompt(self, batch):
+        numbered = "\n".join(f"R{i}: {cluster.representative}" for i, cluster in enumerate(batch, 1))
+        return (
+            "You are an expert QA Test Case Writer and Senior Automation Engineer."
+            " Create positive, negative, and boundary test cases for each numbered requirement below."
+            "\n\nInstructions:"
+            "\n- Respond with a JSON object {\"test_cases\": [...]} where each test case has:"
+            " requirement (the number of the requirement it covers, e.g. R1), title, type (positive/negative/boundary),"
+            " preconditions, test_steps (list of step-by-step actions), input_data, expected_results."
+            "\n\nRequirements:\n" + numbered
+        )
+
+
+def parse_batch_rows(output, batch):
+    """
+    Map the test cases of a batch response back to their requirement clusters.
+    Args:
+        output (str): LLM response matching TEST_CASE_BATCH_SCHEMA, whose ``requirement`` is 'R<n>'.
+        batch (list[RequirementCluster]): Clusters in the order they were numbered.
+    Returns:
+        tuple: (list of (cluster, cells) pairs with cells excluding the Test Case ID column,
+            number of test cases skipped because they name no valid requirement).
+    Raises:
+        StructuredOutputError: If the output is not valid batch JSON.
+    """
+    rows = []
+    skipped = 0
+    for requirement, case in load_test_case_batch(output):
+        ref = _REQ_REF.fullmatch(requirement.strip())
+        idx = int(ref.group(1)) - 1 if ref else -1
+        if not 0 <= idx < len(batch):
+            skipped += 1
+            continue
+        rows.append((batch[idx], case.to_cells()))
+    return rows, skipped
+
+
+def _unique_id_key(id_key, used):
+    # Suffix an ID prefix already in use, e.g. when an edited requirement kept the
+    # original's prefix and the original text is added back.
+    if id_key not in used:
+        return id_key
+    n = 2
+    while f"{id_key}-{n}" in used:
+        n += 1
+    return f"{id_key}-{n}"
+
 # Example usage for CLI
 if __name__ == "__main__":
     import sys
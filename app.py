@@ -1,12 +1,19 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from agents.unit_test_generator import SmartUnitTestGenerator
-from agents.finance_sheet_analyzer import FinanceSheetAnalyzer
-from agents.system_log_analyzer import SystemLogAnalyzer
+import html
 import re
-import pandas as pd
+import time
 import datetime
+import uuid
+from services.history_store import get_history_store
+from llm.cancellation import CancelToken, cancellation_stats
+from llm.resilience import resilience_stats
+from agents.schemas import StructuredOutputError
+
+# Agents, pandas and matplotlib are imported inside the page that needs them so the
+# Home page (and every cold start) never pays for LangChain/pandas imports.
+# See scripts/startup_benchmark.py for the enforced import-time budget.
 
 # --- Modular, production-ready UI ---
 def set_theme(dark_mode):
@@ -181,9 +188,159 @@ def sidebar_and_nav():
         else:
             if st.sidebar.button(btn_label, **btn_kwargs):
                 st.session_state['selected_page'] = key
+    llm_usage_caption()
     return st.session_state['selected_page']
 
 
+
+def start_llm_run():
+    """
+    Cancel this session's previous in-flight generation and return a token for a new one.
+    Worker threads still streaming a superseded run stop at their next chunk.
+    """
+    previous = st.session_state.get('llm_cancel_token')
+    if previous is not None:
+        previous.cancel("superseded")
+    token = CancelToken()
+    st.session_state['llm_cancel_token'] = token
+    return token
+
+
+class StreamingPreview:
+    """
+    on_chunk callback that shows the generation as it streams.
+    Updating an element gives Streamlit a point to stop an abandoned run; the
+    resulting exception closes the Ollama stream so generation stops too.
+    With a ``label`` only progress is shown, for structured (JSON) output that is
+    rendered once complete.
+    """
+    def __init__(self, interval=0.3, label=None):
+        self.placeholder = st.empty()
+        self.interval = interval
+        self.label = label
+        self.parts = []
+        self._last = 0.0
+
+    def __call__(self, chunk):
+        self.parts.append(chunk)
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            if self.label:
+                self.placeholder.caption(f"{self.label}… {sum(len(p) for p in self.parts):,} characters received")
+            else:
+                self.placeholder.markdown("".join(self.parts))
+
+    def reset(self):
+        # The LLM router failed over to another server, which starts the answer again.
+        self.parts = []
+        self._last = 0.0
+        self.placeholder.caption("LLM server failed; retrying on another one…")
+
+    def clear(self):
+        self.placeholder.empty()
+
+
+def llm_usage_caption():
+    resilience = resilience_stats()
+    for url, circuit in resilience['circuits'].items():
+        if circuit['state'] != 'closed':
+            st.sidebar.warning(f"LLM backend {url} is unavailable; requests fail fast until it recovers.")
+    stats = cancellation_stats()
+    if not stats:
+        return
+    completed = sum(entry['completed'] for entry in stats.values())
+    stopped = sum(entry['cancelled'] + entry['deadline'] + entry['abandoned'] for entry in stats.values())
+    wasted = sum(entry['wasted_seconds'] for entry in stats.values())
+    st.sidebar.caption(f"LLM runs: {completed} completed, {stopped} stopped early ({wasted:.0f}s of generation cut short), {resilience['coalesced']} shared with identical in-flight requests")
+
+
+HISTORY_PAGE_SIZE = 10
+
+
+HISTORY_ID_PARAM = "history"
+_HISTORY_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def history_user_id():
+    """
+    Return the history store id of the current user.
+    Signed-in users (Streamlit authentication) are keyed by their email. Anonymous visitors
+    get a random id kept in the page URL (``?history=...``), so their history survives page
+    reloads and bookmarks; a tab opened without that parameter starts a new history, and
+    anyone given the URL sees the same history.
+    """
+    if 'history_user_id' not in st.session_state:
+        user = getattr(st, "user", None)
+        if user is not None and getattr(user, "is_logged_in", False) and user.get("email"):
+            user_id = f"user:{user.get('email')}"
+        else:
+            user_id = st.query_params.get(HISTORY_ID_PARAM, "")
+            if not _HISTORY_ID.fullmatch(user_id):
+                user_id = uuid.uuid4().hex
+                st.query_params[HISTORY_ID_PARAM] = user_id
+        st.session_state['history_user_id'] = user_id
+    return st.session_state['history_user_id']
+
+
+def render_history_sidebar(agent, input_label):
+    """
+    Render the paginated, searchable history panel for one agent.
+    Only the current page is read from the SQLite store; full results stay on disk.
+    Args:
+        agent (str): History namespace ('testcase', 'finance' or 'log').
+        input_label (str): Caption for the user input of each entry.
+    """
+    store = get_history_store()
+    user_id = history_user_id()
+    page_key = f'{agent}_history_page'
+    st.sidebar.markdown('---')
+    st.sidebar.subheader('🕑 History')
+    if st.sidebar.button('Clear History', key=f'clear_{agent}_history_sidebar'):
+        store.clear(user_id, agent)
+        st.session_state[page_key] = 0
+    query = st.sidebar.text_input('Search history', key=f'{agent}_history_search')
+    if query:
+        entries = store.search(user_id, agent, query, limit=HISTORY_PAGE_SIZE)
+    else:
+        total = store.count(user_id, agent)
+        last_page = max(0, (total - 1) // HISTORY_PAGE_SIZE)
+        page = min(st.session_state.get(page_key, 0), last_page)
+        if total > HISTORY_PAGE_SIZE:
+            prev_col, info_col, next_col = st.sidebar.columns([1, 2, 1])
+            if prev_col.button('◀', key=f'{agent}_history_prev', disabled=page == 0):
+                page -= 1
+            if next_col.button('▶', key=f'{agent}_history_next', disabled=page >= last_page):
+                page += 1
+            info_col.caption(f'Page {page + 1} of {last_page + 1}')
+        st.session_state[page_key] = page
+        entries = store.page(user_id, agent, page=page, page_size=HISTORY_PAGE_SIZE)
+    history_style = """
+    <style>
+    .sidebar-history-panel {
+        max-height: 250px;
+        overflow-y: auto;
+        border: 1px solid #888;
+        border-radius: 8px;
+        padding: 10px;
+        margin-bottom: 10px;
+        background-color: %s;
+        color: %s;
+    }
+    .sidebar-history-entry { margin-bottom: 12px; }
+    .sidebar-history-timestamp { font-size: 11px; color: #888; }
+    .sidebar-history-user { font-weight: bold; }
+    .sidebar-history-agent { margin-top: 2px; }
+    </style>
+    """ % ("#232323" if st.session_state.get('dark_mode', False) else "#f5f5f5", "#E0E0E0" if st.session_state.get('dark_mode', False) else "#212121")
+    st.sidebar.markdown(history_style, unsafe_allow_html=True)
+    entries_html = ''.join(
+        f'<div class="sidebar-history-entry"><div class="sidebar-history-timestamp">{entry["timestamp"]}</div><div class="sidebar-history-user">{input_label}: <code>{html.escape(entry["user_input"])}</code></div><div class="sidebar-history-agent"><b>Agent:</b> {html.escape(entry["agent_response"])}</div></div>'
+        for entry in entries
+    )
+    st.sidebar.markdown(f'<div class="sidebar-history-panel">{entries_html}</div>', unsafe_allow_html=True)
+
+
 def home_ui():
     st.markdown("<h1>🏠 Welcome to AI Agents Workspace</h1>", unsafe_allow_html=True)
     st.markdown("""
@@ -218,34 +375,7 @@ def test_case_generator_ui():
         -   **Test Case Generator**: This agent takes the analysis and writes detailed positive, negative, and edge-case tests.
         """
     )
-    if 'testcase_history' not in st.session_state:
-        st.session_state['testcase_history'] = []
-    st.sidebar.markdown('---')
-    st.sidebar.subheader('🕑 History')
-    clear_tc_hist = st.sidebar.button('Clear History', key='clear_testcase_history_sidebar')
-    if clear_tc_hist:
-        st.session_state['testcase_history'] = []
-    history_style = """
-    <style>
-    .sidebar-history-panel {
-        max-height: 250px;
-        overflow-y: auto;
-        border: 1px solid #888;
-        border-radius: 8px;
-        padding: 10px;
-        margin-bottom: 10px;
-        background-color: %s;
-        color: %s;
-    }
-    .sidebar-history-user { font-weight: bold; }
-    .sidebar-history-agent { margin-top: 2px; }
-    </style>
-    """ % ("#232323" if st.session_state.get('dark_mode', False) else "#f5f5f5", "#E0E0E0" if st.session_state.get('dark_mode', False) else "#212121")
-    st.sidebar.markdown(history_style, unsafe_allow_html=True)
-    st.sidebar.markdown('<div class="sidebar-history-panel">', unsafe_allow_html=True)
-    for entry in reversed(st.session_state['testcase_history']):
-        st.sidebar.markdown(f'<div class="sidebar-history-entry"><div class="sidebar-history-timestamp">{entry["timestamp"]}</div><div class="sidebar-history-user">User input: <code>{entry["user_input"]}</code></div><div class="sidebar-history-agent"><b>Agent:</b> {entry["agent_response"]}</div></div>', unsafe_allow_html=True)
-    st.sidebar.markdown('</div>', unsafe_allow_html=True)
+    render_history_sidebar('testcase', 'User input')
     requirements_text = st.text_area("Enter Software Requirements Here:", height=200, key="requirements_text_area")
     uploaded_file = st.file_uploader("Or upload a requirements file (.txt, .md)", type=['txt', 'md'], key="requirements_file_uploader")
     if uploaded_file is not None:
@@ -255,43 +385,54 @@ def test_case_generator_ui():
             st.info("File content loaded into the text area.")
         except Exception as e:
             st.error(f"Error reading file: {e}")
-    def format_test_cases(raw_output):
-        pattern = re.compile(r"Test Case ID:.*?(?=Test Case ID:|$)", re.DOTALL)
-        cases = pattern.findall(raw_output)
-        if cases:
-            table = (
-                "| Test Case ID | Title | Preconditions | Test Steps | Input Data | Expected Results | Actual Result |\n"
-                "|---|---|---|---|---|---|---|\n"
-            )
-            for case in cases:
-                def extract(field):
-                    m = re.search(rf"{field}:\s*(.*)", case)
-                    return m.group(1).strip() if m else ""
-                table += f"| {extract('Test Case ID')} | {extract('Title')} | {extract('Preconditions')} | {extract('Test Steps')} | {extract('Input Data')} | {extract('Expected Results')} | {extract('Actual Result')} |\n"
-            return table
-        return raw_output
+    dedupe = st.checkbox("De-duplicate requirements and regenerate only changed ones (faster for large specs and edits)", key="dedupe_requirements_checkbox")
+    bypass_cache = st.checkbox("Bypass cache (always call the LLM)", key="testcase_bypass_cache")
     if st.button("Generate Smart Test Cases", key="generate_test_cases_btn"):
         if not requirements_text.strip():
             st.error("Please enter or upload some requirements before generating.")
         else:
             with st.spinner('🤖 AI Crew is analyzing requirements and crafting test cases... This may take a moment.'):
                 try:
+                    from agents.unit_test_generator import SmartUnitTestGenerator
                     agent = SmartUnitTestGenerator()
-                    result = agent.generate_test_cases(requirements_text)
-                    formatted_result = format_test_cases(result)
-                    st.success("Test cases generated successfully!")
-                    st.markdown(formatted_result)
-                    st.download_button(
-                        label="Download Test Cases",
-                        data=formatted_result,
-                        file_name="test_cases.md",
-                        mime="text/markdown"
-                    )
-                    st.session_state['testcase_history'].append({
-                        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "user_input": requirements_text[:100].replace('\n', ' ') + ("..." if len(requirements_text) > 100 else ""),
-                        "agent_response": formatted_result[:200] + ("..." if len(formatted_result) > 200 else "")
-                    })
+                    token = start_llm_run()
+                    if dedupe:
+                        formatted_result, st.session_state['testcase_mapping'] = agent.generate_incremental_test_cases(
+                            requirements_text, previous=st.session_state.get('testcase_mapping'), cancel_token=token
+                        )
+                        mapping = st.session_state['testcase_mapping'] or {}
+                        if formatted_result.startswith("Error:"):
+                            st.error(formatted_result[len("Error:"):].strip())
+                            formatted_result = None
+                        else:
+                            if mapping.get('uncovered'):
+                                st.warning(
+                                    f"{len(mapping['uncovered'])} requirement(s) got no test cases and will be retried on the next run:\n"
+                                    + "\n".join(f"- {req}" for req in mapping['uncovered'])
+                                )
+                            for error in mapping.get('errors', []):
+                                st.warning(error)
+                            st.success("Test cases generated successfully!")
+                            st.markdown(formatted_result)
+                    else:
+                        preview = StreamingPreview(label="Generating test cases")
+                        suite = agent.generate_structured_test_cases(requirements_text, use_cache=not bypass_cache,
+                                                                     cancel_token=token, on_chunk=preview)
+                        preview.clear()
+                        cache_notice(suite.cache_hit, "test cases", "requirements")
+                        formatted_result = suite.to_markdown()
+                        st.success(f"{len(suite.test_cases)} test cases generated successfully!")
+                        st.table(suite.rows())
+                    if formatted_result is not None:
+                        st.download_button(
+                            label="Download Test Cases",
+                            data=formatted_result,
+                            file_name="test_cases.md",
+                            mime="text/markdown"
+                        )
+                        get_history_store().add(history_user_id(), 'testcase', requirements_text, formatted_result)
+                except StructuredOutputError as e:
+                    st.error(f"The model's test cases could not be read: {e}")
                 except Exception as e:
                     st.error(f"An error occurred while running the AI crew: {e}")
                     st.error("Please ensure the Ollama Docker container is running and accessible.")
@@ -301,15 +442,18 @@ def test_case_generator_ui():
 def finance_analyzer_ui():
     st.markdown("<h1>📊 Finance Sheet Analyzer</h1>", unsafe_allow_html=True)
     st.markdown("""
-    Upload your Excel financial sheet below. The AI agent will review for anomalies, summarize expenses, and highlight trends or inconsistencies in your financial data.
+    Upload one or more Excel financial sheets below. The AI agent will review for anomalies, summarize expenses, and highlight trends or inconsistencies in your financial data.
     """, unsafe_allow_html=True)
-    uploaded_file = st.file_uploader("Upload Excel File (.xlsx)", type=["xlsx"], key="finance_file_uploader")
+    uploaded_files = st.file_uploader(
+        "Upload Excel Files (.xlsx, .csv), e.g. one per month or business unit",
+        type=["xlsx", "csv"], accept_multiple_files=True, key="finance_file_uploader",
+    )
     regenerate = False
     # --- Sidebar: How to Use & About the AI Crew ---
     st.sidebar.header("How to Use")
     st.sidebar.info(
         """
-1. **Upload File**: Click 'Upload Excel File' and select your `.xlsx` financial sheet.
+1. **Upload Files**: Click 'Upload Excel Files' and select one or more `.xlsx`/`.csv` financial sheets; several files are parsed in parallel and analyzed together.
 2. **Analyze**: The AI agent will automatically process your data and display KPIs, charts, and insights.
 3. **Regenerate**: Click 'Regenerate Analysis' to re-run the analysis after uploading a new file.
         """
@@ -324,57 +468,42 @@ def finance_analyzer_ui():
         """
     )
     # --- Sidebar: History Panel ---
-    if 'finance_history' not in st.session_state:
-        st.session_state['finance_history'] = []
-    st.sidebar.markdown('---')
-    st.sidebar.subheader('🕑 History')
-    clear_hist = st.sidebar.button('Clear History', key='clear_finance_history_sidebar')
-    if clear_hist:
-        st.session_state['finance_history'] = []
-    history_style = """
-    <style>
-    .sidebar-history-panel {
-        max-height: 250px;
-        overflow-y: auto;
-        border: 1px solid #888;
-        border-radius: 8px;
-        padding: 10px;
-        margin-bottom: 10px;
-        background-color: %s;
-        color: %s;
-    }
-    .sidebar-history-entry { margin-bottom: 12px; }
-    .sidebar-history-timestamp { font-size: 11px; color: #888; }
-    .sidebar-history-user { font-weight: bold; }
-    .sidebar-history-agent { margin-top: 2px; }
-    </style>
-    """ % ("#232323" if st.session_state.get('dark_mode', False) else "#f5f5f5", "#E0E0E0" if st.session_state.get('dark_mode', False) else "#212121")
-    st.sidebar.markdown(history_style, unsafe_allow_html=True)
-    st.sidebar.markdown('<div class="sidebar-history-panel">', unsafe_allow_html=True)
-    for entry in reversed(st.session_state['finance_history']):
-        st.sidebar.markdown(f'<div class="sidebar-history-entry"><div class="sidebar-history-timestamp">{entry["timestamp"]}</div><div class="sidebar-history-user">User uploaded: <code>{entry["user_input"]}</code></div><div class="sidebar-history-agent"><b>Agent:</b> {entry["agent_response"]}</div></div>', unsafe_allow_html=True)
-    st.sidebar.markdown('</div>', unsafe_allow_html=True)
+    render_history_sidebar('finance', 'User uploaded')
     # --- Main Analysis ---
-    if uploaded_file is not None:
+    if uploaded_files:
         if st.button("Regenerate Analysis", key="regenerate_finance_analysis"):
             regenerate = True
         try:
-            import matplotlib.pyplot as plt
-            df = pd.read_excel(uploaded_file)
-            st.success("File uploaded and read successfully!")
+            import pandas as pd
+            from agents.finance_sheet_analyzer import FinanceSheetAnalyzer
+            from services.chart_renderer import get_renderer
+            consolidated = len(uploaded_files) > 1 or uploaded_files[0].name.lower().endswith('.csv')
+            if consolidated:
+                ingest = ingest_finance_uploads(uploaded_files)
+                df = ingest.transactions()
+                for error in ingest.errors:
+                    st.warning(f"Skipped {error}")
+                st.success(f"{len(uploaded_files)} files read: {ingest.aggregate.rows:,} transactions in {ingest.seconds:.1f}s "
+                           f"using {ingest.workers} worker process{'es' if ingest.workers > 1 else ''}.")
+            else:
+                df = pd.read_excel(uploaded_files[0])
+                st.success("File uploaded and read successfully!")
             st.dataframe(df)
             analyzer = FinanceSheetAnalyzer()
             if regenerate or st.session_state.get('finance_first_run', True):
                 with st.spinner('Analyzing financial data...'):
-                    result = analyzer.analyze(df)
+                    preview = StreamingPreview()
+                    if consolidated:
+                        result = analyzer.analyze_consolidated(ingest.aggregate, df, cancel_token=start_llm_run(), on_chunk=preview)
+                    else:
+                        result = analyzer.analyze(df, cancel_token=start_llm_run(), on_chunk=preview)
+                    preview.clear()
                 st.session_state['finance_result'] = result
+                st.session_state.pop('finance_export_path', None)
                 st.session_state['finance_first_run'] = False
                 # --- Add to history ---
-                st.session_state['finance_history'].append({
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "user_input": uploaded_file.name,
-                    "agent_response": result.get('llm_analysis', 'No response')
-                })
+                label = ", ".join(f.name for f in uploaded_files)
+                get_history_store().add(history_user_id(), 'finance', label, result.get('llm_analysis', 'No response'), label=label)
             else:
                 result = st.session_state.get('finance_result', {})
             # --- Modern Dashboard UI ---
@@ -396,22 +525,18 @@ def finance_analyzer_ui():
             st.bar_chart(result.get('category_inflows', {}))
             st.markdown("**Category Consumption of Outflows:**")
             st.bar_chart(result.get('category_outflows', {}))
-            # Pie charts for inflow and outflow breakdowns
-            import matplotlib.pyplot as plt
+            # Pie charts for inflow and outflow breakdowns (rendered off-thread, cached by data hash)
+            renderer = get_renderer()
             inflow_data = result.get('category_inflows', {})
             outflow_data = result.get('category_outflows', {})
-            if inflow_data:
+            inflow_pie = renderer.submit_pie(inflow_data) if inflow_data else None
+            outflow_pie = renderer.submit_pie(outflow_data) if outflow_data else None
+            if inflow_pie is not None:
                 st.markdown("**Inflow Category Breakdown (Pie Chart):**")
-                fig1, ax1 = plt.subplots()
-                ax1.pie(list(inflow_data.values()), labels=list(inflow_data.keys()), autopct='%1.1f%%', startangle=90)
-                ax1.axis('equal')
-                st.pyplot(fig1)
-            if outflow_data:
+                st.image(inflow_pie.result(timeout=30))
+            if outflow_pie is not None:
                 st.markdown("**Outflow Category Breakdown (Pie Chart):**")
-                fig2, ax2 = plt.subplots()
-                ax2.pie(list(outflow_data.values()), labels=list(outflow_data.keys()), autopct='%1.1f%%', startangle=90)
-                ax2.axis('equal')
-                st.pyplot(fig2)
+                st.image(outflow_pie.result(timeout=30))
             st.markdown("<hr style='margin:24px 0;'>", unsafe_allow_html=True)
             st.markdown("## 📊 Yearly Trends")
             trends_df = result.get('yearly_trends', None)
@@ -426,7 +551,9 @@ def finance_analyzer_ui():
             st.markdown(result.get('recommendations', 'No recommendations generated.'), unsafe_allow_html=True)
             st.markdown("---")
             st.markdown("### 📊 Dashboard Preview (Excel)")
-            st.markdown("- Pivot tables by Category & Year\n- KPI summary cards\n- Charts for trends & breakdowns\n- Downloadable Excel dashboard (coming soon)")
+            st.markdown("- Pivot tables by Category, Month & Year\n- KPI summary cards\n- Native Excel charts for trends & breakdowns\n- Optional sheet with every transaction")
+            if 'error' not in result:
+                excel_dashboard_ui(result, df)
             if 'llm_analysis' in result:
                 llm_output = result['llm_analysis'].strip()
                 if llm_output and llm_output != '**':
@@ -441,6 +568,41 @@ def finance_analyzer_ui():
     st.markdown('</div>', unsafe_allow_html=True)
 
 
+def ingest_finance_uploads(uploaded_files):
+    # Parsing runs in worker processes; keep the merged result for reruns with the same uploads.
+    from agents.finance_ingest import ingest_finance_files
+    key = tuple((getattr(f, 'file_id', None), f.name, f.size) for f in uploaded_files)
+    cached = st.session_state.get('finance_ingest')
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with st.spinner(f'Reading {len(uploaded_files)} files in parallel...'):
+        ingest = ingest_finance_files([(f.name, f.getvalue()) for f in uploaded_files])
+    st.session_state['finance_ingest'] = (key, ingest)
+    return ingest
+
+
+def excel_dashboard_ui(result, df):
+    # The workbook is cached on disk by result hash, so repeated downloads are served
+    # without rebuilding it; building is deferred until the user asks for it.
+    from services.excel_export import XLSX_MIME, get_excel_exporter
+    include_transactions = st.checkbox("Include all transactions", key="finance_export_transactions")
+    if st.button("Build Excel Dashboard", key="finance_export_btn"):
+        with st.spinner('Building Excel dashboard...'):
+            st.session_state['finance_export_path'] = get_excel_exporter().export(
+                result, df if include_transactions else None
+            )
+    path = st.session_state.get('finance_export_path')
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            st.download_button(
+                label="Download Excel Dashboard",
+                data=f,
+                file_name="finance_dashboard.xlsx",
+                mime=XLSX_MIME,
+                key="finance_export_download",
+            )
+
+
 def system_log_analyzer_ui():
     st.markdown("<h1>📝 System Log Analyzer</h1>", unsafe_allow_html=True)
     st.markdown("""
@@ -464,36 +626,7 @@ def system_log_analyzer_ui():
         """
     )
     # --- Sidebar: History Panel ---
-    if 'log_history' not in st.session_state:
-        st.session_state['log_history'] = []
-    st.sidebar.markdown('---')
-    st.sidebar.subheader('🕑 History')
-    clear_hist = st.sidebar.button('Clear History', key='clear_log_history_sidebar')
-    if clear_hist:
-        st.session_state['log_history'] = []
-    history_style = """
-    <style>
-    .sidebar-history-panel {
-        max-height: 250px;
-        overflow-y: auto;
-        border: 1px solid #888;
-        border-radius: 8px;
-        padding: 10px;
-        margin-bottom: 10px;
-        background-color: %s;
-        color: %s;
-    }
-    .sidebar-history-entry { margin-bottom: 12px; }
-    .sidebar-history-timestamp { font-size: 11px; color: #888; }
-    .sidebar-history-user { font-weight: bold; }
-    .sidebar-history-agent { margin-top: 2px; }
-    </style>
-    """ % ("#232323" if st.session_state.get('dark_mode', False) else "#f5f5f5", "#E0E0E0" if st.session_state.get('dark_mode', False) else "#212121")
-    st.sidebar.markdown(history_style, unsafe_allow_html=True)
-    st.sidebar.markdown('<div class="sidebar-history-panel">', unsafe_allow_html=True)
-    for entry in reversed(st.session_state['log_history']):
-        st.sidebar.markdown(f'<div class="sidebar-history-entry"><div class="sidebar-history-timestamp">{entry["timestamp"]}</div><div class="sidebar-history-user">User input: <code>{entry["user_input"]}</code></div><div class="sidebar-history-agent"><b>Agent:</b> {entry["agent_response"]}</div></div>', unsafe_allow_html=True)
-    st.sidebar.markdown('</div>', unsafe_allow_html=True)
+    render_history_sidebar('log', 'User input')
     log_text = st.text_area("Paste system log text here:", height=200, key="log_text_area")
     uploaded_file = st.file_uploader("Or upload a log file (.log, .txt)", type=["log", "txt"], key="log_file_uploader")
     if uploaded_file is not None:
@@ -504,93 +637,225 @@ def system_log_analyzer_ui():
         except Exception as e:
             st.error(f"Error reading file: {e}")
 
-    def parse_sections(md):
-        import re
-        # Split by Markdown headers (## or ###)
-        sections = re.split(r'(^##+ .*$)', md, flags=re.MULTILINE)
-        parsed = []
-        if len(sections) == 1:
-            return [("Report", md)]
-        i = 0
-        while i < len(sections):
-            if sections[i].startswith('##'):
-                title = sections[i].replace('#', '').strip()
-                content = sections[i+1] if i+1 < len(sections) else ''
-                parsed.append((title, content.strip()))
-                i += 2
-            else:
-                i += 1
-        return parsed
-
-    def extract_tables(md):
-        import re
-        import pandas as pd
-        tables = []
-        pattern = r'(\|.+\|\n\|[\-\| ]+\|\n(?:\|.*\|\n)+)'
-        for match in re.finditer(pattern, md):
-            table_md = match.group(1)
-            try:
-                df = pd.read_csv(pd.compat.StringIO(table_md), sep='|', engine='python', skipinitialspace=True)
-                df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-                tables.append(df)
-            except Exception:
-                continue
-        return tables
-
-    def plot_error_breakdown(md):
-        import re
-        import pandas as pd
-        # Look for a table with Error/Warning breakdown
-        pattern = r'(\|.+\|\n\|[\-\| ]+\|\n(?:\|.*\|\n)+)'
-        for match in re.finditer(pattern, md):
-            table_md = match.group(1)
-            try:
-                df = pd.read_csv(pd.compat.StringIO(table_md), sep='|', engine='python', skipinitialspace=True)
-                df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-                # If table has 'Error' or 'Warning' in columns, plot
-                if any(col.lower() in ['error', 'errors', 'warning', 'warnings', 'count'] for col in df.columns):
-                    st.bar_chart(df.set_index(df.columns[0]))
-            except Exception:
-                continue
-
+    bypass_cache = st.checkbox("Bypass cache (always call the LLM)", key="log_bypass_cache")
     if st.button("Analyze Logs", key="analyze_logs_btn"):
         if not log_text.strip():
             st.error("Please enter or upload some log text before analyzing.")
         else:
             with st.spinner('🤖 AI Crew is analyzing your logs...'):
+                from agents.system_log_analyzer import SystemLogAnalyzer
                 agent = SystemLogAnalyzer()
-                result = agent.analyze(log_text)
-                llm_report = result
-                st.success("Log analysis completed!")
-                # Parse and display sections
-                for title, content in parse_sections(llm_report):
-                    with st.expander(title, expanded=(title.lower().startswith('executive') or title.lower().startswith('key'))):
-                        # Try to extract and display tables
-                        tables = extract_tables(content)
-                        if tables:
-                            for df in tables:
-                                st.table(df)
-                        else:
-                            st.markdown(content)
-                        # Try to plot error/warning breakdowns
-                        plot_error_breakdown(content)
-                st.download_button(
-                    label="Download LLM Report",
-                    data=llm_report,
-                    file_name="log_analysis_report.md",
-                    mime="text/markdown"
-                )
-                # --- Add to history ---
-                if 'log_history' not in st.session_state:
-                    st.session_state['log_history'] = []
-                st.session_state['log_history'].append({
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "user_input": log_text[:100].replace('\n', ' ') + ("..." if len(log_text) > 100 else ""),
-                    "agent_response": llm_report[:200] + ("..." if len(llm_report) > 200 else "")
-                })
+                preview = StreamingPreview(label="Analyzing logs")
+                try:
+                    report = agent.analyze_structured(log_text, use_cache=not bypass_cache, cancel_token=start_llm_run(), on_chunk=preview)
+                except StructuredOutputError as e:
+                    preview.clear()
+                    st.error(f"The model's report could not be read: {e}")
+                    report = None
+                if report is not None:
+                    preview.clear()
+                    cache_notice(report.cache_hit, "report", "log")
+                    render_log_report(report)
+                    llm_report = report.to_markdown()
+                    st.download_button(
+                        label="Download LLM Report",
+                        data=llm_report,
+                        file_name="log_analysis_report.md",
+                        mime="text/markdown"
+                    )
+                    # --- Add to history ---
+                    get_history_store().add(history_user_id(), 'log', log_text, llm_report)
+    if log_text.strip():
+        log_drilldown_ui(log_text)
+    live_tail_ui()
     st.markdown('</div>', unsafe_allow_html=True)
 
 
+def cache_notice(hit, what, source):
+    if hit is None:
+        return
+    match = f"an identical {source}" if hit.exact else f"a near-identical {source} (similarity {hit.similarity:.0%})"
+    st.info(f"Reused the cached {what} for {match}. Tick 'Bypass cache' to regenerate.")
+
+
+def render_log_report(report, collapsible=True):
+    # With collapsible=False the sections are headed containers, for use inside
+    # another expander (Streamlit does not allow nested expanders).
+    def section(title, expanded=False):
+        if collapsible:
+            return st.expander(title, expanded=expanded)
+        container = st.container()
+        container.markdown(f"#### {title}")
+        return container
+
+    st.success("Log analysis completed!")
+    with section("Executive Summary", expanded=True):
+        st.markdown(report.executive_summary)
+    with section("Key Findings", expanded=True):
+        if report.key_findings:
+            st.table(report.key_findings)
+        else:
+            st.markdown("_None reported._")
+        if report.error_breakdown:
+            st.markdown("**Error/Warning Breakdown**")
+            st.table(report.error_breakdown)
+            import pandas as pd
+            st.bar_chart(pd.DataFrame(report.error_breakdown).set_index('Category'))
+    with section("Root Cause Analysis"):
+        if report.root_causes:
+            st.table(report.root_causes)
+        else:
+            st.markdown("_None reported._")
+    with section("Actionable Recommendations"):
+        st.markdown("\n".join(f"- {item}" for item in report.recommendations) or "_None._")
+    with section("Next Steps"):
+        st.markdown("\n".join(f"- {item}" for item in report.next_steps) or "_None._")
+
+
+# Characters of filtered log lines sent to the LLM for a follow-up analysis.
+DRILLDOWN_MAX_CHARS = 24000
+
+
+def log_drilldown_ui(log_text):
+    # Filters run against an on-disk index built once per log, so changing them
+    # never re-reads or re-parses the log.
+    with st.expander("🔎 Drill down: filter by time, level and component"):
+        # Hashing and indexing a large log is not free, so only do it on request.
+        if not st.toggle("Index this log for drill-down", key="drilldown_enabled"):
+            return
+        from agents.log_index import get_log_index
+        with st.spinner('Indexing log...'):
+            index = get_log_index(log_text)
+        with index:
+            log_drilldown_panel(index)
+
+
+def log_drilldown_panel(index):
+    filters = st.columns(2)
+    levels = filters[0].multiselect("Levels", list(index.levels()), key="drilldown_levels")
+    components = filters[1].multiselect("Components", list(index.components()), key="drilldown_components")
+    start = end = None
+    time_range = index.time_range()
+    if time_range and time_range[1] > time_range[0]:
+        def to_datetime(seconds):
+            return datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+        first, last = to_datetime(time_range[0]), to_datetime(time_range[1]) + datetime.timedelta(seconds=1)
+        selected = st.slider("Time range (UTC)", min_value=first, max_value=last, value=(first, last),
+                             step=datetime.timedelta(minutes=1), format="YYYY-MM-DD HH:mm", key="drilldown_time")
+        start = selected[0].replace(tzinfo=datetime.timezone.utc).timestamp()
+        end = selected[1].replace(tzinfo=datetime.timezone.utc).timestamp()
+    started = time.perf_counter()
+    selection = index.query(start=start, end=end, levels=levels or None, components=components or None)
+    lines = selection.lines(limit=500)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    st.caption(f"{selection.count:,} of {index.line_count:,} lines match ({elapsed_ms:.1f} ms).")
+    if lines:
+        st.code("\n".join(lines), language="log")
+        if selection.count > len(lines):
+            st.caption(f"Showing the first {len(lines)} lines.")
+    if selection.count and st.button("Analyze selection", key="drilldown_analyze_btn"):
+        from agents.system_log_analyzer import SystemLogAnalyzer
+        subset = selection.text(max_chars=DRILLDOWN_MAX_CHARS)
+        preview = StreamingPreview(label="Analyzing selected lines")
+        try:
+            report = SystemLogAnalyzer().analyze_structured(subset, cancel_token=start_llm_run(), on_chunk=preview)
+        except StructuredOutputError as e:
+            preview.clear()
+            st.error(f"The model's report could not be read: {e}")
+        else:
+            preview.clear()
+            render_log_report(report, collapsible=False)
+            get_history_store().add(history_user_id(), 'log', subset, report.to_markdown(), label="Drill-down")
+
+
+# Live tail only follows files inside this directory.
+TAIL_LOG_DIR = os.environ.get("AI_AGENTS_TAIL_LOG_DIR", "logs")
+TAIL_REFRESH_SECONDS = 2
+
+
+def resolve_tail_path(name):
+    # Resolve symlinks and '..' and refuse anything outside TAIL_LOG_DIR.
+    root = os.path.realpath(TAIL_LOG_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def live_tail_ui():
+    # Follow mode: counters update on every poll; the LLM runs only when the
+    # sliding-window thresholds in TailAnalyzer trip (debounced and batched).
+    with st.expander("📡 Live Tail: follow a growing local log file"):
+        if not os.path.isdir(TAIL_LOG_DIR):
+            st.info(f"Live tail follows files in '{TAIL_LOG_DIR}', which does not exist on this server. "
+                    "Set AI_AGENTS_TAIL_LOG_DIR to the log directory to enable it.")
+            return
+        names = sorted(name for name in os.listdir(TAIL_LOG_DIR) if os.path.isfile(os.path.join(TAIL_LOG_DIR, name)))
+        tail_name = st.selectbox(f"Log file in {TAIL_LOG_DIR}", names, index=None, key="tail_log_name")
+        settings = st.columns(3)
+        error_rate = settings[0].slider("Error-rate trigger", 0.05, 1.0, 0.2, 0.05, key="tail_error_rate")
+        new_templates = settings[1].number_input("New-template trigger", min_value=1, value=5, key="tail_new_templates")
+        debounce = settings[2].number_input("Min seconds between LLM calls", min_value=5, value=30, key="tail_debounce")
+        follow = st.toggle("Follow", key="tail_follow")
+        if not (follow and tail_name):
+            close_live_tail()
+            return
+        tail_path = resolve_tail_path(tail_name)
+        if tail_path is None:
+            st.error(f"File '{tail_name}' is not a file in {TAIL_LOG_DIR}.")
+            return
+        tail = st.session_state.get('log_tail')
+        if tail is None or tail.follower.path != tail_path:
+            from agents.log_tail import TailAnalyzer
+            close_live_tail()
+            # The LLM runs on the tail's worker thread; the panel only polls for finished reports.
+            tail = TailAnalyzer(tail_path, background=True)
+            st.session_state['log_tail'] = tail
+        tail.error_rate_threshold = error_rate
+        tail.new_template_threshold = int(new_templates)
+        tail.debounce_seconds = int(debounce)
+        if hasattr(st, "fragment"):
+            # Only the panel reruns on the timer, so other pages' results stay on screen.
+            st.fragment(live_tail_panel, run_every=TAIL_REFRESH_SECONDS)(tail)
+        else:
+            st.button("Check for new lines", key="tail_refresh")
+            live_tail_panel(tail)
+
+
+def close_live_tail():
+    tail = st.session_state.pop('log_tail', None)
+    if tail is not None:
+        tail.close()
+
+
+def live_tail_panel(tail):
+    tail.poll()
+    window = tail.stats.window_summary()
+    metric_cols = st.columns(4)
+    metric_cols[0].metric("Lines seen", tail.stats.total_lines)
+    metric_cols[1].metric(f"Error rate ({tail.stats.window_seconds}s)", f"{window['error_rate']:.0%}")
+    metric_cols[2].metric("Templates", len(tail.stats.templates))
+    metric_cols[3].metric("LLM calls", tail.llm_calls,
+                          delta=f"{tail.failed_calls} failed" if tail.failed_calls else None, delta_color="inverse")
+    if tail.stats.levels:
+        st.bar_chart(dict(tail.stats.levels))
+    top = tail.stats.top_templates(10)
+    if top:
+        st.markdown("**Top message templates:**")
+        st.table([{"Count": count, "Template": template} for template, count in top])
+    if tail.analyzing:
+        st.caption("⏳ Analyzing the latest trigger in the background...")
+    # Plain containers: this panel already sits inside the Live Tail expander.
+    for report in reversed(tail.recent_reports(3)):
+        when = datetime.datetime.fromtimestamp(report['time']).strftime("%H:%M:%S")
+        with st.container(border=True):
+            st.markdown(f"**{when}: {'; '.join(report['reasons'])}**")
+            if report['report'].startswith("Error:"):
+                st.error(report['report'])
+            else:
+                st.markdown(report['report'])
+
+
 def main():
     selected_page = sidebar_and_nav()
     if selected_page == "Home":
@@ -0,0 +1,279 @@
+"""
+Batch Runner: Headless runner for all agents over directories of input files.
+
+Walks the input directories, runs the selected agent on each file with a worker pool,
+and appends one JSON record per file to the output JSONL. The output file doubles as
+the checkpoint: on restart, files whose content hash already has a successful record
+are skipped, so interrupted nightly jobs resume where they stopped and unchanged
+inputs are never re-analyzed.
+
+Usage:
+    python -m crewai.batch_runner --agent logs --input ./logs --output log_results.jsonl --workers 4
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+AGENT_EXTENSIONS = {
+    "testcases": (".txt", ".md"),
+    "logs": (".log", ".txt"),
+    "finance": (".xlsx", ".csv"),
+}
+
+
+def _run_testcases(agent, path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return agent.generate_test_cases(f.read())
+
+
+def _run_logs(agent, path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return agent.analyze(f.read())
+
+
+def _run_finance(agent, path):
+    import pandas as pd
+    df = pd.read_csv(path) if path.lower().endswith(".csv") else pd.read_excel(path)
+    return agent.analyze(df)
+
+
+def _make_agent(agent_name):
+    if agent_name == "testcases":
+        from agents.unit_test_generator import SmartUnitTestGenerator
+        return SmartUnitTestGenerator()
+    if agent_name == "logs":
+        from agents.system_log_analyzer import SystemLogAnalyzer
+        return SystemLogAnalyzer()
+    if agent_name == "finance":
+        from agents.finance_sheet_analyzer import FinanceSheetAnalyzer
+        return FinanceSheetAnalyzer()
+    raise ValueError(f"Unknown agent: {agent_name}")
+
+
+RUNNERS = {
+    "testcases": _run_testcases,
+    "logs": _run_logs,
+    "finance": _run_finance,
+}
+
+
+def file_hash(path):
+    """
+    Return the SHA-256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def discover_inputs(input_dirs, extensions):
+    """
+    Recursively list input files with one of the given extensions, in a stable order.
+    Args:
+        input_dirs (list[str]): Directories (or individual files) to scan.
+        extensions (tuple[str]): Lower-case file extensions to include.
+    Returns:
+        list[str]: Sorted file paths.
+    """
+    paths = []
+    for root in input_dirs:
+        if os.path.isfile(root):
+            paths.append(root)
+            continue
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if name.lower().endswith(extensions):
+                    paths.append(os.path.join(dirpath, name))
+    return sorted(set(paths))
+
+
+def load_checkpoint(output_path, agent_name):
+    """
+    Read the content hashes already processed successfully from an existing output JSONL.
+    Args:
+        output_path (str): Path of the results JSONL.
+        agent_name (str): Agent whose records count as done.
+    Returns:
+        set[str]: Content hashes with a successful record.
+    """
+    done = set()
+    if not os.path.isfile(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final line from an interrupted run; that file is simply redone.
+                continue
+            if record.get("agent") == agent_name and record.get("status") == "ok":
+                done.add(record.get("sha256"))
+    return done
+
+
+def _to_jsonable(value):
+    if hasattr(value, "to_dict"):
+        # pandas DataFrame/Series (e.g. finance 'yearly_trends')
+        try:
+            return value.to_dict(orient="index")
+        except TypeError:
+            return value.to_dict()
+    if hasattr(value, "item"):
+        # numpy scalars
+        return value.item()
+    return str(value)
+
+
+def _is_failure(result):
+    if isinstance(result, dict):
+        return 'error' in result, result.get('error')
+    if isinstance(result, str) and result.startswith("Error:"):
+        return True, result
+    return False, None
+
+
+class BatchRunner:
+    """
+    Run one agent over many input files with a thread pool and JSONL checkpointing.
+    """
+    def __init__(self, agent_name, output_path, workers=4, force=False, agent_factory=None):
+        """
+        Initialize the BatchRunner.
+        Args:
+            agent_name (str): One of 'testcases', 'logs' or 'finance'.
+            output_path (str): Results JSONL (also used as the resume checkpoint).
+            workers (int): Number of concurrent agent calls.
+            force (bool): Re-run files even if their content hash was already processed.
+            agent_factory (callable): Optional zero-argument factory for the agent instance.
+        """
+        if agent_name not in RUNNERS:
+            raise ValueError(f"Unknown agent: {agent_name}")
+        self.agent_name = agent_name
+        self.output_path = output_path
+        self.workers = max(1, workers)
+        self.force = force
+        self.agent_factory = agent_factory or (lambda: _make_agent(agent_name))
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _agent(self):
+        # One agent per worker thread; agent clients are not guaranteed thread-safe.
+        if not hasattr(self._local, "agent"):
+            self._local.agent = self.agent_factory()
+        return self._local.agent
+
+    def _process(self, path, sha256):
+        started = time.perf_counter()
+        record = {
+            "agent": self.agent_name,
+            "path": path,
+            "sha256": sha256,
+            "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        try:
+            result = RUNNERS[self.agent_name](self._agent(), path)
+            failed, error = _is_failure(result)
+            record["status"] = "error" if failed else "ok"
+            record["result"] = result
+            if failed:
+                record["error"] = error
+        except Exception as e:
+            logging.error(f"Batch run failed for {path}: {e}")
+            record["status"] = "error"
+            record["error"] = str(e)
+        record["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return record
+
+    def _write(self, out, record):
+        with self._write_lock:
+            out.write(json.dumps(record, default=_to_jsonable, ensure_ascii=False) + "\n")
+            out.flush()
+
+    def run(self, input_dirs):
+        """
+        Process every input file not already in the checkpoint.
+        Args:
+            input_dirs (list[str]): Directories or files to process.
+        Returns:
+            dict: Summary with counts, elapsed time, throughput and failed paths.
+        """
+        started = time.perf_counter()
+        paths = discover_inputs(input_dirs, AGENT_EXTENSIONS[self.agent_name])
+        done = set() if self.force else load_checkpoint(self.output_path, self.agent_name)
+        todo = []
+        skipped = 0
+        seen = set()
+        for path in paths:
+            sha256 = file_hash(path)
+            if sha256 in done or sha256 in seen:
+                skipped += 1
+                continue
+            seen.add(sha256)
+            todo.append((path, sha256))
+        logging.info(f"{len(paths)} inputs found, {skipped} unchanged/duplicate skipped, {len(todo)} to process")
+
+        ok = 0
+        failures = []
+        out_dir = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(out_dir, exist_ok=True)
+        with open(self.output_path, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._process, path, sha256): path for path, sha256 in todo}
+            for n, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                self._write(out, record)
+                if record["status"] == "ok":
+                    ok += 1
+                else:
+                    failures.append((record["path"], record.get("error")))
+                logging.info(f"[{n}/{len(todo)}] {record['status']} {record['path']} ({record['elapsed_s']}s)")
+
+        elapsed = time.perf_counter() - started
+        return {
+            "agent": self.agent_name,
+            "found": len(paths),
+            "skipped": skipped,
+            "processed": len(todo),
+            "succeeded": ok,
+            "failed": len(failures),
+            "failures": failures,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_min": round(len(todo) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        }
+
+
+def print_summary(summary):
+    print(f"\nBatch summary ({summary['agent']}):")
+    print(f"  Inputs found:  {summary['found']}")
+    print(f"  Skipped:       {summary['skipped']} (unchanged since last run or duplicate content)")
+    print(f"  Processed:     {summary['processed']} ({summary['succeeded']} ok, {summary['failed']} failed)")
+    print(f"  Elapsed:       {summary['elapsed_s']}s ({summary['throughput_per_min']} files/min)")
+    for path, error in summary["failures"]:
+        print(f"  FAILED {path}: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an AI agent over directories of input files.")
+    parser.add_argument("--agent", required=True, choices=sorted(RUNNERS), help="Agent to run.")
+    parser.add_argument("--input", required=True, action="append", help="Input directory or file (repeatable).")
+    parser.add_argument("--output", required=True, help="Results JSONL; existing successful records are skipped.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent agent calls.")
+    parser.add_argument("--force", action="store_true", help="Re-run inputs already present in the output.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    summary = BatchRunner(args.agent, args.output, workers=args.workers, force=args.force).run(args.input)
+    print_summary(summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+Cancellation: Cancellable, deadline-bounded streaming of Ollama generations.
+
+Generations are consumed as a stream so they can be stopped early. Cancelling shuts
+the HTTP connection down, even while a read is blocked on a stalled server, which makes
+Ollama abort the generation instead of producing tokens nobody will read. Outcomes are
+counted per agent so wasted generation time is visible (see ``cancellation_stats``).
+"""
+import json
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict
+
+OUTCOMES = ("completed", "cancelled", "deadline", "abandoned", "failed")
+
+
+class GenerationCancelled(Exception):
+    """
+    Raised when a streamed generation is stopped by a CancelToken.
+    """
+    def __init__(self, reason, partial=""):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial = partial
+
+
+class CancelToken:
+    """
+    Thread-safe cancellation flag with an optional wall-clock deadline.
+    """
+    def __init__(self, deadline_s=None, parent=None):
+        """
+        Initialize the CancelToken.
+        Args:
+            deadline_s (float): Seconds from now after which the token reports 'deadline'.
+            parent (CancelToken): Token whose cancellation also cancels this one.
+        """
+        self._event = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+        self.reason = None
+        self.parent = parent
+        self.deadline = time.monotonic() + deadline_s if deadline_s else None
+
+    def cancel(self, reason="cancelled"):
+        """
+        Request cancellation; in-flight streams are shut down (see ``on_cancel``).
+        """
+        with self._callbacks_lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.debug(f"Cancel callback failed: {e}")
+
+    def on_cancel(self, callback):
+        """
+        Call ``callback()`` when this token or its parent is cancelled (at once if it already is).
+        Deadlines do not fire callbacks; they bound the read timeout instead (see ``remaining``).
+        Returns:
+            callable: Unregisters the callback.
+        """
+        with self._callbacks_lock:
+            fired = self._event.is_set()
+            if not fired:
+                self._callbacks.append(callback)
+        if fired:
+            callback()
+            return lambda: None
+        release_parent = self.parent.on_cancel(callback) if self.parent is not None else None
+
+        def release():
+            with self._callbacks_lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+            if release_parent is not None:
+                release_parent()
+        return release
+
+    def check(self):
+        """
+        Return the cancellation reason, or None if the generation may continue.
+        """
+        if self._event.is_set():
+            return self.reason
+        if self.parent is not None:
+            reason = self.parent.check()
+            if reason:
+                return reason
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "deadline"
+        return None
+
+    def remaining(self, default=None):
+        """
+        Return seconds left until the deadline (never below 1), or ``default`` when there is none.
+        """
+        deadlines = [t.deadline for t in (self, self.parent) if t is not None and t.deadline is not None]
+        if not deadlines:
+            return default
+        return max(1.0, min(deadlines) - time.monotonic())
+
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {**{outcome: 0 for outcome in OUTCOMES}, "wasted_seconds": 0.0})
+
+
+def _record(agent, outcome, elapsed):
+    with _stats_lock:
+        entry = _stats[agent]
+        entry[outcome] += 1
+        if outcome != "completed":
+            entry["wasted_seconds"] += elapsed
+
+
+def cancellation_stats():
+    """
+    Return per-agent generation outcome counts and seconds spent on stopped generations.
+    Returns:
+        dict: {agent: {'completed': n, 'cancelled': n, 'deadline': n, 'abandoned': n, 'failed': n, 'wasted_seconds': s}}
+    """
+    with _stats_lock:
+        return {agent: dict(entry) for agent, entry in _stats.items()}
+
+
+def consume_stream(chunks, token=None, on_chunk=None, agent="llm"):
+    """
+    Join a stream of text chunks, stopping early when ``token`` trips.
+    The stream is always closed on exit, so an abandoned caller (for example a Streamlit
+    run interrupted inside ``on_chunk``) also stops the generation.
+    Args:
+        chunks (iterator[str]): Text chunks, e.g. from ``iter_ollama_stream`` or ``OllamaLLM.stream``.
+        token (CancelToken): Optional cancellation token.
+        on_chunk (callable): Called with each chunk as it arrives.
+        agent (str): Name used for the outcome statistics.
+    Returns:
+        str: The full generated text.
+    Raises:
+        GenerationCancelled: If the token was cancelled or its deadline passed.
+    """
+    started = time.monotonic()
+    parts = []
+    outcome = "abandoned"
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+            reason = token.check() if token is not None else None
+            if reason:
+                outcome = "deadline" if reason == "deadline" else "cancelled"
+                raise GenerationCancelled(reason, "".join(parts))
+        outcome = "completed"
+        return "".join(parts)
+    except GenerationCancelled:
+        raise
+    except Exception:
+        reason = token.check() if token is not None else None
+        if reason:
+            # The read failed because cancelling shut the connection down.
+            outcome = "deadline" if reason == "deadline" else "cancelled"
+            raise GenerationCancelled(reason, "".join(parts))
+        outcome = "failed"
+        raise
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        elapsed = time.monotonic() - started
+        if outcome != "completed":
+            logging.info(f"{agent}: generation {outcome} after {elapsed:.1f}s")
+        _record(agent, outcome, elapsed)
+
+
+def iter_ollama_stream(base_url, payload, timeout=60, token=None):
+    """
+    Stream the text of an Ollama ``/api/generate`` call.
+    Args:
+        base_url (str): Ollama server URL.
+        payload (dict): Request body; ``stream`` is forced on.
+        timeout (float): Connect/read timeout in seconds (capped by the token deadline).
+        token (CancelToken): Optional token whose remaining time bounds the read timeout.
+    Yields:
+        str: Response text chunks. Closing the generator, or cancelling ``token``, closes the
+        HTTP connection.
+    """
+    import requests
+
+    read_timeout = token.remaining(default=timeout) if token is not None else timeout
+    response = requests.post(
+        f"{base_url}/api/generate", json=dict(payload, stream=True), stream=True,
+        timeout=(min(10, timeout), min(timeout, read_timeout)),
+    )
+    release = token.on_cancel(lambda: _abort_response(response)) if token is not None else None
+    try:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                logging.warning(f"Failed to parse line as JSON: {e} | Line: {line}")
+                continue
+            if data.get("error"):
+                raise RuntimeError(data["error"])
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                break
+    finally:
+        if release is not None:
+            release()
+        response.close()
+
+
+def _abort_response(response):
+    # Runs on the cancelling thread. close() alone does not wake a read blocked in
+    # recv(), so shut the socket down; the reading thread then fails and closes it.
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is None:
+        response.close()
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _FailoverChunks:
+    """
+    Hand the caller's on_chunk to successive router attempts without duplicating text.
+    When an endpoint fails mid-stream the router retries on another one, which streams
+    the answer again from the start. Before that attempt, ``on_chunk.reset()`` is called
+    so the caller can discard the partial text; callbacks without ``reset`` simply
+    receive nothing more (the returned text is still complete).
+    """
+    def __init__(self, on_chunk):
+        self.on_chunk = on_chunk
+        self.emitted = False
+        self.muted = on_chunk is None
+
+    def start(self):
+        if self.emitted and not self.muted:
+            reset = getattr(self.on_chunk, "reset", None)
+            if reset is None:
+                self.muted = True
+            else:
+                reset()
+                self.emitted = False
+        return None if self.muted else self._forward
+
+    def _forward(self, chunk):
+        self.emitted = True
+        self.on_chunk(chunk)
+
+
+def query_ollama(router, prompt, cancel_token=None, on_chunk=None, num_predict=None, deadline_s=None,
+                 format=None, agent="llm", model="llama3.1", timeout=60):
+    """
+    Stream a prompt through the router and return the text, or an "Error: ..." message.
+    Identical concurrent prompts share one generation (see ``llm.resilience.coalesce``).
+    Args:
+        router (OllamaRouter): Chooses the endpoint and fails over between endpoints.
+        prompt (str): Prompt text.
+        cancel_token (CancelToken): Caller's token to abort the generation.
+        on_chunk (callable): Called with each chunk; may define ``reset()`` for failover (see ``_FailoverChunks``).
+        num_predict (int): Hard cap on generated tokens.
+        deadline_s (float): Hard wall-clock limit for this call.
+        format (str or dict): Ollama structured output: "json" or a JSON schema.
+        agent (str): Name used for the outcome statistics.
+        model (str): Ollama model name.
+        timeout (float): Connect/read timeout in seconds.
+    Returns:
+        str: The generated text or an error message.
+    """
+    import requests
+    from llm.resilience import CircuitOpenError, coalesce
+
+    payload = {"model": model, "prompt": prompt}
+    if num_predict:
+        payload["options"] = {"num_predict": num_predict}
+    if format:
+        payload["format"] = format
+    token = CancelToken(deadline_s=deadline_s, parent=cancel_token)
+    attempts = _FailoverChunks(on_chunk)
+
+    def generate(base_url):
+        chunks = iter_ollama_stream(base_url, payload, timeout=timeout, token=token)
+        return consume_stream(chunks, token=token, on_chunk=attempts.start(), agent=agent)
+
+    try:
+        # The router picks the least-loaded healthy endpoint; endpoints with a tripped circuit are skipped.
+        return coalesce(payload, lambda: router.generate(model, generate), cancel_token=token)
+    except CircuitOpenError as e:
+        logging.error(f"Llama server unavailable: {e}")
+        return f"Error: Llama server unavailable. Details: {e}"
+    except GenerationCancelled as e:
+        return f"Error: Generation cancelled ({e.reason})."
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Request to Llama server failed: {e}")
+        return f"Error: Could not connect to Llama server. Details: {e}"
+    except Exception as e:
+        logging.error(f"Failed to read Llama server response: {e}")
+        return f"Error: Failed to read Llama server response. Details: {e}"
+
+
+def stream_llm(ollama_llm, prompt, cancel_token=None, on_chunk=None, deadline_s=None, format=None, agent="llm"):
+    """
+    Run a LangChain ``OllamaLLM`` prompt as a cancellable, routed stream.
+    Args:
+        ollama_llm: An ``OllamaLLM`` instance (anything with ``stream(prompt)``).
+        prompt (str): Prompt text.
+        cancel_token (CancelToken): Caller's token (e.g. the Streamlit session's).
+        on_chunk (callable): Called with each chunk; may define ``reset()`` for failover (see ``_FailoverChunks``).
+        deadline_s (float): Hard wall-clock limit for this call.
+        format (str or dict): Ollama structured output: "json" or a JSON schema.
+        agent (str): Name used for the outcome statistics.
+    Returns:
+        str: The generated text.
+    Raises:
+        GenerationCancelled: If cancelled or past the deadline.
+        CircuitOpenError: If every Ollama endpoint is out of rotation.
+    """
+    from llm.resilience import coalesce
+    from llm.router import get_router
+
+    token = CancelToken(deadline_s=deadline_s, parent=cancel_token)
+    model = getattr(ollama_llm, "model", None)
+    num_predict = getattr(ollama_llm, "num_predict", None)
+    payload = {"model": model, "prompt": prompt, "options": {"num_predict": num_predict}, "format": format}
+    router = get_router()
+    attempts = _FailoverChunks(on_chunk)
+
+    def generate(base_url):
+        llm = _ollama_llm_for(ollama_llm, base_url, format)
+        return consume_stream(iter(llm.stream(prompt)), token=token, on_chunk=attempts.start(), agent=agent)
+
+    return coalesce(payload, lambda: router.generate(model, generate), cancel_token=token)
+
+
+_llm_clones = {}
+_llm_clones_lock = threading.Lock()
+
+
+def _ollama_llm_for(ollama_llm, base_url, format=None):
+    # OllamaLLM binds its HTTP client to one base_url (and its output format) at
+    # construction, so keep one instance per (model, num_predict, endpoint, format).
+    if getattr(ollama_llm, "base_url", None) == base_url and not format:
+        return ollama_llm
+    format_key = json.dumps(format, sort_keys=True) if format else None
+    key = (type(ollama_llm), ollama_llm.model, getattr(ollama_llm, "num_predict", None), base_url, format_key)
+    with _llm_clones_lock:
+        if key not in _llm_clones:
+            options = {"model": ollama_llm.model, "base_url": base_url, "num_predict": key[2]}
+            if format:
+                options["format"] = format
+            _llm_clones[key] = type(ollama_llm)(**options)
+        return _llm_clones[key]
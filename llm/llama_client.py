@@ -1,45 +1,37 @@
-import requests
-import logging
+from llm.cancellation import query_ollama
+from llm.router import get_router
 
 class LlamaClient:
     """
     Client for interacting with a local Ollama Llama 3.1 server.
     Handles prompt submission and response parsing with error handling.
     """
-    def __init__(self, base_url="http://localhost:11434"):
+    def __init__(self, base_url=None):
         """
         Initialize the LlamaClient.
         Args:
-            base_url (str): Base URL for the local Ollama server.
+            base_url (str): Base URL of a single Ollama server. When omitted, requests are
+                balanced over the endpoints configured in OLLAMA_ENDPOINTS (see llm/router.py).
         """
-        self.base_url = base_url
+        self.router = get_router([base_url] if base_url else None)
+        self.base_url = self.router.urls[0]
 
-    def query(self, prompt):
+    def query(self, prompt, cancel_token=None, on_chunk=None, num_predict=None, deadline_s=None, format=None, agent="llama_client"):
         """
         Send a prompt to the Llama 3.1 model and return the response.
+        The response is streamed so the generation can be stopped early: cancelling
+        ``cancel_token`` or passing ``deadline_s`` closes the connection, and Ollama stops generating.
         Args:
             prompt (str): The prompt to send to the model.
+            cancel_token (CancelToken): Optional token to abort the generation.
+            on_chunk (callable): Optional callback receiving each streamed text chunk.
+            num_predict (int): Hard cap on generated tokens.
+            deadline_s (float): Hard wall-clock limit in seconds.
+            format (str or dict): Ollama structured output: "json" or a JSON schema the response must match.
+            agent (str): Name used in the cancellation statistics.
         Returns:
             str: The model's response or error message.
         """
-        endpoint = f"{self.base_url}/api/generate"
-        payload = {"model": "llama3.1", "prompt": prompt}
-        try:
-            response = requests.post(endpoint, json=payload, timeout=30)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Request to Llama server failed: {e}")
-            return f"Error: Could not connect to Llama server. Details: {e}"
-
-        # Try to parse JSON response
-        try:
-            data = response.json()
-            if "response" in data:
-                return data["response"]
-            else:
-                logging.warning(f"Unexpected JSON structure: {data}")
-                return str(data)
-        except Exception as e:
-            logging.error(f"Failed to parse JSON response: {e}")
-            # Return raw text if JSON parsing fails
-            return response.text
+        return query_ollama(self.router, prompt, cancel_token=cancel_token, on_chunk=on_chunk,
+                            num_predict=num_predict, deadline_s=deadline_s, format=format, agent=agent,
+                            timeout=30)
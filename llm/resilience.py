@@ -0,0 +1,281 @@
+"""
+Resilience: Request coalescing and circuit breaking for Ollama calls.
+
+- Single-flight coalescing: identical prompts (same server, model and options) that are
+  in flight at the same time share one generation and its result.
+- Circuit breaker: after repeated backend failures, calls fail fast instead of waiting
+  for the full request timeout. Once the reset timeout passes, a cheap health probe
+  (``GET /api/tags``) decides whether to close the circuit again.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from llm.cancellation import GenerationCancelled
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is rejected because the backend's circuit is open.
+    """
+    def __init__(self, base_url, retry_in):
+        super().__init__(f"Circuit open for {base_url}; retrying in {retry_in:.0f}s")
+        self.base_url = base_url
+        self.retry_in = retry_in
+
+
+def ollama_health_probe(base_url, timeout=2):
+    """
+    Return True if the Ollama server answers ``/api/tags``.
+    """
+    import requests
+
+    try:
+        return requests.get(f"{base_url}/api/tags", timeout=timeout).ok
+    except requests.exceptions.RequestException:
+        return False
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for one backend.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, base_url, failure_threshold=3, reset_timeout=15, max_reset_timeout=120, probe=ollama_health_probe):
+        """
+        Initialize the CircuitBreaker.
+        Args:
+            base_url (str): Backend URL (used for probing and messages).
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds the circuit stays open before probing.
+            max_reset_timeout (float): Upper bound for the reset timeout, which doubles after each failed probe.
+            probe (callable): Health check taking ``base_url`` and returning True when healthy.
+        """
+        self.base_url = base_url
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.probe = probe
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._reset_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Raise CircuitOpenError unless a call may proceed now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            retry_in = self._opened_at + self._reset_timeout - now
+            if self.state == self.HALF_OPEN or retry_in > 0:
+                # Another caller is probing, or the reset timeout has not elapsed.
+                self.rejected += 1
+                raise CircuitOpenError(self.base_url, max(retry_in, 0))
+            self.state = self.HALF_OPEN
+        healthy = False
+        try:
+            healthy = self.probe(self.base_url)
+        except Exception as e:
+            logging.warning(f"Health probe for {self.base_url} failed: {e}")
+        with self._lock:
+            if healthy:
+                logging.info(f"LLM backend {self.base_url} healthy again; closing circuit")
+                self.state = self.CLOSED
+                self.failures = 0
+                self._reset_timeout = self.base_reset_timeout
+                return
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._reset_timeout = min(self._reset_timeout * 2, self.max_reset_timeout)
+            self.rejected += 1
+            raise CircuitOpenError(self.base_url, self._reset_timeout)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self._reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                logging.warning(f"LLM backend {self.base_url} failed {self.failures} times; opening circuit")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight call among concurrent callers with the same key.
+    """
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn, cancel_token=None):
+        """
+        Run ``fn`` once per key at a time; concurrent callers wait for and share its result.
+        If the leading call is cancelled, waiting callers run the call themselves.
+        Args:
+            key (str): Deduplication key.
+            fn (callable): Zero-argument function producing the result.
+            cancel_token (CancelToken): Lets a waiting caller stop waiting.
+        Returns:
+            The result of ``fn``.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                else:
+                    flight.followers += 1
+                    self.coalesced += 1
+            if leader:
+                try:
+                    flight.result = fn()
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._flights.pop(key, None)
+                    flight.done.set()
+                return flight.result
+            while not flight.done.wait(0.2):
+                reason = cancel_token.check() if cancel_token is not None else None
+                if reason:
+                    raise GenerationCancelled(reason)
+            if isinstance(flight.error, GenerationCancelled) or not isinstance(flight.error, (Exception, type(None))):
+                # The leader's caller went away (cancelled or its run was stopped);
+                # that is not a result to share.
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+
+_breakers = {}
+_flight = SingleFlight()
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(base_url):
+    """
+    Return the process-wide CircuitBreaker for a backend URL.
+    """
+    with _registry_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker(base_url)
+        return _breakers[base_url]
+
+
+def is_backend_failure(error):
+    """
+    Return True if ``error`` means the backend is unhealthy: it could not be reached,
+    timed out, dropped the stream or answered with a 5xx. Anything else (client errors
+    such as an unknown model, errors reported inside the stream, exceptions from the
+    caller's callbacks) is not the endpoint's fault and returns False.
+    """
+    import requests
+
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        # The ollama client re-raises httpx.ConnectError as the builtin ConnectionError.
+        return True
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+    if httpx is not None:
+        # Raised by the ollama client behind LangChain's OllamaLLM.
+        if isinstance(error, (httpx.ConnectError, httpx.TimeoutException, httpx.RemoteProtocolError)):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+    try:
+        from ollama import ResponseError
+    except ImportError:
+        return False
+    return isinstance(error, ResponseError) and (error.status_code or 0) >= 500
+
+
+def request_key(payload):
+    """
+    Return the coalescing key for a generate request.
+    """
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def call_with_breaker(base_url, fn):
+    """
+    Run ``fn`` through the backend's circuit breaker.
+    Args:
+        base_url (str): Ollama server URL.
+        fn (callable): Zero-argument function performing the call.
+    Returns:
+        The result of ``fn``.
+    Raises:
+        CircuitOpenError: If the backend is considered down.
+    """
+    breaker = get_circuit_breaker(base_url)
+    breaker.allow()
+    try:
+        result = fn()
+    except GenerationCancelled:
+        raise
+    except Exception as e:
+        if is_backend_failure(e):
+            breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def coalesce(payload, fn, cancel_token=None):
+    """
+    Run a generation through the shared single-flight group.
+    Args:
+        payload (dict): Request parameters identifying the generation (model, prompt, options).
+        fn (callable): Zero-argument function performing the generation.
+        cancel_token (CancelToken): Caller's cancellation token.
+    Returns:
+        str: Generated text, possibly shared with identical concurrent requests.
+    """
+    return _flight.do(request_key(payload), fn, cancel_token=cancel_token)
+
+
+def resilience_stats():
+    """
+    Return circuit states and coalescing counters.
+    """
+    with _registry_lock:
+        breakers = {url: {"state": b.state, "failures": b.failures, "rejected": b.rejected} for url, b in _breakers.items()}
+    return {"coalesced": _flight.coalesced, "circuits": breakers}
@@ -0,0 +1,207 @@
+"""
+Router: Spread Ollama generations over several Ollama instances.
+
+Endpoints come from ``OLLAMA_ENDPOINTS`` (comma-separated URLs) or ``OLLAMA_HOST`` and
+default to the local server. Each request goes to the endpoint with the lowest
+estimated cost: in-flight requests times observed latency, plus a penalty when the
+target model is not already loaded there (per ``/api/ps``). Endpoints whose circuit
+breaker is open are out of rotation until their health probe succeeds; a request that
+fails on one endpoint with a backend error is retried on the next best one.
+"""
+import logging
+import os
+import threading
+import time
+
+from llm.cancellation import GenerationCancelled
+from llm.resilience import CircuitOpenError, call_with_breaker, get_circuit_breaker, is_backend_failure
+
+DEFAULT_ENDPOINT = "http://localhost:11434"
+
+
+def default_endpoints():
+    """
+    Return the configured Ollama endpoint URLs.
+    """
+    raw = os.environ.get("OLLAMA_ENDPOINTS") or os.environ.get("OLLAMA_HOST") or DEFAULT_ENDPOINT
+    urls = []
+    for url in raw.split(","):
+        url = url.strip().rstrip("/")
+        if url and not url.startswith(("http://", "https://")):
+            url = "http://" + url
+        if url and url not in urls:
+            urls.append(url)
+    return urls or [DEFAULT_ENDPOINT]
+
+
+def _model_matches(name, model):
+    return name == model or name.split(":")[0] == model.split(":")[0]
+
+
+class Endpoint:
+    """
+    Load and latency bookkeeping for one Ollama instance.
+    """
+    def __init__(self, url, latency_alpha=0.3, initial_latency=1.0):
+        self.url = url
+        self.in_flight = 0
+        self.latency = initial_latency
+        self.latency_alpha = latency_alpha
+        self.requests = 0
+        self.loaded_models = set()
+        self.models_checked_at = 0.0
+        self._refreshing = False
+
+    def observe(self, seconds):
+        # Exponentially weighted moving average of call latency.
+        self.latency = (1 - self.latency_alpha) * self.latency + self.latency_alpha * seconds
+        self.requests += 1
+
+    def has_model(self, model):
+        return any(_model_matches(name, model) for name in self.loaded_models)
+
+
+class OllamaRouter:
+    """
+    Least-loaded, model-aware balancing over several Ollama endpoints.
+    """
+    def __init__(self, endpoints=None, model_load_penalty=5.0, models_refresh_s=30, probe_timeout=2):
+        """
+        Initialize the OllamaRouter.
+        Args:
+            endpoints (list[str]): Ollama base URLs (defaults to ``default_endpoints()``).
+            model_load_penalty (float): Extra estimated seconds for an endpoint without the model loaded.
+            models_refresh_s (float): How often to refresh each endpoint's loaded models.
+            probe_timeout (float): Timeout for ``/api/ps`` requests.
+        """
+        self.endpoints = [Endpoint(url) for url in (endpoints or default_endpoints())]
+        self.model_load_penalty = model_load_penalty
+        self.models_refresh_s = models_refresh_s
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def _refresh_models(self, endpoint):
+        import requests
+
+        try:
+            response = requests.get(f"{endpoint.url}/api/ps", timeout=self.probe_timeout)
+            response.raise_for_status()
+            models = {m.get("name") or m.get("model") for m in response.json().get("models", [])}
+            with self._lock:
+                endpoint.loaded_models = {name for name in models if name}
+        except Exception as e:
+            logging.debug(f"Could not list loaded models on {endpoint.url}: {e}")
+        finally:
+            with self._lock:
+                endpoint.models_checked_at = time.monotonic()
+                endpoint._refreshing = False
+
+    def _maybe_refresh(self, now):
+        # Called with the lock held; refreshes run in the background so routing never waits.
+        for endpoint in self.endpoints:
+            if not endpoint._refreshing and now - endpoint.models_checked_at >= self.models_refresh_s:
+                endpoint._refreshing = True
+                threading.Thread(target=self._refresh_models, args=(endpoint,), daemon=True).start()
+
+    def _cost(self, endpoint, model):
+        cost = (endpoint.in_flight + 1) * endpoint.latency
+        if not endpoint.has_model(model):
+            cost += self.model_load_penalty
+        return cost
+
+    def choose(self, model, exclude=()):
+        """
+        Return the cheapest available endpoint for ``model``, or None.
+        Endpoints with an open circuit are skipped unless their reset timeout has
+        elapsed, in which case the breaker's probe decides when the call is made.
+        """
+        with self._lock:
+            if len(self.endpoints) > 1:
+                self._maybe_refresh(time.monotonic())
+            candidates = [e for e in self.endpoints if e.url not in exclude]
+            if not candidates:
+                return None
+            available = [e for e in candidates if get_circuit_breaker(e.url).state == "closed"]
+            pool = available or candidates
+            endpoint = min(pool, key=lambda e: (self._cost(e, model), e.in_flight))
+            endpoint.in_flight += 1
+            return endpoint
+
+    def generate(self, model, fn):
+        """
+        Run ``fn(base_url)`` on the best endpoint, failing over on backend errors.
+        Args:
+            model (str): Target model name.
+            fn (callable): Performs the generation against the given base URL.
+        Returns:
+            The result of ``fn``.
+        Raises:
+            CircuitOpenError: If every endpoint is out of rotation.
+            GenerationCancelled: If the caller cancelled.
+        """
+        tried = set()
+        last_error = None
+        for _ in range(len(self.endpoints)):
+            endpoint = self.choose(model, exclude=tried)
+            if endpoint is None:
+                break
+            tried.add(endpoint.url)
+            started = time.monotonic()
+            try:
+                result = call_with_breaker(endpoint.url, lambda: fn(endpoint.url))
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                logging.warning(f"Ollama endpoint {endpoint.url} failed, trying another: {e}")
+                last_error = e
+                continue
+            finally:
+                with self._lock:
+                    endpoint.in_flight -= 1
+            with self._lock:
+                endpoint.observe(time.monotonic() - started)
+                endpoint.loaded_models.add(model)
+            return result
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(",".join(self.urls), 0)
+
+    def stats(self):
+        """
+        Return per-endpoint load, latency and circuit state.
+        """
+        with self._lock:
+            return {
+                e.url: {
+                    "in_flight": e.in_flight,
+                    "latency_s": round(e.latency, 3),
+                    "requests": e.requests,
+                    "loaded_models": sorted(e.loaded_models),
+                    "circuit": get_circuit_breaker(e.url).state,
+                }
+                for e in self.endpoints
+            }
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(endpoints=None):
+    """
+    Return the process-wide router for a set of endpoints (the configured ones by default).
+    """
+    key = tuple(endpoints or default_endpoints())
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = OllamaRouter(list(key))
+        return _routers[key]
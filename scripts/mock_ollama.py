@@ -0,0 +1,119 @@
+"""
+Mock Ollama: Minimal stand-in for one or more Ollama servers, for exercising the
+LLM router, cancellation and circuit breaker without a GPU.
+
+Implements ``POST /api/generate`` (NDJSON stream), ``GET /api/tags`` and ``GET /api/ps``.
+
+Usage:
+    python scripts/mock_ollama.py --ports 11501 11502 11503 --delay 0.05 --tokens 40
+    OLLAMA_ENDPOINTS=http://localhost:11501,http://localhost:11502,http://localhost:11503 streamlit run app.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        models = [{"name": name, "model": name} for name in sorted(self.server.loaded_models)]
+        if self.path.startswith("/api/tags") or self.path.startswith("/api/ps"):
+            self._send_json({"models": models})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _write_chunk(self, body):
+        line = (json.dumps(body) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.startswith("/api/generate"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        limit = (request.get("options") or {}).get("num_predict") or server.tokens
+        with server.lock:
+            server.in_flight += 1
+            server.loaded_models.add(request.get("model", "llama3.1"))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i in range(min(limit, server.tokens)):
+                if server.fail_after is not None and i >= server.fail_after:
+                    # Drop the connection mid-stream, as a crashing server would.
+                    self.close_connection = True
+                    server.failed += 1
+                    return
+                self._write_chunk({"model": request.get("model"), "response": f"[{server.server_port}] token{i} ", "done": False})
+                time.sleep(server.delay)
+            self._write_chunk({"model": request.get("model"), "response": "", "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+            server.completed += 1
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream: this is what a cancelled generation looks like.
+            server.aborted += 1
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+def start_mock_server(port, delay=0.05, tokens=40, host="127.0.0.1", fail_after=None):
+    """
+    Start a mock Ollama server in a daemon thread and return it (port 0 picks a free port).
+    The server exposes ``completed``, ``aborted``, ``failed`` and ``in_flight`` counters.
+    With ``fail_after`` every generation drops the connection after that many tokens.
+    """
+    server = ThreadingHTTPServer((host, port), MockOllamaHandler)
+    server.delay = delay
+    server.tokens = tokens
+    server.fail_after = fail_after
+    server.loaded_models = set()
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.completed = 0
+    server.aborted = 0
+    server.failed = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run mock Ollama servers.")
+    parser.add_argument("--ports", type=int, nargs="+", default=[11501, 11502])
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds between streamed tokens.")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per response.")
+    parser.add_argument("--fail-after", type=int, default=None,
+                        help="Drop every stream after this many tokens (to exercise failover).")
+    args = parser.parse_args(argv)
+    servers = [start_mock_server(port, delay=args.delay, tokens=args.tokens, fail_after=args.fail_after)
+               for port in args.ports]
+    print("Mock Ollama listening on: " + ",".join(f"http://127.0.0.1:{s.server_port}" for s in servers))
+    try:
+        while True:
+            time.sleep(5)
+            print(" | ".join(f"{s.server_port}: {s.completed} done, {s.aborted} aborted, {s.in_flight} in flight" for s in servers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Startup Benchmark: Measure what rendering the Home page costs on top of Streamlit itself.
+
+The app is run headlessly with ``streamlit.testing.v1.AppTest`` (so ``home_ui()`` actually
+renders) in a fresh interpreter, and so is a baseline script that only imports streamlit
+and writes one element. Both runs report their render time and ``sys.modules``; the
+difference is what the app adds. The check fails (non-zero exit) when the added time
+exceeds the budget, when the Home page raises, or when it loads a heavy dependency that
+the baseline does not.
+
+Usage:
+    python scripts/startup_benchmark.py [--budget-ms 150] [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules the Home page must never load.
+FORBIDDEN_PREFIXES = ("pandas", "numpy", "matplotlib", "langchain", "langchain_core", "langchain_ollama", "openpyxl")
+BASELINE_SCRIPT = 'import streamlit as st\nst.write("")\n'
+# Runs in the fresh interpreter: render the script once and print a JSON report.
+_PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.session_state["selected_page"] = "Home"
+started = time.perf_counter()
+at.run()
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules), "exceptions": [str(e.value) for e in at.exception]}))
+"""
+
+
+def measure_once(script):
+    """
+    Render a Streamlit script in a fresh interpreter.
+    Args:
+        script (str): Path of the Streamlit script.
+    Returns:
+        tuple: (render seconds, set of loaded module names, list of exception messages).
+    """
+    proc = subprocess.run([sys.executable, "-c", _PROBE, os.path.abspath(script)],
+                          cwd=REPO_ROOT, capture_output=True, text=True)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"Running '{script}' failed:\n{proc.stderr[-2000:]}")
+    report = json.loads(lines[-1])
+    return report["seconds"], set(report["modules"]), report["exceptions"]
+
+
+def forbidden_modules(loaded, baseline=()):
+    """
+    Return the heavy top-level packages in ``loaded`` that the baseline did not already load.
+    """
+    baseline = set(baseline)
+    return sorted({name.split(".")[0] for name in loaded
+                   if name not in baseline and name.split(".")[0] in FORBIDDEN_PREFIXES})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the Home page's startup budget.")
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="Maximum render time the app adds over the baseline (best of runs).")
+    parser.add_argument("--runs", type=int, default=3, help="Number of fresh interpreter runs.")
+    parser.add_argument("--script", default=os.path.join(REPO_ROOT, "app.py"), help="Streamlit script to measure.")
+    args = parser.parse_args(argv)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(BASELINE_SCRIPT)
+    try:
+        base_times, app_times = [], []
+        for _ in range(max(1, args.runs)):
+            seconds, baseline, _ = measure_once(f.name)
+            base_times.append(seconds * 1000)
+            seconds, loaded, exceptions = measure_once(args.script)
+            app_times.append(seconds * 1000)
+    finally:
+        os.unlink(f.name)
+    added_ms = min(app_times) - min(base_times)
+    added = loaded - baseline
+    forbidden = forbidden_modules(loaded, baseline)
+
+    print(f"Home render (ms): best={min(app_times):.1f}, baseline best={min(base_times):.1f}, added={added_ms:.1f}")
+    print(f"Modules added by the app: {len(added)}")
+    failed = False
+    if exceptions:
+        print(f"FAIL: the Home page raised: {'; '.join(exceptions)}")
+        failed = True
+    if added_ms > args.budget_ms:
+        print(f"FAIL: added render time {added_ms:.1f} ms exceeds budget of {args.budget_ms:.1f} ms")
+        failed = True
+    if forbidden:
+        print(f"FAIL: heavy modules loaded at startup: {', '.join(forbidden)}")
+        failed = True
+    if not failed:
+        print("OK: startup within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Chart Renderer: Cached, off-thread matplotlib rendering for dashboard charts.
+
+Figures are built with the non-interactive Agg backend via ``matplotlib.figure.Figure``
+directly (never through ``pyplot``), so no global figure registry holds on to them.
+Rendered PNG/SVG bytes are cached by a hash of the chart data, so Streamlit reruns
+reuse the bytes instead of rebuilding the figure.
+"""
+import hashlib
+import io
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+SUPPORTED_FORMATS = ("png", "svg")
+
+
+class ChartRenderer:
+    """
+    Render charts to image bytes in a worker pool and cache the results.
+    """
+    def __init__(self, max_workers=2, max_entries=128):
+        """
+        Initialize the ChartRenderer.
+        Args:
+            max_workers (int): Number of render threads.
+            max_entries (int): Maximum number of rendered images kept in the cache.
+        """
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chart-render")
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(kind, data, fmt, **options):
+        """
+        Build a stable cache key for a chart.
+        Args:
+            kind (str): Chart type, e.g. 'pie'.
+            data (dict): Mapping of label -> value.
+            fmt (str): Output format ('png' or 'svg').
+        Returns:
+            str: SHA-256 hex digest of the chart description.
+        """
+        payload = json.dumps(
+            {"kind": kind, "fmt": fmt, "data": [[str(k), float(v)] for k, v in data.items()], "options": options},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def submit_pie(self, data, fmt="png", title=None):
+        """
+        Schedule a pie chart render and return a Future resolving to image bytes.
+        Identical charts already cached or in flight share the same result.
+        Args:
+            data (dict): Mapping of category label -> value.
+            fmt (str): Output format ('png' or 'svg').
+            title (str): Optional chart title.
+        Returns:
+            concurrent.futures.Future: Future resolving to the rendered bytes.
+        """
+        if fmt not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported chart format: {fmt}")
+        key = self.cache_key("pie", data, fmt, title=title)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return _completed_future(self._cache[key])
+            if key in self._pending:
+                return self._pending[key]
+            future = self._executor.submit(_render_pie, dict(data), fmt, title)
+            self._pending[key] = future
+        future.add_done_callback(lambda f, key=key: self._store(key, f))
+        return future
+
+    def render_pie(self, data, fmt="png", title=None, timeout=30):
+        """
+        Render a pie chart and return the image bytes, blocking until done.
+        Args:
+            data (dict): Mapping of category label -> value.
+            fmt (str): Output format ('png' or 'svg').
+            title (str): Optional chart title.
+            timeout (float): Seconds to wait for the render.
+        Returns:
+            bytes: Rendered image.
+        """
+        return self.submit_pie(data, fmt=fmt, title=title).result(timeout=timeout)
+
+    def clear(self):
+        """
+        Drop all cached images.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def _store(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                if not future.cancelled():
+                    logging.error(f"Chart render failed: {future.exception()}")
+                return
+            self._cache[key] = future.result()
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+
+def _completed_future(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _render_pie(data, fmt, title):
+    # Figure + FigureCanvasAgg avoids pyplot's global state; the figure is
+    # released as soon as this function returns.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.subplots()
+        ax.pie([float(v) for v in data.values()], labels=[str(k) for k in data.keys()], autopct='%1.1f%%', startangle=90)
+        ax.axis('equal')
+        if title:
+            ax.set_title(title)
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    """
+    Return the process-wide ChartRenderer, creating it on first use.
+    Returns:
+        ChartRenderer: Shared renderer instance.
+    """
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = ChartRenderer()
+        return _renderer
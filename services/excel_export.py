@@ -0,0 +1,309 @@
+"""
+Excel Export: Constant-memory Excel dashboards for FinanceSheetAnalyzer results.
+
+The whole workbook is written with openpyxl's write-only mode, which streams each
+sheet's rows to a temporary file, so memory stays flat no matter how many transactions
+are exported; charts are native Excel charts that reference the pivot sheets.
+Finished workbooks are cached on disk by a hash of the result (and of the
+transactions, when included), so repeated downloads of the same analysis are served
+without rebuilding the file.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+
+DEFAULT_EXPORT_DIR = os.environ.get(
+    "AI_AGENTS_EXPORT_DIR",
+    os.path.join(os.path.expanduser("~"), ".ai_agents", "exports"),
+)
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Excel's row limit; longer transaction lists continue on "Transactions (2)", ...
+MAX_SHEET_ROWS = 1048576
+MONEY_FORMAT = "#,##0.00"
+DATE_FORMAT = "yyyy-mm-dd hh:mm:ss"
+KPI_CARDS = [
+    ("Total Inflows", "total_inflows", "E3F2FD", "1976D2"),
+    ("Total Outflows", "total_outflows", "FFEBEE", "D32F2F"),
+    ("Net Balance", "net_balance", "E8F5E9", "388E3C"),
+    ("Monthly Avg", "monthly_average", "FFFDE7", "FBC02D"),
+]
+# Text sections of the Dashboard sheet: (heading, result key).
+TEXT_SECTIONS = [("Insights & Observations", "insights"), ("Recommendations", "recommendations")]
+LLM_SECTION = ("AI-Powered Financial Insights", "llm_analysis")
+
+
+def _plain(value):
+    # numpy scalars -> Python numbers; NaN/NaT -> empty cell.
+    if hasattr(value, "item"):
+        value = value.item()
+    if value != value:
+        return None
+    return value
+
+
+def _strip_html(text):
+    return re.sub(r"\s*</li>\s*", "\n", re.sub(r"<(?!/li)[^>]+>", "", text or "")).strip()
+
+
+def _frame_rows(frame):
+    if frame is None or getattr(frame, "empty", True):
+        return []
+    frame = frame.reset_index()
+    return [[str(c) for c in frame.columns]] + [[_plain(v) for v in row] for row in frame.itertuples(index=False, name=None)]
+
+
+def category_rows(result):
+    """
+    Return [['Category', 'Inflow', 'Outflow', 'Net'], ...] merged from the result's category breakdowns,
+    largest outflow first.
+    """
+    inflows = result.get("category_inflows") or {}
+    outflows = result.get("category_outflows") or {}
+    categories = sorted(set(inflows) | set(outflows), key=lambda c: (-float(outflows.get(c, 0) or 0), str(c)))
+    rows = [["Category", "Inflow", "Outflow", "Net"]]
+    for category in categories:
+        inflow = _plain(inflows.get(category, 0)) or 0
+        outflow = _plain(outflows.get(category, 0)) or 0
+        rows.append([str(category), inflow, outflow, inflow - outflow])
+    return rows if len(rows) > 1 else []
+
+
+def result_hash(result, transactions=None):
+    """
+    Return a stable SHA-256 digest of a finance result and optional transaction DataFrame.
+    Covers every result field written to the workbook, so a changed field never serves a stale file.
+    """
+    digest = hashlib.sha256()
+    keys = [key for _, key, _, _ in KPI_CARDS] + [key for _, key in TEXT_SECTIONS] + [LLM_SECTION[1]]
+    summary = {key: _plain(result.get(key)) if not isinstance(result.get(key), str) else result.get(key)
+               for key in keys}
+    summary["categories"] = category_rows(result)
+    for key in ("monthly_trends", "yearly_trends"):
+        summary[key] = _frame_rows(result.get(key))
+    digest.update(json.dumps(summary, sort_keys=True, default=str).encode("utf-8"))
+    if transactions is not None:
+        import pandas as pd
+
+        digest.update(json.dumps([str(c) for c in transactions.columns]).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(transactions, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+class ExcelDashboardExporter:
+    """
+    Build Excel dashboard workbooks and cache them on disk by result hash.
+    """
+    def __init__(self, directory=None, max_files=20, chunk_rows=50000):
+        """
+        Initialize the ExcelDashboardExporter.
+        Args:
+            directory (str): Cache directory for finished workbooks (defaults to AI_AGENTS_EXPORT_DIR).
+            max_files (int): Maximum number of cached workbooks kept; the oldest are removed.
+            chunk_rows (int): Transaction rows converted to cell values per batch while streaming the sheet.
+        """
+        self.directory = directory or DEFAULT_EXPORT_DIR
+        self.max_files = max_files
+        self.chunk_rows = chunk_rows
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def export(self, result, transactions=None):
+        """
+        Return the path of the dashboard workbook for a result, building it on first request.
+        Args:
+            result (dict): Output of ``FinanceSheetAnalyzer.analyze``.
+            transactions (pandas.DataFrame): Optional rows for the Transactions sheet(s).
+        Returns:
+            str: Path to the cached .xlsx file.
+        """
+        key = result_hash(result, transactions)
+        path = os.path.join(self.directory, f"{key}.xlsx")
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if os.path.exists(path):
+                os.utime(path)
+                return path
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".xlsx.tmp")
+            os.close(fd)
+            try:
+                self._write(result, transactions, tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        with self._lock:
+            self._locks.pop(key, None)
+        self._prune()
+        return path
+
+    def _prune(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".xlsx")]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for stale in files[self.max_files:]:
+            try:
+                os.unlink(stale)
+            except OSError as e:
+                logging.warning(f"Could not remove cached export {stale}: {e}")
+
+    def _write(self, result, transactions, path):
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        dashboard = wb.create_sheet("Dashboard")
+        pivots = [
+            ("By Category", category_rows(result)),
+            ("By Month", _frame_rows(result.get("monthly_trends"))),
+            ("By Year", _frame_rows(result.get("yearly_trends"))),
+        ]
+        charts = []
+        for title, rows in pivots:
+            if not rows:
+                continue
+            ws = wb.create_sheet(title)
+            ws.append(rows[0])
+            for row in rows[1:]:
+                ws.append([self._cell(ws, value, MONEY_FORMAT if isinstance(value, (int, float)) and i else None)
+                           for i, value in enumerate(row)])
+            charts.extend(self._charts(ws, title, rows))
+        self._write_dashboard(dashboard, result, charts)
+        if transactions is not None and not transactions.columns.empty:
+            self._write_transactions(wb, transactions)
+        wb.save(path)
+
+    @staticmethod
+    def _cell(ws, value, number_format=None, font=None, fill=None, alignment=None):
+        from openpyxl.cell import WriteOnlyCell
+
+        cell = WriteOnlyCell(ws, value=value)
+        if number_format:
+            cell.number_format = number_format
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        if alignment is not None:
+            cell.alignment = alignment
+        return cell
+
+    @staticmethod
+    def _charts(ws, title, rows):
+        from openpyxl.chart import BarChart, LineChart, PieChart, Reference
+
+        count = len(rows) - 1
+        labels = Reference(ws, min_col=1, min_row=2, max_row=count + 1)
+        if title == "By Category":
+            bars = BarChart()
+            bars.title = "Inflows vs Outflows by Category"
+            bars.add_data(Reference(ws, min_col=2, max_col=3, min_row=1, max_row=count + 1), titles_from_data=True)
+            bars.set_categories(labels)
+            pie = PieChart()
+            pie.title = "Outflow Share by Category"
+            pie.add_data(Reference(ws, min_col=3, min_row=1, max_row=count + 1), titles_from_data=True)
+            pie.set_categories(labels)
+            return [bars, pie]
+        line = LineChart()
+        line.title = "Monthly Trend" if title == "By Month" else "Yearly Trend"
+        line.add_data(Reference(ws, min_col=2, max_col=len(rows[0]), min_row=1, max_row=count + 1), titles_from_data=True)
+        line.set_categories(labels)
+        return [line]
+
+    def _write_dashboard(self, ws, result, charts):
+        from openpyxl.styles import Alignment, Font, PatternFill
+
+        # Write-only sheets accept column widths only before the first row.
+        for column in "ABCDEFGH":
+            ws.column_dimensions[column].width = 16
+        ws.append([self._cell(ws, "Finance Dashboard", font=Font(size=18, bold=True))])
+        ws.append([])
+        labels, values = [], []
+        for label, key, background, color in KPI_CARDS:
+            fill = PatternFill("solid", start_color=background)
+            value = result.get(key, "N/A")
+            value = value if isinstance(value, str) else _plain(value)
+            labels += [self._cell(ws, label, font=Font(bold=True), fill=fill), None]
+            values += [self._cell(ws, value, MONEY_FORMAT, font=Font(size=16, bold=True, color=color), fill=fill), None]
+        ws.append(labels)
+        ws.append(values)
+        ws.append([])
+        for heading, key in TEXT_SECTIONS:
+            ws.append([self._cell(ws, heading, font=Font(size=14, bold=True))])
+            for line in _strip_html(result.get(key)).splitlines():
+                ws.append([self._cell(ws, f"• {line.strip()}")])
+            ws.append([])
+        heading, key = LLM_SECTION
+        if result.get(key):
+            ws.append([self._cell(ws, heading, font=Font(size=14, bold=True))])
+            for line in result[key].splitlines():
+                ws.append([self._cell(ws, line, alignment=Alignment(vertical="top"))])
+        for n, chart in enumerate(charts):
+            chart.width, chart.height = 16, 8
+            # Two charts per row, right of the KPI block.
+            ws.add_chart(chart, f"{'J' if n % 2 == 0 else 'T'}{3 + (n // 2) * 17}")
+
+    def _write_transactions(self, wb, transactions):
+        # Rows past Excel's limit continue on "Transactions (2)", ...; values are converted
+        # a column at a time, one chunk at a time, and appended as plain Python values.
+        columns = [str(c) for c in transactions.columns]
+        per_sheet = MAX_SHEET_ROWS - 1
+        for n, first in enumerate(range(0, max(len(transactions), 1), per_sheet), 1):
+            ws = wb.create_sheet("Transactions" if n == 1 else f"Transactions ({n})")
+            ws.append(columns)
+            rows = transactions.iloc[first:first + per_sheet]
+            for start in range(0, len(rows), self.chunk_rows):
+                chunk = rows.iloc[start:start + self.chunk_rows]
+                values = [_column_values(ws, series) for _, series in chunk.items()]
+                for row in zip(*values):
+                    ws.append(row)
+
+
+def _column_values(ws, series):
+    # Excel has no NaN, infinity or NaT (empty cells instead), no timezones, and no
+    # control characters other than tab/newline/CR.
+    import pandas as pd
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    kind = series.dtype.kind
+    if kind == "M":
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_localize(None)
+        return [None if v is pd.NaT else ExcelDashboardExporter._cell(ws, v.to_pydatetime(), DATE_FORMAT)
+                for v in series]
+    if kind == "f":
+        return [v if v == v and v not in (float("inf"), float("-inf")) else None for v in series.tolist()]
+    if kind in "biu" and not series.hasnans:
+        return series.tolist()
+    missing = series.isna().tolist()
+    values = []
+    for v, gap in zip(series.astype(object).tolist(), missing):
+        if gap:
+            values.append(None)
+            continue
+        v = _plain(v)
+        if isinstance(v, (bool, int, float)):
+            values.append(v)
+        else:
+            values.append(ILLEGAL_CHARACTERS_RE.sub("", str(v)))
+    return values
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_excel_exporter():
+    """
+    Return the process-wide ExcelDashboardExporter, creating it on first use.
+    Returns:
+        ExcelDashboardExporter: Shared exporter instance.
+    """
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = ExcelDashboardExporter()
+        return _exporter
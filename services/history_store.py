@@ -0,0 +1,241 @@
+"""
+History Store: Bounded, persistent analysis history backed by a local SQLite database.
+
+Full agent outputs are kept on disk; the Streamlit session only holds a user id and
+the current page number. Each (user, agent) history is a ring buffer capped at
+``max_entries`` rows. Anonymous user ids live in the page URL and are lost when a
+visitor opens the app without it, so the whole table is also capped at
+``max_total_entries`` rows and entries older than ``max_age_days`` are pruned;
+abandoned ids therefore do not grow the database forever. Outputs are indexed for
+full-text search (FTS5 prefix queries when the SQLite build supports it, LIKE otherwise).
+"""
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = os.environ.get(
+    "AI_AGENTS_HISTORY_DB",
+    os.path.join(os.path.expanduser("~"), ".ai_agents", "history.sqlite3"),
+)
+MAX_TOTAL_ENTRIES = int(os.environ.get("AI_AGENTS_HISTORY_MAX_ROWS", "5000"))
+MAX_AGE_DAYS = int(os.environ.get("AI_AGENTS_HISTORY_MAX_AGE_DAYS", "30"))
+PREVIEW_INPUT_CHARS = 100
+PREVIEW_RESPONSE_CHARS = 200
+
+
+def _preview(text, limit):
+    text = (text or "").replace('\n', ' ')
+    return text[:limit] + ("..." if len(text) > limit else "")
+
+
+class HistoryStore:
+    """
+    SQLite-backed history of agent runs, bounded per user and agent.
+    """
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_entries=200, max_total_entries=MAX_TOTAL_ENTRIES,
+                 max_age_days=MAX_AGE_DAYS):
+        """
+        Initialize the HistoryStore.
+        Args:
+            db_path (str): Path of the SQLite database file (':memory:' for tests).
+            max_entries (int): Maximum entries kept per (user, agent) pair.
+            max_total_entries (int): Maximum entries kept across all users; the oldest are removed.
+            max_age_days (int): Entries older than this are removed (0 disables age pruning).
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_total_entries = max_total_entries
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self.fts_enabled = False
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            if self.db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT NOT NULL,"
+                " agent TEXT NOT NULL,"
+                " timestamp TEXT NOT NULL,"
+                " user_input TEXT NOT NULL,"
+                " agent_response TEXT NOT NULL,"
+                " full_input TEXT,"
+                " full_result TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_user_agent ON history (user_id, agent, id)")
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+                    "full_input, full_result, content='history', content_rowid='id')"
+                )
+                self._conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN "
+                    "INSERT INTO history_fts(rowid, full_input, full_result) VALUES (new.id, new.full_input, new.full_result); END"
+                )
+                self._conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN "
+                    "INSERT INTO history_fts(history_fts, rowid, full_input, full_result) "
+                    "VALUES ('delete', old.id, old.full_input, old.full_result); END"
+                )
+                self.fts_enabled = True
+            except sqlite3.OperationalError as e:
+                logging.warning(f"SQLite FTS5 unavailable, falling back to LIKE search: {e}")
+
+    def add(self, user_id, agent, user_input, result, label=None):
+        """
+        Record an agent run, trim the (user, agent) history to ``max_entries`` and
+        prune the table to ``max_total_entries`` / ``max_age_days``.
+        Args:
+            user_id (str): Session/user identifier.
+            agent (str): Agent name, e.g. 'testcase', 'finance', 'log'.
+            user_input (str): Full input text (or a file name).
+            result (str): Full agent output.
+            label (str): Optional short label shown instead of the input preview.
+        Returns:
+            int: Row id of the new entry.
+        """
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO history (user_id, agent, timestamp, user_input, agent_response, full_input, full_result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, agent, timestamp, label or _preview(user_input, PREVIEW_INPUT_CHARS),
+                 _preview(result, PREVIEW_RESPONSE_CHARS), user_input, result),
+            )
+            self._conn.execute(
+                "DELETE FROM history WHERE user_id = ? AND agent = ? AND id NOT IN ("
+                " SELECT id FROM history WHERE user_id = ? AND agent = ? ORDER BY id DESC LIMIT ?)",
+                (user_id, agent, user_id, agent, self.max_entries),
+            )
+            self._prune()
+            return cur.lastrowid
+
+    def _prune(self):
+        # Called with the lock held, inside the insert transaction.
+        if self.max_age_days:
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+            self._conn.execute("DELETE FROM history WHERE timestamp < ?", (cutoff,))
+        if self.max_total_entries:
+            self._conn.execute(
+                "DELETE FROM history WHERE id <= ("
+                " SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.max_total_entries,),
+            )
+
+    def count(self, user_id, agent):
+        """
+        Return the number of stored entries for a user and agent.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM history WHERE user_id = ? AND agent = ?", (user_id, agent)
+            ).fetchone()
+        return row[0]
+
+    def page(self, user_id, agent, page=0, page_size=10):
+        """
+        Return one page of lightweight entries, newest first.
+        Args:
+            user_id (str): Session/user identifier.
+            agent (str): Agent name.
+            page (int): Zero-based page number.
+            page_size (int): Entries per page.
+        Returns:
+            list[dict]: Entries with id, timestamp, user_input and agent_response previews.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, timestamp, user_input, agent_response FROM history "
+                "WHERE user_id = ? AND agent = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (user_id, agent, page_size, page * page_size),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, user_id, agent, query, limit=20):
+        """
+        Full-text search over stored inputs and outputs.
+        Args:
+            user_id (str): Session/user identifier.
+            agent (str): Agent name.
+            query (str): Search terms.
+            limit (int): Maximum number of results.
+        Returns:
+            list[dict]: Matching lightweight entries, newest first.
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+        with self._lock:
+            if self.fts_enabled:
+                # Quote each term so user input is never parsed as FTS5 syntax; '*' makes it a
+                # prefix query, so "time" also finds "timeout", like the LIKE fallback does.
+                match = " ".join('"' + term.replace('"', '""') + '"*' for term in query.split())
+                rows = self._conn.execute(
+                    "SELECT h.id, h.timestamp, h.user_input, h.agent_response FROM history_fts f "
+                    "JOIN history h ON h.id = f.rowid "
+                    "WHERE history_fts MATCH ? AND h.user_id = ? AND h.agent = ? ORDER BY h.id DESC LIMIT ?",
+                    (match, user_id, agent, limit),
+                ).fetchall()
+            else:
+                # Every term must match, as with FTS5.
+                terms = query.split()
+                params = [user_id, agent]
+                for term in terms:
+                    params += [f"%{term}%", f"%{term}%"]
+                rows = self._conn.execute(
+                    "SELECT id, timestamp, user_input, agent_response FROM history "
+                    "WHERE user_id = ? AND agent = ?"
+                    + " AND (full_input LIKE ? OR full_result LIKE ?)" * len(terms)
+                    + " ORDER BY id DESC LIMIT ?",
+                    params + [limit],
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, entry_id):
+        """
+        Load a full entry, including the complete input and result.
+        Args:
+            entry_id (int): Row id returned by ``add``.
+        Returns:
+            dict or None: The entry, or None if it was trimmed or cleared.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM history WHERE id = ?", (entry_id,)).fetchone()
+        return dict(row) if row else None
+
+    def clear(self, user_id, agent):
+        """
+        Delete all entries for a user and agent.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM history WHERE user_id = ? AND agent = ?", (user_id, agent))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """
+    Return the process-wide HistoryStore, creating it on first use.
+    Returns:
+        HistoryStore: Shared store instance.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
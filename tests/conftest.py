@@ -0,0 +1,79 @@
+import pytest
+
+
+class FakeLLM:
+    """
+    Stands in for LlamaClient: answers every prompt with ``respond(prompt, kwargs)``.
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def query(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return self.respond(prompt, kwargs)
+
+
+@pytest.fixture
+def test_case_generator():
+    """
+    Return a factory for SmartUnitTestGenerator instances backed by a FakeLLM.
+    """
+    from agents.unit_test_generator import SmartUnitTestGenerator
+
+    def make(respond):
+        generator = SmartUnitTestGenerator()
+        generator.ollama_llm = None
+        generator.llm_client = FakeLLM(respond)
+        return generator
+    return make
+
+
+@pytest.fixture
+def log_analyzer():
+    """
+    Return a factory for SystemLogAnalyzer instances backed by a FakeLLM.
+    """
+    from agents.system_log_analyzer import SystemLogAnalyzer
+
+    def make(respond):
+        analyzer = SystemLogAnalyzer()
+        analyzer.ollama_llm = None
+        analyzer.llm_client = FakeLLM(respond)
+        return analyzer
+    return make
+
+
+@pytest.fixture
+def mock_server():
+    """
+    Return a factory starting mock Ollama servers on free ports (``server.url``); they
+    are stopped after the test.
+    """
+    from scripts.mock_ollama import start_mock_server
+
+    servers = []
+
+    def start(**kwargs):
+        server = start_mock_server(0, **kwargs)
+        server.url = f"http://127.0.0.1:{server.server_port}"
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def finance_analyzer():
+    """
+    Return a factory for FinanceSheetAnalyzer instances backed by a FakeLLM.
+    """
+    from agents.finance_sheet_analyzer import FinanceSheetAnalyzer
+
+    def make(respond=lambda prompt, kwargs: "Spending is stable."):
+        analyzer = FinanceSheetAnalyzer()
+        analyzer.llm = FakeLLM(respond)
+        return analyzer
+    return make
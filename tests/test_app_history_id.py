@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+
+def _script():
+    import streamlit as st
+    from app import history_user_id
+
+    st.write(history_user_id())
+
+
+def test_anonymous_history_id_is_kept_in_the_url():
+    at = AppTest.from_function(_script).run()
+    assert not at.exception
+    user_id = at.markdown[0].value
+    assert at.query_params["history"] in (user_id, [user_id])
+    reloaded = AppTest.from_function(_script)
+    reloaded.query_params["history"] = user_id
+    reloaded.run()
+    assert reloaded.markdown[0].value == user_id
+
+
+def test_malformed_history_id_is_replaced():
+    at = AppTest.from_function(_script)
+    at.query_params["history"] = "../not-an-id"
+    at.run()
+    assert at.markdown[0].value != "../not-an-id"
+    assert len(at.markdown[0].value) == 32
@@ -0,0 +1,79 @@
+import json
+
+from crewai.batch_runner import BatchRunner, discover_inputs, load_checkpoint
+
+
+class FakeLogAnalyzer:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def analyze(self, text):
+        self.calls.append(text)
+        if "fail" in text:
+            return "Error: model unavailable"
+        return f"report for {text.strip()}"
+
+
+def _records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _runner(output, calls, **kwargs):
+    return BatchRunner("logs", str(output), workers=2, agent_factory=lambda: FakeLogAnalyzer(calls), **kwargs)
+
+
+def test_discover_inputs_filters_extensions_recursively(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.log").write_text("a")
+    (tmp_path / "sub" / "b.LOG").write_text("b")
+    (tmp_path / "notes.md").write_text("c")
+    found = discover_inputs([str(tmp_path)], (".log",))
+    assert found == sorted([str(tmp_path / "a.log"), str(tmp_path / "sub" / "b.LOG")])
+
+
+def test_run_writes_records_and_summary(tmp_path):
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    (inputs / "a.log").write_text("alpha")
+    (inputs / "b.log").write_text("fail here")
+    (inputs / "copy.log").write_text("alpha")
+    output = tmp_path / "out.jsonl"
+    calls = []
+    summary = _runner(output, calls).run([str(inputs)])
+    assert (summary["found"], summary["skipped"], summary["succeeded"], summary["failed"]) == (3, 1, 1, 1)
+    assert summary["failures"][0][1] == "Error: model unavailable"
+    statuses = sorted(record["status"] for record in _records(output))
+    assert statuses == ["error", "ok"]
+    assert len(calls) == 2
+
+
+def test_resume_skips_successful_inputs_and_retries_failures(tmp_path):
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    (inputs / "a.log").write_text("alpha")
+    (inputs / "b.log").write_text("fail here")
+    output = tmp_path / "out.jsonl"
+    _runner(output, []).run([str(inputs)])
+
+    calls = []
+    (inputs / "c.log").write_text("gamma")
+    summary = _runner(output, calls).run([str(inputs)])
+    assert summary["skipped"] == 1
+    assert sorted(calls) == ["fail here", "gamma"]
+
+    calls = []
+    summary = _runner(output, calls, force=True).run([str(inputs)])
+    assert summary["skipped"] == 0 and len(calls) == 3
+
+
+def test_load_checkpoint_ignores_torn_lines_and_other_agents(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text(
+        json.dumps({"agent": "logs", "status": "ok", "sha256": "aaa"}) + "\n"
+        + json.dumps({"agent": "finance", "status": "ok", "sha256": "bbb"}) + "\n"
+        + json.dumps({"agent": "logs", "status": "error", "sha256": "ccc"}) + "\n"
+        + '{"agent": "logs", "sta'
+    )
+    assert load_checkpoint(str(output), "logs") == {"aaa"}
+    assert load_checkpoint(str(tmp_path / "missing.jsonl"), "logs") == set()
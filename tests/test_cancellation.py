@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from llm.cancellation import CancelToken, GenerationCancelled, consume_stream, query_ollama
+from llm.router import OllamaRouter
+
+
+def test_token_checks_parent_and_deadline():
+    parent = CancelToken()
+    child = CancelToken(parent=parent)
+    assert child.check() is None
+    parent.cancel("user stopped")
+    assert child.check() == "user stopped"
+    assert CancelToken(deadline_s=0.001).check() in (None, "deadline")
+    time.sleep(0.01)
+    assert CancelToken(deadline_s=0.001, parent=CancelToken()).remaining() == 1.0
+
+
+def test_on_cancel_fires_for_parent_and_can_be_released():
+    parent = CancelToken()
+    child = CancelToken(parent=parent)
+    fired = []
+    release = child.on_cancel(lambda: fired.append("a"))
+    child.on_cancel(lambda: fired.append("b"))
+    release()
+    parent.cancel()
+    assert fired == ["b"]
+    child.on_cancel(lambda: fired.append("late"))
+    assert fired == ["b", "late"]
+
+
+def test_consume_stream_stops_between_chunks():
+    token = CancelToken()
+    seen = []
+
+    def on_chunk(chunk):
+        seen.append(chunk)
+        if len(seen) == 2:
+            token.cancel()
+
+    with pytest.raises(GenerationCancelled) as info:
+        consume_stream(iter(["a", "b", "c"]), token=token, on_chunk=on_chunk, agent="test")
+    assert info.value.partial == "ab"
+
+
+def test_query_ollama_streams_from_mock_server(mock_server):
+    server = mock_server(delay=0, tokens=3)
+    chunks = []
+    text = query_ollama(OllamaRouter([server.url]), "hi", on_chunk=chunks.append, agent="test")
+    assert text == "".join(chunks)
+    assert text.count("token") == 3
+
+
+def test_cancel_interrupts_a_stalled_stream(mock_server):
+    # One token, then the server stalls for much longer than the test allows.
+    server = mock_server(delay=30, tokens=2)
+    token = CancelToken()
+    timer = threading.Timer(0.5, token.cancel)
+    timer.start()
+    started = time.monotonic()
+    result = query_ollama(OllamaRouter([server.url]), "hi", cancel_token=token, agent="test", timeout=60)
+    assert result == "Error: Generation cancelled (cancelled)."
+    assert time.monotonic() - started < 5
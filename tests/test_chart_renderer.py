@@ -0,0 +1,47 @@
+from services.chart_renderer import ChartRenderer
+
+import pytest
+
+
+@pytest.fixture
+def renderer():
+    renderer = ChartRenderer(max_workers=1, max_entries=2)
+    yield renderer
+    renderer._executor.shutdown(wait=True)
+
+
+def test_cache_key_is_stable_and_data_sensitive():
+    key = ChartRenderer.cache_key("pie", {"Rent": 100, "Food": 50}, "png", title=None)
+    assert key == ChartRenderer.cache_key("pie", {"Rent": 100.0, "Food": 50}, "png", title=None)
+    assert key != ChartRenderer.cache_key("pie", {"Rent": 100, "Food": 51}, "png", title=None)
+    assert key != ChartRenderer.cache_key("pie", {"Rent": 100, "Food": 50}, "svg", title=None)
+
+
+def test_render_pie_returns_png_and_reuses_cached_bytes(renderer):
+    data = {"Rent": 100, "Food": 50}
+    first = renderer.render_pie(data)
+    assert first.startswith(b"\x89PNG")
+    second = renderer.submit_pie(data)
+    assert second.done()
+    assert second.result() is first
+
+
+def test_identical_in_flight_renders_share_a_future(renderer):
+    data = {"A": 1, "B": 2}
+    assert renderer.submit_pie(data) is renderer.submit_pie(data)
+
+
+def test_svg_output(renderer):
+    assert b"<svg" in renderer.render_pie({"A": 1}, fmt="svg")
+
+
+def test_unsupported_format_raises(renderer):
+    with pytest.raises(ValueError):
+        renderer.submit_pie({"A": 1}, fmt="gif")
+
+
+def test_cache_is_bounded(renderer):
+    for n in range(4):
+        renderer.render_pie({"A": 1, "B": n + 1})
+    renderer._executor.shutdown(wait=True)
+    assert len(renderer._cache) == 2
@@ -0,0 +1,98 @@
+import datetime
+import os
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+openpyxl = pytest.importorskip("openpyxl")
+
+from services import excel_export
+from services.excel_export import ExcelDashboardExporter, category_rows, result_hash
+
+RESULT = {
+    "total_inflows": 1500.0,
+    "total_outflows": 400.0,
+    "net_balance": 1100.0,
+    "monthly_average": "N/A",
+    "insights": "<ul><li>Rent is the largest outflow</li><li>Salary arrives monthly</li></ul>",
+    "recommendations": "<li>Review subscriptions</li>",
+    "category_inflows": {"Salary": 1500.0},
+    "category_outflows": {"Rent": 300.0, "Food": 100.0},
+    "llm_analysis": "Spending is stable.",
+}
+
+
+def transactions():
+    return pd.DataFrame({
+        "Date": pd.to_datetime(["2024-01-05 10:00", None, "2024-02-01 00:00"]),
+        "Description": ["Rent\x07 payment", None, "Salary"],
+        "Amount": [-300.0, float("nan"), 1500.0],
+        "Units": pd.array([1, None, 3], dtype="Int64"),
+    })
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    return ExcelDashboardExporter(directory=str(tmp_path / "exports"), max_files=2, chunk_rows=2)
+
+
+def test_category_rows_merge_and_sort_by_outflow():
+    assert category_rows(RESULT) == [
+        ["Category", "Inflow", "Outflow", "Net"],
+        ["Rent", 0, 300.0, -300.0],
+        ["Food", 0, 100.0, -100.0],
+        ["Salary", 1500.0, 0, 1500.0],
+    ]
+    assert category_rows({}) == []
+
+
+def test_result_hash_covers_fields_and_transactions():
+    base = result_hash(RESULT)
+    assert result_hash(dict(RESULT)) == base
+    assert result_hash(dict(RESULT, llm_analysis="Spending rose.")) != base
+    assert result_hash(dict(RESULT, unrelated="ignored")) == base
+    with_rows = result_hash(RESULT, transactions())
+    assert with_rows != base
+    changed = transactions()
+    changed.loc[0, "Amount"] = -301.0
+    assert result_hash(RESULT, changed) != with_rows
+
+
+def test_export_writes_dashboard_pivots_and_transactions(exporter):
+    path = exporter.export(RESULT, transactions())
+    wb = openpyxl.load_workbook(path)
+    assert wb.sheetnames == ["Dashboard", "By Category", "Transactions"]
+    dashboard = [[c for c in row if c is not None] for row in wb["Dashboard"].iter_rows(values_only=True)]
+    assert ["Total Inflows", "Total Outflows", "Net Balance", "Monthly Avg"] in dashboard
+    assert [1500, 400, 1100, "N/A"] in dashboard
+    assert ["• Rent is the largest outflow"] in dashboard
+    assert len(wb["Dashboard"]._charts) == 2  # Bar and pie charts over "By Category".
+    ws = wb["Transactions"]
+    rows = list(ws.iter_rows(values_only=True))
+    assert rows == [
+        ("Date", "Description", "Amount", "Units"),
+        (datetime.datetime(2024, 1, 5, 10, 0), "Rent payment", -300, 1),
+        (None, None, None, None),
+        (datetime.datetime(2024, 2, 1), "Salary", 1500, 3),
+    ]
+    assert ws["A2"].number_format == excel_export.DATE_FORMAT
+
+
+def test_transactions_roll_over_to_new_sheets(exporter, monkeypatch):
+    monkeypatch.setattr(excel_export, "MAX_SHEET_ROWS", 3)
+    path = exporter.export(RESULT, transactions())
+    wb = openpyxl.load_workbook(path, read_only=True)
+    assert wb.sheetnames[-2:] == ["Transactions", "Transactions (2)"]
+    assert [r[1] for r in wb["Transactions (2)"].iter_rows(values_only=True)] == ["Description", "Salary"]
+
+
+def test_export_is_cached_and_pruned(exporter, monkeypatch):
+    first = exporter.export(RESULT)
+    monkeypatch.setattr(ExcelDashboardExporter, "_write", lambda *a: pytest.fail("rebuilt"))
+    assert exporter.export(dict(RESULT)) == first
+    monkeypatch.undo()
+    os.utime(first, (1, 1))  # Oldest, whatever the filesystem's mtime resolution.
+    for text in ("a", "b", "c"):
+        exporter.export(dict(RESULT, llm_analysis=text))
+    assert len(os.listdir(exporter.directory)) == 2
+    assert not os.path.exists(first)
@@ -0,0 +1,117 @@
+import datetime
+import sys
+import types
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from agents import finance_ingest
+from agents.finance_ingest import FinanceAggregate, ingest_finance_files, month_key, normalize_transactions
+
+SIGNED = pd.DataFrame({
+    "Year": [2023, 2024, 2024, 2024],
+    "Month": ["Dec", "Jan", "January", "Feb"],
+    "Category": ["Rent", "Salary", "Rent", "Food"],
+    "Amount": [-500.0, 2000.0, -500.0, -100.0],
+})
+SPLIT = pd.DataFrame({
+    "Month": ["2024-01", "2024-01", "2024-02"],
+    "Category": ["Salary", "Rent", "Rent"],
+    "Credit (Inflow)": [1000.0, 0.0, 0.0],
+    "Debit (Outflow)": [0.0, 400.0, 300.0],
+})
+
+
+@pytest.mark.parametrize("year, month, key", [
+    (2024, "Jan", (2024, 1)),
+    ("2024", "january", (2024, 1)),
+    (2024.0, 3, (2024, 3)),
+    (None, "2023-11", (2023, 11)),
+    (None, datetime.date(2022, 5, 17), (2022, 5)),
+    (None, "Sep", (None, 9)),
+    (2024, "Q1", (2024, "Q1")),
+    (2024, 13, (2024, "13")),
+    (2024, float("nan"), None),
+])
+def test_month_key(year, month, key):
+    assert month_key(year, month) == key
+
+
+def test_signed_amounts_are_split():
+    frame = normalize_transactions(SIGNED, "bank.csv")
+    assert list(frame.columns) == finance_ingest.NORMALIZED_COLUMNS
+    assert frame["Inflow"].tolist() == [0.0, 2000.0, 0.0, 0.0]
+    assert frame["Outflow"].tolist() == [500.0, 0.0, 500.0, 100.0]
+    with pytest.raises(ValueError):
+        normalize_transactions(pd.DataFrame({"Note": ["x"]}), "notes.csv")
+
+
+def test_merged_aggregates_match_one_pass():
+    first = FinanceAggregate.from_frame(normalize_transactions(SIGNED, "a"))
+    second = FinanceAggregate.from_frame(normalize_transactions(SPLIT, "b"))
+    merged = FinanceAggregate().merge(first).merge(second)
+    assert merged.rows == 7
+    assert merged.inflows == 3000.0 and merged.outflows == 1800.0
+    assert merged.sources == ["a", "b"]
+    categories = merged.trends("category")
+    assert categories.loc["Rent"].tolist() == [0.0, 1700.0, -1700.0]
+
+
+def test_month_trends_are_in_calendar_order():
+    aggregate = FinanceAggregate.from_frame(normalize_transactions(SIGNED, "a"))
+    aggregate.merge(FinanceAggregate.from_frame(normalize_transactions(SPLIT, "b")))
+    monthly = aggregate.trends("month")
+    assert list(monthly.index) == ["2023-12", "2024-01", "2024-02"]
+    assert monthly.loc["2024-01"].tolist() == [3000.0, 900.0, 2100.0]
+    assert FinanceAggregate().trends("month").empty
+
+
+def test_single_sheet_monthly_average_matches_consolidated(finance_analyzer):
+    analyzer = finance_analyzer()
+    single = analyzer.analyze(SIGNED)
+    consolidated = analyzer.analyze_consolidated(FinanceAggregate.from_frame(normalize_transactions(SIGNED, "a")))
+    # Signed-amount sheets now get a monthly average, grouped by (year, month).
+    assert single["monthly_average"] == pytest.approx((-500.0 + 1500.0 - 100.0) / 3)
+    assert single["monthly_average"] == consolidated["monthly_average"]
+    assert list(single["monthly_trends"].columns) == ["Inflow", "Outflow", "Net"]
+    assert single["llm_analysis"] == "Spending is stable."
+
+
+def test_sheet_without_months_has_no_monthly_average(finance_analyzer):
+    result = finance_analyzer().analyze(SIGNED.drop(columns=["Month"]))
+    assert result["monthly_average"] == "N/A"
+    assert result["monthly_trends"].empty
+
+
+@pytest.fixture
+def clean_main(monkeypatch):
+    # Spawned workers re-run the parent's __main__; AppTest leaves its last script there.
+    monkeypatch.setitem(sys.modules, "__main__", types.ModuleType("__main__"))
+
+
+def test_ingest_in_worker_processes_keeps_upload_order(clean_main):
+    files = [
+        ("b.csv", SPLIT.to_csv(index=False).encode()),
+        ("a.csv", SIGNED.to_csv(index=False).encode()),
+        ("notes.csv", b"Note\nhello\n"),
+    ]
+    result = ingest_finance_files(files, max_workers=3)
+    assert result.workers == 3
+    assert result.aggregate.sources == ["b.csv", "a.csv"]
+    assert len(result.errors) == 1 and result.errors[0].startswith("notes.csv: No inflow/outflow")
+    assert result.transactions()["Source"].tolist() == ["b.csv"] * 3 + ["a.csv"] * 4
+
+
+def test_workers_are_spawned_not_forked(clean_main, monkeypatch):
+    contexts = []
+
+    class RecordingExecutor(finance_ingest.ProcessPoolExecutor):
+        def __init__(self, *args, mp_context=None, **kwargs):
+            contexts.append(mp_context.get_start_method() if mp_context else None)
+            super().__init__(*args, mp_context=mp_context, **kwargs)
+
+    monkeypatch.setattr(finance_ingest, "ProcessPoolExecutor", RecordingExecutor)
+    files = [(f"{n}.csv", SPLIT.to_csv(index=False).encode()) for n in range(2)]
+    assert ingest_finance_files(files, max_workers=2).aggregate.rows == 6
+    assert contexts == ["spawn"]
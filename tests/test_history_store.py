@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+from services.history_store import HistoryStore
+
+
+@pytest.fixture
+def store():
+    store = HistoryStore(":memory:", max_entries=3, max_total_entries=10, max_age_days=30)
+    yield store
+    store.close()
+
+
+def test_add_page_and_get(store):
+    first = store.add("u1", "log", "line one\nline two", "report one")
+    store.add("u1", "log", "input two", "report two", label="Drill-down")
+    assert store.count("u1", "log") == 2
+    page = store.page("u1", "log")
+    assert [entry["user_input"] for entry in page] == ["Drill-down", "line one line two"]
+    assert store.get(first)["full_result"] == "report one"
+    assert store.page("u1", "log", page=1, page_size=1)[0]["id"] == first
+
+
+def test_history_is_a_ring_buffer_per_user_and_agent(store):
+    ids = [store.add("u1", "log", f"input {n}", f"result {n}") for n in range(5)]
+    store.add("u1", "finance", "sheet", "analysis")
+    store.add("u2", "log", "other", "other result")
+    assert [entry["id"] for entry in store.page("u1", "log")] == ids[:1:-1]
+    assert store.get(ids[0]) is None
+    assert store.count("u1", "finance") == 1
+    assert store.count("u2", "log") == 1
+
+
+def test_total_cap_removes_oldest_entries_across_users(store):
+    ids = [store.add(f"session-{n}", "log", "input", "result") for n in range(12)]
+    assert store.get(ids[1]) is None
+    assert store.get(ids[2]) is not None
+    assert sum(store.count(f"session-{n}", "log") for n in range(12)) == 10
+
+
+def test_old_entries_are_pruned(store):
+    old = store.add("u1", "log", "old input", "old result")
+    stale = (datetime.datetime.now() - datetime.timedelta(days=31)).strftime("%Y-%m-%d %H:%M:%S")
+    store._conn.execute("UPDATE history SET timestamp = ? WHERE id = ?", (stale, old))
+    store.add("u1", "log", "new input", "new result")
+    assert store.get(old) is None
+    assert store.count("u1", "log") == 1
+
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_search_matches_prefixes_and_scopes_by_user(store, fts):
+    if fts and not store.fts_enabled:
+        pytest.skip("SQLite built without FTS5")
+    store.fts_enabled = fts
+    store.add("u1", "log", "worker x3 crashed", "Timeout talking to the database")
+    store.add("u1", "log", "all good", "No errors")
+    store.add("u2", "log", "worker x3 crashed", "Timeout")
+    assert [entry["user_input"] for entry in store.search("u1", "log", "x")] == ["worker x3 crashed"]
+    assert len(store.search("u1", "log", "time data")) == 1
+    assert store.search("u1", "log", '"unbalanced') == []
+    assert store.search("u1", "log", "  ") == []
+
+
+def test_search_skips_pruned_entries(store):
+    if not store.fts_enabled:
+        pytest.skip("SQLite built without FTS5")
+    for n in range(4):
+        store.add("u1", "log", f"input {n}", f"needle{n}")
+    assert [entry["agent_response"] for entry in store.search("u1", "log", "needle")] == ["needle3", "needle2", "needle1"]
+
+
+def test_clear(store):
+    store.add("u1", "log", "input", "result")
+    store.add("u1", "finance", "input", "result")
+    store.clear("u1", "log")
+    assert store.count("u1", "log") == 0
+    assert store.count("u1", "finance") == 1
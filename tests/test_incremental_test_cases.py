@@ -0,0 +1,73 @@
+import json
+import re
+
+SPEC = """- Users can log in with email and password.
+- Admins can delete user accounts.
+- Reports can be exported to CSV.
+"""
+
+
+def batch_response(prompt, kwargs):
+    numbers = re.findall(r"^R(\d+): ", prompt, re.M)
+    return json.dumps({"test_cases": [
+        {"requirement": f"R{n}", "title": title, "test_steps": ["step"], "expected_results": "ok"}
+        for n in numbers for title in ("happy path", "invalid input")
+    ]})
+
+
+def ids(table):
+    return re.findall(r"^\| (TC-\S+) \|", table, re.M)
+
+
+def prefixes(table):
+    return sorted({case_id.rsplit("-", 1)[0] for case_id in ids(table)})
+
+
+def test_unchanged_spec_makes_no_llm_calls(test_case_generator):
+    generator = test_case_generator(batch_response)
+    table, mapping = generator.generate_incremental_test_cases(SPEC, threshold=0.99)
+    assert len(ids(table)) == 6
+    generator.llm_client.calls.clear()
+    again, _ = generator.generate_incremental_test_cases(SPEC, previous=mapping, threshold=0.99)
+    assert again == table
+    assert generator.llm_client.calls == []
+
+
+def test_edit_keeps_prefix_addition_gets_new_one_removal_drops(test_case_generator):
+    generator = test_case_generator(batch_response)
+    table, mapping = generator.generate_incremental_test_cases(SPEC, threshold=0.99)
+    login_prefix = ids(table)[0].rsplit("-", 1)[0]
+    edited = SPEC.replace("email and password.", "email and password or SSO.").replace(
+        "- Reports can be exported to CSV.\n", "- Invoices are emailed monthly.\n")
+    generator.llm_client.calls.clear()
+    new_table, new_mapping = generator.generate_incremental_test_cases(edited, previous=mapping, threshold=0.99)
+    assert ids(new_table)[0].rsplit("-", 1)[0] == login_prefix
+    assert len(ids(new_table)) == 6
+    assert "CSV" not in " ".join(entry["text"] for entry in new_mapping["requirements"].values())
+    # Only the edited and the added requirement were sent, in one batch.
+    assert len(generator.llm_client.calls) == 1
+    assert re.findall(r"^R\d+: ", generator.llm_client.calls[0][0], re.M) == ["R1: ", "R2: "]
+
+
+def test_re_adding_the_original_after_an_edit_does_not_duplicate_ids(test_case_generator):
+    generator = test_case_generator(batch_response)
+    original = "- Users can log in with email and password.\n"
+    edited = "- Users can log in with email and password or SSO.\n"
+    _, mapping = generator.generate_incremental_test_cases(original, threshold=0.99)
+    _, mapping = generator.generate_incremental_test_cases(edited, previous=mapping, threshold=0.99)
+    table, mapping = generator.generate_incremental_test_cases(edited + original, previous=mapping, threshold=0.99)
+    assert len(ids(table)) == len(set(ids(table))) == 4
+    first, second = prefixes(table)
+    assert second == f"{first}-2"
+
+
+def test_rows_naming_no_requirement_are_reported(test_case_generator):
+    def respond(prompt, kwargs):
+        data = json.loads(batch_response(prompt, kwargs))
+        data["test_cases"].append({"requirement": "R42", "title": "stray", "test_steps": [], "expected_results": ""})
+        return json.dumps(data)
+
+    generator = test_case_generator(respond)
+    table, mapping = generator.generate_incremental_test_cases(SPEC, threshold=0.99)
+    assert "stray" not in table
+    assert mapping["errors"] == ["Batch 1 of 1: 1 test case(s) could not be matched to a requirement."]
@@ -0,0 +1,166 @@
+import threading
+
+import pytest
+
+from agents import log_index
+from agents.log_index import LogIndex, get_log_index, line_component, parse_timestamp
+
+LOG = """2024-05-01 02:00:00 INFO [auth] service started
+2024-05-01 02:05:00 ERROR [auth] login failed for user 7
+Traceback (most recent call last):
+  File "auth.py", line 3
+2024-05-01 02:10:00 WARN db.pool: pool 80% used
+2024-05-01 02:20:00 ERROR db.pool: connection timeout
+"""
+
+
+@pytest.fixture
+def index_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_index, "_indexes", log_index.OrderedDict())
+    monkeypatch.setattr(log_index, "_build_locks", {})
+    return str(tmp_path / "indexes")
+
+
+def test_parse_timestamp_formats():
+    assert parse_timestamp("2024-05-01T02:00:00Z x") == 1714528800.0
+    assert parse_timestamp("2024-05-01 04:00:00+02:00 x") == 1714528800.0
+    assert parse_timestamp("2024-05-01 02:00:00,5 x") == 1714528800.5
+    assert parse_timestamp("Jan  2 00:00:00 host x") == 86400.0
+    assert parse_timestamp("no time here") is None
+
+
+def test_line_component():
+    assert line_component("2024-05-01 ERROR [auth.service] boom") == "auth.service"
+    assert line_component("2024-05-01 ERROR db.pool: timeout") == "db.pool"
+    assert line_component("2024-05-01 [ERROR] [42] plain") is None
+
+
+def test_queries_by_level_component_and_time(index_root):
+    with get_log_index(LOG, root=index_root) as index:
+        assert index.line_count == 6
+        assert index.levels() == {"ERROR": 4, "INFO": 1, "WARN": 1}
+        assert index.components() == {"auth": 2, "db.pool": 2}
+        errors = index.query(levels=["ERROR"])
+        # Traceback lines stay with the ERROR entry they follow.
+        assert errors.line_numbers() == [1, 2, 3, 5]
+        auth_errors = index.query(levels=["ERROR"], components=["auth"])
+        assert auth_errors.lines() == ["2024-05-01 02:05:00 ERROR [auth] login failed for user 7"]
+        window = index.query(start=parse_timestamp("2024-05-01 02:05:00"), end=parse_timestamp("2024-05-01 02:10:00"))
+        assert window.line_numbers() == [1, 2, 3, 4]
+        assert index.query(levels=["FATAL"]).count == 0
+        assert window.text(max_chars=60).count("\n") == 0
+
+
+def test_unordered_timestamps_use_the_sort_order(index_root):
+    text = "2024-05-01 02:10:00 INFO b\n2024-05-01 02:00:00 INFO a\n2024-05-01 02:20:00 INFO c\n"
+    with get_log_index(text, root=index_root) as index:
+        assert not index.meta["monotonic"]
+        selection = index.query(end=parse_timestamp("2024-05-01 02:10:00"))
+        assert selection.line_numbers() == [0, 1]
+
+
+def test_cached_index_is_shared_and_reopened_from_disk(index_root, monkeypatch):
+    first = get_log_index(LOG, root=index_root)
+    second = get_log_index(LOG, root=index_root)
+    assert first is second
+    first.release()
+    second.release()
+    monkeypatch.setattr(log_index, "_indexes", log_index.OrderedDict())
+    monkeypatch.setattr(LogIndex, "build", classmethod(lambda cls, *a, **k: pytest.fail("rebuilt")))
+    with get_log_index(LOG, root=index_root) as reopened:
+        assert reopened is not first and reopened.line_count == 6
+
+
+def test_eviction_waits_for_the_last_lease(index_root, monkeypatch):
+    monkeypatch.setattr(log_index, "MAX_OPEN_INDEXES", 1)
+    held = get_log_index(LOG, root=index_root)
+    with get_log_index("2024-05-01 03:00:00 INFO other log\n", root=index_root):
+        pass
+    # Evicted from the cache, but still usable by the session holding it.
+    assert held.line(1).endswith("login failed for user 7")
+    assert held.query(start=0).count == 6
+    held.release()
+    with pytest.raises(ValueError):
+        held.line(0)
+
+
+def test_unleased_evicted_index_is_closed_at_once(index_root, monkeypatch):
+    monkeypatch.setattr(log_index, "MAX_OPEN_INDEXES", 1)
+    with get_log_index(LOG, root=index_root) as first:
+        pass
+    get_log_index("2024-05-01 03:00:00 INFO other log\n", root=index_root).release()
+    with pytest.raises(ValueError):
+        first.acquire()
+
+
+def test_build_does_not_block_other_logs(index_root, monkeypatch):
+    with get_log_index(LOG, root=index_root):
+        pass
+    building, finish = threading.Event(), threading.Event()
+    real_build = LogIndex.build.__func__
+    builds = []
+
+    def slow_build(cls, log_path, directory, **kwargs):
+        builds.append(directory)
+        building.set()
+        finish.wait(5)
+        return real_build(cls, log_path, directory, **kwargs)
+
+    monkeypatch.setattr(LogIndex, "build", classmethod(slow_build))
+    results = []
+    big = "2024-05-01 04:00:00 ERROR [big] slow to index\n"
+    threads = [threading.Thread(target=lambda: results.append(get_log_index(big, root=index_root))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert building.wait(5)
+    # While the slow build runs, a cached log is still served.
+    with get_log_index(LOG, root=index_root) as index:
+        assert index.line_count == 6
+    finish.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(builds) == 1
+    assert results[0] is results[1]
+    for index in results:
+        index.release()
+
+
+def _drilldown_script():
+    from app import log_drilldown_ui
+
+    log_drilldown_ui("""2024-05-01 02:00:00 INFO [auth] service started
+2024-05-01 02:05:00 ERROR [auth] login failed for user 7
+""")
+
+
+def test_drilldown_indexes_only_when_enabled(index_root, monkeypatch):
+    pytest.importorskip("streamlit")
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.setattr(log_index, "DEFAULT_INDEX_DIR", index_root)
+    at = AppTest.from_function(_drilldown_script).run()
+    assert not at.exception
+    assert not log_index._indexes
+    at.toggle(key="drilldown_enabled").set_value(True).run()
+    assert not at.exception
+    assert any("2 of 2 lines match" in caption.value for caption in at.caption)
+
+
+def _flat_report_script():
+    import streamlit as st
+    from agents.schemas import LogReport
+    from app import render_log_report
+
+    report = LogReport("Disk full.", [{"Issue": "disk", "Severity": "high"}], [], [], ["Free space"], [])
+    with st.expander("Drill down"):
+        render_log_report(report, collapsible=False)
+
+
+def test_flat_report_does_not_nest_expanders():
+    pytest.importorskip("streamlit")
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_function(_flat_report_script).run()
+    assert not at.exception
+    assert len(at.expander) == 1
+    assert "#### Next Steps" in [m.value for m in at.markdown]
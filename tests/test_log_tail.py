@@ -0,0 +1,160 @@
+import os
+import threading
+
+import pytest
+
+from agents.log_tail import LogFollower, LogStats, TailAnalyzer, line_level, line_template
+
+
+class FakeAnalyzer:
+    def __init__(self, result="## Summary\nok", release=None):
+        self.result = result
+        self.release = release
+        self.calls = []
+
+    def analyze(self, text, use_cache=True, cancel_token=None):
+        self.calls.append({"text": text, "use_cache": use_cache, "cancel_token": cancel_token})
+        if self.release is not None:
+            self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def errors(n):
+    return [f"2024-01-01 10:00:{i % 60:02d} ERROR worker {i} failed" for i in range(n)]
+
+
+def test_line_level_and_template():
+    assert line_level("2024-01-01 WARNING disk low") == "WARN"
+    assert line_level("nothing here") == "OTHER"
+    assert line_template("2024-01-01 10:00:00 ERROR user 42 from 10.0.0.1") == "<TS> ERROR user <N> from <IP>"
+
+
+def test_follower_reads_appended_lines_and_survives_truncation(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("old line\n")
+    follower = LogFollower(str(path))
+    assert follower.read_new_lines() == []
+    with open(path, "a") as f:
+        f.write("first\nsec")
+    assert follower.read_new_lines() == ["first"]
+    with open(path, "a") as f:
+        f.write("ond\n")
+    assert follower.read_new_lines() == ["second"]
+    path.write_text("new\n")
+    assert follower.read_new_lines() == ["new"]
+
+
+def test_follower_restarts_on_rotation(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("a\n")
+    follower = LogFollower(str(path), from_start=True)
+    assert follower.read_new_lines() == ["a"]
+    os.rename(path, tmp_path / "app.log.1")
+    path.write_text("b\nc\n")
+    assert follower.read_new_lines() == ["b", "c"]
+
+
+def test_stats_window_expires():
+    stats = LogStats(window_seconds=10)
+    stats.add("ERROR boom 1", now=0)
+    stats.add("INFO fine", now=5)
+    assert stats.window_summary()["error_rate"] == 0.5
+    stats.expire(now=12)
+    summary = stats.window_summary()
+    assert summary["lines"] == 1 and summary["errors"] == 0
+    assert stats.total_lines == 2 and stats.levels["ERROR"] == 1
+
+
+def test_trigger_is_debounced_and_batched():
+    analyzer = FakeAnalyzer()
+    tail = TailAnalyzer(os.devnull, analyzer=analyzer, min_window_lines=5, debounce_seconds=30)
+    assert tail.feed(["INFO fine"] * 10, now=0) is None
+    report = tail.feed(errors(10), now=1)
+    assert report is not None and report["lines"] == 20
+    assert analyzer.calls[0]["use_cache"] is False
+    assert analyzer.calls[0]["cancel_token"] is None
+    assert tail.feed(errors(10), now=5) is None
+    assert tail.feed(errors(1), now=40) is not None
+    assert analyzer.calls[1]["text"].count("ERROR worker") >= 11
+    assert tail.llm_calls == 2 and tail.failed_calls == 0
+
+
+def test_errors_count_as_failed_calls():
+    tail = TailAnalyzer(os.devnull, analyzer=FakeAnalyzer(RuntimeError("down")), min_window_lines=5)
+    report = tail.feed(errors(10), now=0)
+    assert report["report"].startswith("Error: Tail analysis failed")
+    assert tail.failed_calls == 1 and tail.llm_calls == 0
+
+
+def test_background_mode_returns_immediately_and_blocks_reentry():
+    release = threading.Event()
+    analyzer = FakeAnalyzer(release=release)
+    tail = TailAnalyzer(os.devnull, analyzer=analyzer, min_window_lines=5, debounce_seconds=0, background=True)
+    try:
+        assert tail.feed(errors(10), now=0) is None
+        assert tail.analyzing
+        assert tail.feed(errors(10), now=1) is None
+        assert len(analyzer.calls) == 1
+        release.set()
+        tail._running.result(timeout=5)
+        assert not tail.analyzing
+        assert [r["lines"] for r in tail.recent_reports()] == [10]
+        assert analyzer.calls[0]["cancel_token"] is not None
+        # The lines held back while the first call ran go out with the next one.
+        tail.feed([], now=2)
+        tail._running.result(timeout=5)
+        assert [r["lines"] for r in tail.recent_reports()] == [10, 10]
+    finally:
+        tail.close()
+
+
+def test_close_cancels_background_analysis():
+    release = threading.Event()
+    tail = TailAnalyzer(os.devnull, analyzer=FakeAnalyzer(release=release), min_window_lines=5, background=True)
+    tail.feed(errors(10), now=0)
+    token = tail._cancel_token
+    tail.close()
+    assert token.check() == "tail closed"
+    release.set()
+
+
+@pytest.fixture
+def tail_dir(tmp_path, monkeypatch):
+    pytest.importorskip("streamlit")
+    import app
+
+    (tmp_path / "service.log").write_text("INFO up\n")
+    monkeypatch.setattr(app, "TAIL_LOG_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_resolve_tail_path_stays_inside_the_directory(tail_dir):
+    from app import resolve_tail_path
+
+    assert resolve_tail_path("service.log") == os.path.realpath(tail_dir / "service.log")
+    assert resolve_tail_path("../service.log") is None
+    assert resolve_tail_path("missing.log") is None
+
+
+def _panel_script():
+    import streamlit as st
+    from app import live_tail_panel
+
+    with st.expander("Live Tail"):
+        live_tail_panel(st.session_state["tail"])
+
+
+def test_panel_draws_reports_without_nested_expanders():
+    pytest.importorskip("streamlit")
+    from streamlit.testing.v1 import AppTest
+
+    tail = TailAnalyzer(os.devnull, analyzer=FakeAnalyzer("**all good**"), min_window_lines=5)
+    tail.feed(errors(10), now=0)
+    at = AppTest.from_function(_panel_script)
+    at.session_state["tail"] = tail
+    at.run()
+    assert not at.exception
+    assert len(at.expander) == 1
+    assert any("all good" in m.value for m in at.markdown)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from llm.cancellation import CancelToken, GenerationCancelled
+from llm.resilience import CircuitBreaker, CircuitOpenError, SingleFlight, call_with_breaker, get_circuit_breaker, is_backend_failure
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (requests.exceptions.ConnectionError("refused"), True),
+    (requests.exceptions.ReadTimeout("slow"), True),
+    (requests.exceptions.ChunkedEncodingError("dropped"), True),
+    (http_error(503), True),
+    (http_error(404), False),
+    (ConnectionError("ollama client could not connect"), True),
+    (RuntimeError("model 'nope' not found"), False),
+    (ValueError("raised by on_chunk"), False),
+])
+def test_is_backend_failure_for_requests_and_builtins(error, expected):
+    assert is_backend_failure(error) is expected
+
+
+def test_is_backend_failure_for_httpx_and_ollama():
+    httpx = pytest.importorskip("httpx")
+    ollama = pytest.importorskip("ollama")
+    request = httpx.Request("POST", "http://localhost:11434/api/generate")
+    assert is_backend_failure(httpx.ConnectError("refused", request=request))
+    assert is_backend_failure(httpx.ReadTimeout("slow", request=request))
+    assert is_backend_failure(ollama.ResponseError("overloaded", 503))
+    assert not is_backend_failure(ollama.ResponseError("model not found", 404))
+
+
+def test_breaker_opens_then_probes_and_closes():
+    healthy = []
+    breaker = CircuitBreaker("http://backend", failure_threshold=2, reset_timeout=0.05,
+                             probe=lambda url: bool(healthy))
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    time.sleep(0.06)
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # The probe failed, so the timeout doubles.
+    assert breaker.state == "open" and breaker._reset_timeout == pytest.approx(0.1)
+    healthy.append(True)
+    time.sleep(0.11)
+    breaker.allow()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_client_errors_do_not_open_the_circuit():
+    url = "http://client-errors.invalid"
+
+    def unknown_model():
+        raise RuntimeError("model 'nope' not found")
+
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            call_with_breaker(url, unknown_model)
+    assert get_circuit_breaker(url).state == "closed"
+    assert get_circuit_breaker(url).failures == 0
+
+
+def test_single_flight_shares_one_call():
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    leader = threading.Thread(target=lambda: results.append(group.do("k", work)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(group.do("k", work)))
+    follower.start()
+    while group.coalesced == 0:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ["shared", "shared"] and len(calls) == 1
+
+
+def test_single_flight_follower_can_stop_waiting():
+    group = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: group.do("k", lambda: release.wait(5)))
+    leader.start()
+    while "k" not in group._flights:
+        time.sleep(0.01)
+    token = CancelToken()
+    token.cancel("user stopped")
+    with pytest.raises(GenerationCancelled):
+        group.do("k", lambda: "unused", cancel_token=token)
+    release.set()
+    leader.join(5)
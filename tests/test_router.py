@@ -0,0 +1,90 @@
+import threading
+
+from llm.cancellation import query_ollama
+from llm.resilience import get_circuit_breaker
+from llm.router import OllamaRouter, default_endpoints
+
+
+class ResettablePreview:
+    def __init__(self):
+        self.parts = []
+        self.resets = 0
+
+    def __call__(self, chunk):
+        self.parts.append(chunk)
+
+    def reset(self):
+        self.parts = []
+        self.resets += 1
+
+
+def test_default_endpoints_from_env(monkeypatch):
+    monkeypatch.setenv("OLLAMA_ENDPOINTS", "gpu1:11434, http://gpu2:11434/,gpu1:11434")
+    assert default_endpoints() == ["http://gpu1:11434", "http://gpu2:11434"]
+
+
+def test_concurrent_requests_spread_over_endpoints(mock_server):
+    servers = [mock_server(delay=0.1, tokens=5) for _ in range(3)]
+    router = OllamaRouter([s.url for s in servers])
+    for endpoint in router.endpoints:
+        router._refresh_models(endpoint)  # No model loaded anywhere, and no background refresh.
+    start = threading.Barrier(6)
+    results = []
+
+    def run(i):
+        start.wait()
+        results.append(query_ollama(router, f"prompt {i}", agent="test"))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(results) == 6 and not any(r.startswith("Error:") for r in results)
+    assert [router.stats()[s.url]["requests"] for s in servers] == [2, 2, 2]
+
+
+def test_endpoint_with_the_model_loaded_is_preferred(mock_server):
+    cold, warm = mock_server(delay=0, tokens=3), mock_server(delay=0, tokens=3)
+    warm.loaded_models.add("llama3.1:latest")
+    router = OllamaRouter([cold.url, warm.url])
+    for endpoint in router.endpoints:
+        router._refresh_models(endpoint)
+    for i in range(3):
+        assert f"[{warm.server_port}]" in query_ollama(router, f"prompt {i}", agent="test")
+    stats = router.stats()
+    assert (stats[cold.url]["requests"], stats[warm.url]["requests"]) == (0, 3)
+
+
+def test_fails_over_when_an_endpoint_is_down(mock_server):
+    down, up = mock_server(), mock_server(delay=0, tokens=3)
+    down.shutdown()
+    down.server_close()
+    router = OllamaRouter([down.url, up.url])
+    router.endpoints[1].latency = 10.0  # Make the dead endpoint the first choice.
+    result = query_ollama(router, "hello", agent="test")
+    assert f"[{up.server_port}]" in result
+    assert get_circuit_breaker(down.url).failures == 1
+    assert router.stats()[up.url]["requests"] == 1
+
+
+def test_mid_stream_failover_resets_the_preview(mock_server):
+    flaky, healthy = mock_server(delay=0, tokens=5, fail_after=2), mock_server(delay=0, tokens=5)
+    router = OllamaRouter([flaky.url, healthy.url])
+    router.endpoints[1].latency = 10.0
+    preview = ResettablePreview()
+    result = query_ollama(router, "hello", on_chunk=preview, agent="test")
+    assert flaky.failed == 1
+    assert preview.resets == 1
+    assert "".join(preview.parts) == result
+    assert f"[{flaky.server_port}]" not in result and result.count("token") == 5
+
+
+def test_mid_stream_failover_without_reset_stops_the_preview(mock_server):
+    flaky, healthy = mock_server(delay=0, tokens=5, fail_after=2), mock_server(delay=0, tokens=5)
+    router = OllamaRouter([flaky.url, healthy.url])
+    router.endpoints[1].latency = 10.0
+    chunks = []
+    result = query_ollama(router, "hello again", on_chunk=chunks.append, agent="test")
+    assert len(chunks) == 2 and all(f"[{flaky.server_port}]" in c for c in chunks)
+    assert f"[{healthy.server_port}]" in result and result.count("token") == 5
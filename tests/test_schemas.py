@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from agents.requirements_preprocessor import RequirementCluster
+from agents.schemas import (LOG_REPORT_SCHEMA, TEST_CASE_SUITE_SCHEMA, LogReport, StructuredOutputError,
+                            TestCaseSuite, load_test_case_batch)
+from agents.unit_test_generator import parse_batch_rows
+
+
+def case(**fields):
+    return {"title": "Login works", "test_steps": ["open", "submit"], "expected_results": "ok", **fields}
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "empty"),
+    ("Error: Llama server unavailable.", "unavailable"),
+    ("not json", "valid JSON"),
+    ("[]", "JSON object"),
+    ("{}", "Missing required fields: test_cases"),
+    ('{"test_cases": {}}', "must be a list"),
+    ('{"test_cases": []}', "no test cases"),
+])
+def test_suite_rejects_bad_output(text, message):
+    with pytest.raises(StructuredOutputError, match=message):
+        TestCaseSuite.from_json(text)
+
+
+def test_suite_fills_missing_and_duplicate_ids_and_normalizes_fields():
+    suite = TestCaseSuite.from_json(json.dumps({"test_cases": [
+        case(test_case_id="TC-LOGIN"),
+        case(test_case_id="TC-LOGIN", test_steps="open\n\nsubmit"),
+        case(preconditions=["account exists", "logged out"]),
+        "not a test case",
+    ]}))
+    assert [c.test_case_id for c in suite.test_cases] == ["TC-LOGIN", "TC-LOGIN-2", "TC-003"]
+    assert suite.test_cases[1].test_steps == ["open", "submit"]
+    assert suite.test_cases[2].preconditions == "account exists; logged out"
+    assert suite.rows()[0]["Test Steps"] == "1. open 2. submit"
+
+
+def test_suite_markdown_escapes_cells():
+    suite = TestCaseSuite.from_json(json.dumps({"test_cases": [case(input_data="a|b\nc")]}))
+    table = suite.to_markdown().splitlines()
+    assert table[0].startswith("| Test Case ID | Title |")
+    assert "a\\|b c" in table[2]
+
+
+def test_load_test_case_batch_keeps_requirement_refs():
+    pairs = load_test_case_batch(json.dumps({"test_cases": [case(requirement="R2"), case(requirement=" r1 "), 3]}))
+    assert [ref for ref, _ in pairs] == ["R2", "r1"]
+    assert all(c.test_case_id == "" for _, c in pairs)
+    with pytest.raises(StructuredOutputError):
+        load_test_case_batch('{"test_cases": "R1"}')
+
+
+def test_parse_batch_rows_maps_refs_to_clusters():
+    batch = [RequirementCluster("Users can log in."), RequirementCluster("Admins can delete users.")]
+    output = json.dumps({"test_cases": [case(requirement="R2"), case(requirement="R1"), case(requirement="R9"),
+                                        case(requirement="first")]})
+    rows, skipped = parse_batch_rows(output, batch)
+    assert [cluster for cluster, _ in rows] == [batch[1], batch[0]]
+    assert rows[0][1][0] == "Login works"
+    assert skipped == 2
+
+
+def test_log_report_sorts_findings_and_defaults_fields():
+    report = LogReport.from_json(json.dumps({
+        "executive_summary": "Database timeouts.",
+        "key_findings": [
+            {"issue": "slow disk", "severity": "low"},
+            {"issue": "db down", "severity": "CRITICAL", "occurrences": "12"},
+            {"issue": "unknown"},
+        ],
+        "error_breakdown": [{"category": "db", "errors": 12, "warnings": "x"}],
+        "recommendations": "Add an index\nRaise the pool size",
+    }))
+    assert [f["Issue"] for f in report.key_findings] == ["db down", "unknown", "slow disk"]
+    assert report.key_findings[0]["Occurrences"] == 12
+    assert report.key_findings[1]["Severity"] == "medium"
+    assert report.error_breakdown == [{"Category": "db", "Errors": 12, "Warnings": 0}]
+    assert report.recommendations == ["Add an index", "Raise the pool size"]
+    markdown = report.to_markdown()
+    assert "## Root Cause Analysis\n_None reported._" in markdown
+    assert "- Raise the pool size" in markdown
+
+
+def test_log_report_requires_lists():
+    with pytest.raises(StructuredOutputError, match="'root_causes' must be a list"):
+        LogReport.from_json(json.dumps({"executive_summary": "", "root_causes": "none"}))
+
+
+def test_structured_generation_passes_the_schema(test_case_generator):
+    generator = test_case_generator(lambda prompt, kwargs: json.dumps({"test_cases": [case()]}))
+    suite = generator.generate_structured_test_cases("Users can log in.", use_cache=False)
+    assert suite.test_cases[0].test_case_id == "TC-001"
+    assert generator.llm_client.calls[0][1]["format"] == TEST_CASE_SUITE_SCHEMA
+
+
+def test_structured_log_analysis_surfaces_llm_errors(log_analyzer):
+    analyzer = log_analyzer(lambda prompt, kwargs: "Error: Llama server unavailable.")
+    with pytest.raises(StructuredOutputError, match="unavailable"):
+        analyzer.analyze_structured("ERROR boom", use_cache=False)
+    assert analyzer.llm_client.calls[0][1]["format"] == LOG_REPORT_SCHEMA
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from agents.similarity import LSHIndex, MinHash, shingles, similarity
+from agents.similarity_cache import (SimilarityCache, log_line_shingles, log_severity_counts,
+                                     severity_counts_close)
+
+WORDS = ["auth", "billing", "cache", "db", "gateway", "queue", "search", "upload", "worker", "mailer"]
+ACTIONS = ["started", "request handled", "cache refreshed", "connection pooled", "job scheduled", "user synced"]
+
+
+def make_log(lines=300, errors=3, seed=1):
+    rng = random.Random(seed)
+    out = [f"2024-05-01 10:{n % 60:02d}:{n % 60:02d} INFO {rng.choice(WORDS)}: {rng.choice(ACTIONS)} id={n}"
+           for n in range(lines)]
+    out += [f"2024-05-01 11:00:{n:02d} ERROR db: connection reset by peer" for n in range(errors)]
+    return "\n".join(out)
+
+
+def test_minhash_estimates_jaccard():
+    minhash = MinHash(num_perm=128)
+    a = shingles(" ".join(f"word{n}" for n in range(200)))
+    b = shingles(" ".join(f"word{n}" for n in range(20, 220)))
+    exact = len(a & b) / len(a | b)
+    assert similarity(minhash.signature(a), minhash.signature(b)) == pytest.approx(exact, abs=0.12)
+    assert similarity(minhash.signature(a), minhash.signature(a)) == 1.0
+    assert minhash.signature(set()) == (0,) * 128
+
+
+def test_lsh_index_finds_near_duplicates_only():
+    minhash = MinHash(num_perm=64)
+    index = LSHIndex(num_perm=64, bands=16)
+    base = " ".join(f"token{n}" for n in range(300))
+    index.add("base", minhash.fingerprint(base))
+    index.add("other", minhash.fingerprint(" ".join(f"other{n}" for n in range(300))))
+    matches = index.query(minhash.fingerprint(base + " token999"), threshold=0.8)
+    assert [key for key, _ in matches] == ["base"]
+    index.remove("base")
+    assert index.query(minhash.fingerprint(base), threshold=0.8) == []
+    assert len(index) == 1
+    with pytest.raises(ValueError):
+        LSHIndex(num_perm=64, bands=10)
+
+
+def test_log_line_shingles_mask_digits_and_count_repeats():
+    assert log_line_shingles("a 1\na 2") == {"a 0#0", "a 0#1"}
+    assert log_line_shingles("a 1") == {"a 0#0"}
+    assert len(log_line_shingles("\n".join(["x"] * 8))) == 4
+
+
+def test_severity_counts_tolerate_a_few_new_lines_but_not_a_spike():
+    healthy = log_severity_counts(make_log(errors=3))
+    assert dict(healthy)["ERROR"] == 3
+    assert severity_counts_close(healthy, log_severity_counts(make_log(errors=4)))
+    assert not severity_counts_close(healthy, log_severity_counts(make_log(errors=50)))
+    assert severity_counts_close(log_severity_counts(make_log(errors=100)), log_severity_counts(make_log(errors=110)))
+    assert not severity_counts_close(log_severity_counts(make_log(errors=0)), log_severity_counts(make_log(errors=5)))
+
+
+def log_cache():
+    return SimilarityCache(shingler=log_line_shingles, threshold=0.9, match_key=log_severity_counts,
+                           key_matches=severity_counts_close)
+
+
+def test_log_with_a_few_new_lines_reuses_the_cached_report():
+    cache = log_cache()
+    log = make_log()
+    cache.store(log, "report")
+    grown = log + "\n2024-05-01 11:01:00 INFO auth: started id=9\n2024-05-01 11:01:01 ERROR db: connection reset by peer"
+    hit = cache.lookup(grown)
+    assert hit is not None and not hit.exact and hit.result == "report"
+    assert cache.lookup(log).exact
+
+
+def test_error_spike_is_not_answered_from_the_cache():
+    cache = log_cache()
+    cache.store(make_log(errors=3), "healthy report")
+    assert cache.lookup(make_log(errors=60)) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_exact_threshold_disables_near_hits_and_cache_is_bounded():
+    cache = SimilarityCache(max_entries=2)
+    cache.store("the quick brown fox jumps over the lazy dog", "a")
+    assert cache.lookup("the quick brown fox jumps over the lazy cat", threshold=1.0) is None
+    cache.store("second entry text here", "b")
+    cache.store("third entry text here too", "c")
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("the quick brown fox jumps over the lazy dog", threshold=1.0) is None
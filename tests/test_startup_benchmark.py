@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from scripts import startup_benchmark
+
+pytest.importorskip("streamlit")
+
+
+def test_forbidden_modules_ignores_baseline():
+    loaded = {"json", "pandas", "pandas.core", "numpy", "langchain_ollama"}
+    assert startup_benchmark.forbidden_modules(loaded, baseline={"numpy"}) == ["langchain_ollama", "pandas"]
+
+
+def test_measure_once_reports_modules_loaded_by_the_script(tmp_path):
+    script = tmp_path / "heavy.py"
+    script.write_text("import streamlit as st\nimport json\nimport pandas\nst.write('x')\n")
+    _, loaded, exceptions = startup_benchmark.measure_once(str(script))
+    assert not exceptions
+    assert "pandas" in startup_benchmark.forbidden_modules(loaded)
+
+
+def test_home_page_renders_without_heavy_modules():
+    if not os.path.exists(os.path.join(startup_benchmark.REPO_ROOT, "app.py")):
+        pytest.skip("app.py not found")
+    assert startup_benchmark.main(["--runs", "1", "--budget-ms", "5000"]) == 0
@@ -0,0 +1,77 @@
+import json
+import re
+
+from agents.requirements_preprocessor import cluster_requirements, requirement_key, split_requirements
+
+SPEC = """# Login
+- Users can log in with email and password.
+- Users can log in with their email and password.
+- Admins can delete user accounts.
+
+Passwords expire after 90 days. Users are warned 7 days before expiry.
+"""
+
+
+def batch_response(prompt, kwargs):
+    numbers = re.findall(r"^R(\d+): ", prompt, re.M)
+    return json.dumps({"test_cases": [
+        {"requirement": f"R{n}", "title": f"Case for R{n}", "test_steps": ["open", "submit"], "expected_results": "ok"}
+        for n in numbers
+    ]})
+
+
+def test_split_requirements_handles_lists_and_sentences():
+    assert split_requirements(SPEC) == [
+        "Users can log in with email and password.",
+        "Users can log in with their email and password.",
+        "Admins can delete user accounts.",
+        "Passwords expire after 90 days.",
+        "Users are warned 7 days before expiry.",
+    ]
+
+
+def test_near_duplicates_share_a_cluster():
+    clusters = cluster_requirements(split_requirements(SPEC), threshold=0.5)
+    assert len(clusters) == 4
+    assert clusters[0].representative == "Users can log in with email and password."
+    assert requirement_key("Users can log in.") == requirement_key("  users CAN log in ")
+
+
+def test_every_unique_requirement_gets_test_cases(test_case_generator):
+    generator = test_case_generator(batch_response)
+    table = generator.generate_deduplicated_test_cases(SPEC, batch_size=2, threshold=0.5)
+    ids = re.findall(r"^\| (TC-\S+) \|", table, re.M)
+    assert len(ids) == 4 and len(set(ids)) == 4
+    assert len(generator.llm_client.calls) == 2
+    assert generator.generate_deduplicated_test_cases(SPEC, batch_size=2, threshold=0.5) == table
+
+
+def test_failed_batch_is_reported_as_uncovered(test_case_generator):
+    def respond(prompt, kwargs):
+        return "Error: connection refused" if "Admins" in prompt else batch_response(prompt, kwargs)
+
+    generator = test_case_generator(respond)
+    table, mapping = generator.generate_incremental_test_cases(SPEC, batch_size=1, threshold=0.5)
+    assert not table.startswith("Error:")
+    assert mapping["uncovered"] == ["Admins can delete user accounts."]
+    assert any("connection refused" in error for error in mapping["errors"])
+    assert "Admins" not in " ".join(entry["text"] for entry in mapping["requirements"].values())
+
+
+def test_all_batches_failing_returns_an_explicit_failure(test_case_generator):
+    generator = test_case_generator(batch_response)
+    _, previous = generator.generate_incremental_test_cases(SPEC, threshold=0.5)
+    generator.llm_client.respond = lambda prompt, kwargs: "Error: connection refused"
+    table, mapping = generator.generate_incremental_test_cases(SPEC + "\n- Reports export to CSV.", previous=previous,
+                                                               threshold=0.5)
+    assert table.startswith("Error: No test cases were generated")
+    assert mapping["failed"] is True
+    assert mapping["uncovered"] == ["Reports export to CSV."]
+    assert mapping["requirements"] == previous["requirements"]
+    # The retry regenerates only the requirement that failed.
+    generator.llm_client.respond = batch_response
+    generator.llm_client.calls.clear()
+    table, mapping = generator.generate_incremental_test_cases(SPEC + "\n- Reports export to CSV.", previous=mapping,
+                                                               threshold=0.5)
+    assert "failed" not in mapping and not mapping["uncovered"]
+    assert len(generator.llm_client.calls) == 1